@@ -48,7 +48,7 @@ void MenuState::update()
     carrier->display.setCursor(5, 20);
     carrier->display.print("Scanning for servers...");
     
-    // websocket::updateServerScan();
+    websocket::updateServerScan();
 
     auto buttonUp = carrier->Button1.getTouch();
     carrier->Buttons.update(); // Update the touch buttons state
@@ -64,7 +64,7 @@ void MenuState::update()
 
     static int selectedServerIndex = 0; // Track the currently selected server index
     ServerInfo** servers = websocket::getScannedServers();
-    if (servers != nullptr) {
+    if (servers != nullptr && servers[0] != nullptr) {
         int serverCount = 0;
         while (servers[serverCount] != nullptr) {
             serverCount++;
@@ -111,10 +111,8 @@ void MenuState::sendConnectionRequest(char ipaddress[], int port)
     Serial.print(ipaddress);
     Serial.print(":");
     Serial.println(port);
-    auto portNumber = websocket::getServerPort(ipaddress);
-    Serial.print("Port number: ");
-    Serial.println(portNumber);
-    websocket::webSocketConnect(ipaddress, portNumber);
+    // Discovery already told us the WebSocket port
+    websocket::webSocketConnect(ipaddress, port);
     
 }
 
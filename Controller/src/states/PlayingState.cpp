@@ -1,5 +1,6 @@
 #include "PlayingState.hpp"
 #include "websockets/websocket.hpp"
+#include "websockets/protocol.hpp"
 #include <algorithm>  // For std::sort
 
 PlayingState::PlayingState(MKRIoTCarrier *c) : State(c)
@@ -59,7 +60,8 @@ void PlayingState::update()
     // Check if any button was just pressed (transition from not pressed to pressed)
     for (int i = 0; i < 4; i++) {
         if (buttonStates[i] && !prevButtonStates[i]) {
-            // Button was just pressed, check for note hit
+            // Button was just pressed, let the server judge it and check for note hit locally
+            sendButtonPress(i);
             processNoteHit(i);
         }
         prevButtonStates[i] = buttonStates[i];
@@ -122,6 +124,14 @@ void PlayingState::processNoteHit(int trackNum)
     }
 }
 
+void PlayingState::sendButtonPress(int trackNum)
+{
+    // Format: "HIT-<track-number>-<millis>", the server converts millis to its own clock
+    char message[32];
+    snprintf(message, sizeof(message), "HIT-%d-%lu", trackNum, millis());
+    websocket::webSocketSend(message);
+}
+
 void PlayingState::flashLED(int ledNum)
 {
     // Get the current color of the LED
@@ -145,16 +155,39 @@ void PlayingState::flashLED(int ledNum)
 void PlayingState::parseNoteMessage(const char* message)
 {
     // Format: "NOTE-<track-number>-<time-in-ms-since-start>"
-    // Extract track number
-    char* trackStart = strstr(message, "NOTE-");
+    const char* trackStart = strstr(message, "NOTE-");
     if (!trackStart) return;
     
-    trackStart += 5; // Skip "NOTE-"
-    int track = atoi(trackStart);
+    addNote(trackStart + 5); // Skip "NOTE-"
+    
+    // Keep notes in chronological order
+    sortUpcomingNotes();
+}
+
+void PlayingState::parseNoteBatch(const char* message)
+{
+    // Format: "NOTES-<track>-<time>;<track>-<time>;..."
+    const char* noteStart = message + 6; // Skip "NOTES-"
+    
+    while (noteStart != nullptr && *noteStart != '\0') {
+        noteStart = addNote(noteStart);
+    }
+    
+    // Sort the whole batch once instead of once per note
+    sortUpcomingNotes();
+    
+    Serial.print("Added note batch - Upcoming notes: ");
+    Serial.println(upcomingNotes.size());
+}
+
+const char* PlayingState::addNote(const char* noteStart)
+{
+    // Parse "<track>-<time>" and return the start of the next note in a batch, or nullptr
+    int track = atoi(noteStart);
     
     // Extract time
-    char* timeStart = strchr(trackStart, '-');
-    if (!timeStart) return;
+    const char* timeStart = strchr(noteStart, '-');
+    if (!timeStart) return nullptr;
     
     timeStart++; // Skip '-'
     long timeMs = atol(timeStart);
@@ -163,16 +196,16 @@ void PlayingState::parseNoteMessage(const char* message)
     Note newNote = {track, timeMs, false};
     upcomingNotes.push_back(newNote);
     
-    // Sort notes by time (keep them in chronological order)
+    const char* next = strchr(timeStart, ';');
+    return next ? next + 1 : nullptr;
+}
+
+void PlayingState::sortUpcomingNotes()
+{
     std::sort(upcomingNotes.begin(), upcomingNotes.end(), 
         [](const Note& a, const Note& b) {
             return a.timeMs < b.timeMs;
         });
-    
-    Serial.print("Added note - Track: ");
-    Serial.print(track);
-    Serial.print(", Time: ");
-    Serial.println(timeMs);
 }
 
 void PlayingState::disconnect()
@@ -195,6 +228,12 @@ void PlayingState::handleWebSocketEvent(char message[])
 
     // If the message starts with "PlayerObject", extract the player name from the line that starts with "Player="
     if (strncmp(message, "PlayerObject", 12) == 0) {
+        // The server judges button presses, so its score is authoritative
+        char *scoreStart = strstr(message, "Score=");
+        if (scoreStart != nullptr) {
+            score = atoi(scoreStart + strlen("Score="));
+        }
+        
         char *playerNameStart = strstr(message, "Player=");
         if (playerNameStart != nullptr) {
             playerNameStart += strlen("Player=");
@@ -212,30 +251,82 @@ void PlayingState::handleWebSocketEvent(char message[])
         
         // If event is "Start", set the game start time
         if (strncmp(event, "Start", 5) == 0) {
-            gamestarttime = millis(); // Set the game start time
-            // Clear any existing notes when game starts
-            upcomingNotes.clear();
-            score = 0;
+            startGame();
         } else if (strncmp(event, "End", 3) == 0) {
-            // Handle game end event
-            long gameEndTime = millis(); // Get the current time
-            long gameDuration = gameEndTime - gamestarttime; // Calculate the game duration
-            Serial.print("Game duration: ");
-            Serial.println(gameDuration); // Print the game duration for debugging
-            
-            // Display final score
-            carrier->display.fillScreen(ST7735_BLACK);
-            carrier->display.setCursor(20, 50);
-            carrier->display.setTextSize(2);
-            carrier->display.println("Game Over!");
-            carrier->display.setCursor(20, 80);
-            carrier->display.print("Final Score: ");
-            carrier->display.println(score);
-            carrier->display.setTextSize(1);
+            endGame();
         }
     }
+    // If the message starts with "NOTES-" then process the batch of notes
+    else if (strncmp(message, "NOTES-", 6) == 0) {
+        parseNoteBatch(message);
+    }
     // If the message starts with "NOTE-" then process the note
     else if (strncmp(message, "NOTE-", 5) == 0) {
         parseNoteMessage(message);
     }
+}
+
+void PlayingState::handleBinaryEvent(uint8_t *payload, size_t length)
+{
+    // Binary frames: version, message type and record count, followed by fixed-size records
+    if (length < HEADER_SIZE || payload[0] != PROTOCOL_VERSION) return;
+    
+    uint8_t messageType = payload[1];
+    uint16_t count = readUint16(payload + 2);
+    const uint8_t *records = payload + HEADER_SIZE;
+    
+    switch (messageType) {
+        case MSG_NOTES:
+            if (length < HEADER_SIZE + (size_t)count * NOTE_RECORD_SIZE) return;
+            upcomingNotes.reserve(upcomingNotes.size() + count);
+            for (uint16_t i = 0; i < count; i++) {
+                const uint8_t *record = records + i * NOTE_RECORD_SIZE;
+                Note newNote = {record[0], (long)readUint32(record + 1), false};
+                upcomingNotes.push_back(newNote);
+            }
+            sortUpcomingNotes();
+            break;
+        case MSG_GAME_START:
+            startGame();
+            break;
+        case MSG_GAME_END:
+            endGame();
+            break;
+        case MSG_PLAYER:
+            // Record count is the length of the player name
+            if (length < HEADER_SIZE + PLAYER_RECORD_SIZE + (size_t)count) return;
+            score = readUint32(records);
+            playerName = "";
+            for (uint16_t i = 0; i < count; i++) {
+                playerName += (char)records[PLAYER_RECORD_SIZE + i];
+            }
+            break;
+    }
+}
+
+void PlayingState::startGame()
+{
+    gamestarttime = millis(); // Set the game start time
+    // Clear any existing notes when game starts
+    upcomingNotes.clear();
+    score = 0;
+}
+
+void PlayingState::endGame()
+{
+    // Handle game end event
+    long gameEndTime = millis(); // Get the current time
+    long gameDuration = gameEndTime - gamestarttime; // Calculate the game duration
+    Serial.print("Game duration: ");
+    Serial.println(gameDuration); // Print the game duration for debugging
+    
+    // Display final score
+    carrier->display.fillScreen(ST7735_BLACK);
+    carrier->display.setCursor(20, 50);
+    carrier->display.setTextSize(2);
+    carrier->display.println("Game Over!");
+    carrier->display.setCursor(20, 80);
+    carrier->display.print("Final Score: ");
+    carrier->display.println(score);
+    carrier->display.setTextSize(1);
 }
\ No newline at end of file
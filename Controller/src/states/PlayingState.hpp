@@ -31,8 +31,14 @@ private:
     
     // Helper functions
     void processNoteHit(int trackNum);
+    void sendButtonPress(int trackNum);
     void flashLED(int ledNum);
     void parseNoteMessage(const char* message);
+    void parseNoteBatch(const char* message);
+    const char* addNote(const char* noteStart);
+    void sortUpcomingNotes();
+    void startGame();
+    void endGame();
 
 public:
     PlayingState(MKRIoTCarrier *c);
@@ -40,6 +46,7 @@ public:
     void initDisplay() override;
     void update() override;
     void handleWebSocketEvent(char message[]) override;
+    void handleBinaryEvent(uint8_t *payload, size_t length) override;
     void destroy() override;
 
     void disconnect();
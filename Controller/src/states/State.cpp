@@ -13,6 +13,10 @@ void State::handleWebSocketEvent(char message[]) {
     // Default empty implementation
 }
 
+void State::handleBinaryEvent(uint8_t *payload, size_t length) {
+    // Default empty implementation
+}
+
 void State::update() {
     // Default empty implementation
 }
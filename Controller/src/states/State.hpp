@@ -14,6 +14,7 @@ class State {
         
         virtual void initDisplay();
         virtual void handleWebSocketEvent(char message[]);
+        virtual void handleBinaryEvent(uint8_t *payload, size_t length);
 
         virtual void update();
         virtual void destroy();
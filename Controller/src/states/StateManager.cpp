@@ -76,4 +76,11 @@ void StateManager::handleWebSocketEvent(char message[]) {
     if (currentState) {
         currentState->handleWebSocketEvent(message);
     }
+}
+
+void StateManager::handleBinaryEvent(uint8_t *payload, size_t length) {
+    // Handle the binary WebSocket event in the current state
+    if (currentState) {
+        currentState->handleBinaryEvent(payload, length);
+    }
 }
\ No newline at end of file
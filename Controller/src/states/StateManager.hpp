@@ -21,6 +21,7 @@ public:
     void loop();
 
     virtual void handleWebSocketEvent(char message[]);
+    virtual void handleBinaryEvent(uint8_t *payload, size_t length);
 };
 
 
@@ -1,11 +1,20 @@
 #include "ServerInfo.hpp"
+#include <string.h>
 
-ServerInfo::ServerInfo(char *ipaddress, int port, char *HostName, char *GameName) {
-    this->ipaddress = ipaddress;
+static void copyField(char *dest, const char *src, size_t size) {
+    strncpy(dest, src ? src : "", size - 1);
+    dest[size - 1] = '\0';
+}
+
+ServerInfo::ServerInfo(const char *ipaddress, int port, const char *HostName, const char *GameName) {
+    copyField(this->ipaddress, ipaddress, sizeof(this->ipaddress));
     this->port = port;
-    this->HostName = HostName;
-    this->GameName = GameName;
+    copyField(this->HostName, HostName, sizeof(this->HostName));
+    copyField(this->GameName, GameName, sizeof(this->GameName));
 }
 
-ServerInfo::ServerInfo() {
-}
\ No newline at end of file
+ServerInfo::ServerInfo() : port(0) {
+    ipaddress[0] = '\0';
+    HostName[0] = '\0';
+    GameName[0] = '\0';
+}
@@ -7,11 +7,12 @@ class ServerInfo
     private:
         /* data */
     public:
-        char *ipaddress;
+        // Copies of the strings, discovered servers outlive the packet they came in
+        char ipaddress[16];
         int port;
-        char *HostName;
-        char *GameName;
-        ServerInfo(char *ipaddress, int port, char *HostName, char *GameName);
+        char HostName[32];
+        char GameName[32];
+        ServerInfo(const char *ipaddress, int port, const char *HostName, const char *GameName);
         ServerInfo();
 };
 
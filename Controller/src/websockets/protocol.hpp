@@ -0,0 +1,36 @@
+#ifndef WEBSOCKETS_PROTOCOL_HPP
+#define WEBSOCKETS_PROTOCOL_HPP
+
+#include <stdint.h>
+
+// Binary wire protocol, mirrors Game/networking/protocol.py
+// Header: version (uint8), message type (uint8), record count (uint16), little-endian
+#define PROTOCOL_VERSION 1
+#define PROTOCOL_REQUEST "PROTO-1"
+
+#define MSG_NOTES 1
+#define MSG_GAME_START 2
+#define MSG_GAME_END 3
+#define MSG_PLAYER 4
+
+// UDP discovery, mirrors the DISCOVERY_* constants in Game/networking/protocol.py
+// Hosts answer a probe and multicast announcements "GHD1|<port>|<ip>|<host name>|<game name>"
+#define DISCOVERY_PORT 47474
+#define DISCOVERY_GROUP_ADDRESS 239, 255, 47, 74
+#define DISCOVERY_PROBE "GHQ1"
+#define ANNOUNCEMENT_PREFIX "GHD1|"
+#define DISCOVERY_PROBE_INTERVAL_MS 1000
+
+#define HEADER_SIZE 4
+#define NOTE_RECORD_SIZE 5     // lane (uint8), time in ms since game start (uint32)
+#define PLAYER_RECORD_SIZE 4   // score (uint32), followed by the player name
+
+inline uint16_t readUint16(const uint8_t *p) {
+    return (uint16_t)p[0] | ((uint16_t)p[1] << 8);
+}
+
+inline uint32_t readUint32(const uint8_t *p) {
+    return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+
+#endif   //WEBSOCKETS_PROTOCOL_HPP
@@ -4,6 +4,7 @@
 #include <config.hpp>
 #include "websocket.hpp"
 #include "ServerInfo.hpp"
+#include "protocol.hpp"
 #define _ssid WIFI_SSID
 #define _pass WIFI_PASSWORD
 
@@ -13,103 +14,94 @@
 StateManager* websocket::_stateManager = nullptr;
 WiFiClient websocket::client;
 WebSocketsClient websocket::webSocket;
+WiFiUDP websocket::discoveryUdp;
      
 
 int status = WL_IDLE_STATUS;
 
 ServerInfo* websocket::servers[10] = { nullptr };
 int websocket::serverCount = 0;
-int websocket::currentScanIndex = 1;
 unsigned long websocket::lastScanTime = 0;
 
 void websocket::initServerScan() {
-    serverCount = 0;
-    currentScanIndex = 1;
-    lastScanTime = 0;
     for (int i = 0; i < 10; i++) {
+        delete servers[i];
         servers[i] = nullptr;
     }
+    serverCount = 0;
+    lastScanTime = 0;
+
+    // Hosts answer probes on this socket and announce themselves to the group
+    discoveryUdp.stop();
+    discoveryUdp.beginMulticast(IPAddress(DISCOVERY_GROUP_ADDRESS), DISCOVERY_PORT);
 }
 
 void websocket::updateServerScan() {
-    if (millis() - lastScanTime < 10) return; // throttle scan rate
-    lastScanTime = millis();
-
-    IPAddress localIP = WiFi.localIP();
+    // Probe the whole LAN at once instead of connecting to every address
+    if (lastScanTime == 0 || millis() - lastScanTime >= DISCOVERY_PROBE_INTERVAL_MS) {
+        lastScanTime = millis();
+        discoveryUdp.beginPacket(IPAddress(255, 255, 255, 255), DISCOVERY_PORT);
+        discoveryUdp.write((const uint8_t *)DISCOVERY_PROBE, strlen(DISCOVERY_PROBE));
+        discoveryUdp.endPacket();
+    }
 
-    for (int i = 0; i < 3 && currentScanIndex < 255; i++) {
-        if (currentScanIndex == localIP[3]) {
-            currentScanIndex++;
+    // Answers and announcements look the same
+    int size;
+    while ((size = discoveryUdp.parsePacket()) > 0) {
+        char packet[128];
+        int length = discoveryUdp.read((unsigned char *)packet, sizeof(packet) - 1);
+        if (length <= 0) {
             continue;
         }
+        packet[length] = '\0';
 
         char ipaddress[16];
-        snprintf(ipaddress, sizeof(ipaddress), "%d.%d.%d.%d",
-                localIP[0], localIP[1], localIP[2], currentScanIndex);
-
-        Serial.print("Scanning IP: ");
-        Serial.println(ipaddress);
-
-        if (WiFi.ping(ipaddress, 5) != -1) {
-            if (client.connect(ipaddress, 80)) {
-                client.println("GET /guitargame HTTP/1.1");
-                client.print("Host: ");
-                client.println(ipaddress);
-                client.println("Connection: close");
-                client.println();
-
-                unsigned long timeout = millis() + 50;
-                while (millis() < timeout && client.connected()) {
-                    if (client.available()) {
-                        String line = client.readStringUntil('\n');
-                        if (line.startsWith("HTTP/1.1 200 OK")) {
-                            if (serverCount < 10) {
-                                servers[serverCount++] = new ServerInfo(ipaddress, 80, "HostName", "GameName");
-                                Serial.print("Found server at: ");
-                                Serial.println(ipaddress);
-                            }
-                            break;
-                        }
-                    }
-                    yield();
-                }
-
-                client.stop();
-            }
-        }
-
-        currentScanIndex++;
+        IPAddress remote = discoveryUdp.remoteIP();
+        snprintf(ipaddress, sizeof(ipaddress), "%d.%d.%d.%d", remote[0], remote[1], remote[2], remote[3]);
+        addDiscoveredServer(ipaddress, packet);
     }
 }
 
-ServerInfo** websocket::getScannedServers() {
-    // Check if servers are already initialized to avoid memory leaks
-    static bool serversInitialized = false;
-    
-    if (!serversInitialized) {
-        // Clean up any existing server data first
-        for (int i = 0; i < 10; i++) {
-            if (servers[i] != nullptr) {
-                delete servers[i];
-                servers[i] = nullptr;
-            }
+void websocket::addDiscoveredServer(const char *ipaddress, char *announcement) {
+    // Format: "GHD1|<port>|<ip>|<host name>|<game name>", the sender's address is used
+    // since the advertised IP can be a loopback address
+    if (strncmp(announcement, ANNOUNCEMENT_PREFIX, strlen(ANNOUNCEMENT_PREFIX)) != 0) {
+        return;
+    }
+    char *fields[4];
+    char *rest = announcement + strlen(ANNOUNCEMENT_PREFIX);
+    for (int i = 0; i < 4; i++) {
+        fields[i] = rest;
+        char *separator = strchr(rest, '|');
+        if (separator == nullptr && i < 3) {
+            return;
         }
-        
-        // Hardcoded test servers - only create once
-        servers[0] = new ServerInfo("192.168.0.14", 80, "HostName", "GameName");
-        servers[1] = new ServerInfo("192.168.0.15", 80, "HostName2", "GameName2");
-        servers[2] = new ServerInfo("192.168.0.16", 80, "HostName3", "GameName3");
-        servers[3] = new ServerInfo("192.168.0.107", 80, "HostName4", "GameName4");
-        
-        // Ensure null termination of the array
-        for (int i = 4; i < 10; i++) {
-            servers[i] = nullptr;
+        if (separator != nullptr) {
+            *separator = '\0';
+            rest = separator + 1;
         }
-        
-        serverCount = 4;
-        serversInitialized = true;
     }
-    
+    int port = atoi(fields[0]);
+    if (port <= 0) {
+        return;
+    }
+
+    for (int i = 0; i < serverCount; i++) {
+        if (strcmp(servers[i]->ipaddress, ipaddress) == 0 && servers[i]->port == port) {
+            return;
+        }
+    }
+    if (serverCount < 10) {
+        servers[serverCount++] = new ServerInfo(ipaddress, port, fields[2], fields[3]);
+        Serial.print("Found server at: ");
+        Serial.print(ipaddress);
+        Serial.print(":");
+        Serial.println(port);
+    }
+}
+
+ServerInfo** websocket::getScannedServers() {
+    // Null terminated, filled in by updateServerScan
     return servers;
 }
 
@@ -200,9 +192,20 @@ void websocket::webSocketEvent(WStype_t type, uint8_t *payload, size_t length) {
           _stateManager->setState("MenuState");
           break;
         case WStype_CONNECTED:
+          // Ask the server for compact binary frames, old servers ignore this
+          webSocket.sendTXT(PROTOCOL_REQUEST);
           break;
         case WStype_TEXT:
 
+          // Answer clock sync requests in every state
+          // Format: "PING-<seq>-<server_ms>" -> "PONG-<seq>-<server_ms>-<millis>"
+          if (strncmp((char *)payload, "PING-", 5) == 0) {
+            char pong[64];
+            snprintf(pong, sizeof(pong), "PONG-%.*s-%lu", (int)(length - 5), (char *)payload + 5, millis());
+            webSocket.sendTXT(pong);
+            break;
+          }
+
           // If payload starts with "SM-", it indicates a state change
           if (strncmp((char *)payload, "SM-", 3) == 0) {
             // Extract the state name from the payload
@@ -215,9 +218,10 @@ void websocket::webSocketEvent(WStype_t type, uint8_t *payload, size_t length) {
 
 
           if (_stateManager) {
-            // Convert payload to char array
-            char message[length];
-            strncpy(message, (char *)payload, length);
+            // Convert payload to a null-terminated char array
+            char message[length + 1];
+            memcpy(message, payload, length);
+            message[length] = '\0';
 
             // Call the handleWebSocketEvent method of the current state
             _stateManager->handleWebSocketEvent(message);
@@ -227,8 +231,9 @@ void websocket::webSocketEvent(WStype_t type, uint8_t *payload, size_t length) {
           // webSocket.sendTXT("message here");
           break;
         case WStype_BIN:
-          // send data to server
-          // webSocket.sendBIN(payload, length);
+          if (_stateManager) {
+            _stateManager->handleBinaryEvent(payload, length);
+          }
           break;
         case WStype_ERROR:
         case WStype_FRAGMENT_TEXT_START:
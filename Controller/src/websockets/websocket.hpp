@@ -10,10 +10,11 @@ class websocket {
     private:
         static WiFiClient client;
         static WebSocketsClient webSocket;
+        static WiFiUDP discoveryUdp;
         static ServerInfo* servers[10];
         static int serverCount;
-        static int currentScanIndex;
         static unsigned long lastScanTime;
+        static void addDiscoveredServer(const char *ipaddress, char *announcement);
     public:
         static StateManager *_stateManager;
         static void initServerScan();
@@ -0,0 +1,5 @@
+# Guitar Hero Game Benchmarks Package
+"""
+This package contains the performance benchmarks for the Guitar Hero Game.
+Run them from the Game directory with: python -m benchmarks
+"""
@@ -0,0 +1,54 @@
+"""
+Command line entry point for the Guitar Hero Game benchmarks
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+# Make the game modules importable when run as "python -m benchmarks" from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import song_fixtures
+from benchmarks.harness import BenchmarkResults
+from benchmarks import stages
+
+STAGES = ("chart_load", "frame", "hit_judging", "broadcast")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Guitar Hero Game benchmarks")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--stage", action="append", choices=STAGES,
+                        help="only run the given stage, may be repeated")
+    parser.add_argument("--quick", action="store_true", help="fewer samples for a fast smoke run")
+    args = parser.parse_args(argv)
+
+    selected = args.stage or STAGES
+    repeat = 2 if args.quick else 5
+    frames = 300 if args.quick else 3000
+    messages = 50 if args.quick else 500
+
+    results = BenchmarkResults()
+    with tempfile.TemporaryDirectory(prefix="guitarhero-bench-") as work_dir:
+        songs = song_fixtures(work_dir)
+        if "chart_load" in selected:
+            stages.bench_chart_load(results, songs, work_dir, repeat)
+        if "frame" in selected:
+            stages.bench_frame(results, songs, work_dir, frames)
+        if "hit_judging" in selected:
+            stages.bench_hit_judging(results, songs, work_dir, frames)
+        if "broadcast" in selected:
+            stages.bench_broadcast(results, messages)
+
+    report = json.dumps(results.report(), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Synthetic songs for the Guitar Hero Game benchmarks
+"""
+import os
+import random
+import mido
+
+# Number of note_on events in each generated song
+SONG_SIZES = {
+    "small": 500,
+    "medium": 5000,
+    "huge": 50000,
+}
+
+
+def make_midi(path, note_count, seed=0):
+    """Write a single-track MIDI file with note_count random notes"""
+    rng = random.Random(seed)
+    midi = mido.MidiFile()
+    track = mido.MidiTrack()
+    midi.tracks.append(track)
+    track.append(mido.MetaMessage('set_tempo', tempo=500000))
+    for _ in range(note_count):
+        note = rng.randint(40, 88)
+        track.append(mido.Message('note_on', note=note, velocity=80, time=rng.randint(0, 240)))
+        track.append(mido.Message('note_off', note=note, velocity=0, time=rng.randint(10, 120)))
+    midi.save(path)
+    return path
+
+
+def song_fixtures(directory):
+    """Create the small, medium and huge songs in directory and return their paths by size"""
+    paths = {}
+    for name, note_count in SONG_SIZES.items():
+        path = os.path.join(directory, f"{name}.mid")
+        if not os.path.exists(path):
+            make_midi(path, note_count)
+        paths[name] = path
+    return paths
@@ -0,0 +1,88 @@
+"""
+Timing helpers and result collection for the Guitar Hero Game benchmarks
+"""
+import contextlib
+import datetime
+import io
+import logging
+import os
+import platform
+import sys
+import statistics
+import subprocess
+import time
+
+
+def summarize(samples):
+    """Summarize a list of timings in seconds"""
+    ordered = sorted(samples)
+    return {
+        "samples": len(ordered),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "max": ordered[-1],
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow stdout and log records so the game's own logging does not skew timings"""
+    logging.disable(logging.CRITICAL)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+class BenchmarkResults:
+    """
+    Collects benchmark results and renders them as a machine-readable report
+    """
+    def __init__(self):
+        self.results = []
+
+    def add(self, stage, case, samples, unit="s", **extra):
+        """Record the timings of one benchmark case"""
+        result = {"stage": stage, "case": case, "unit": unit}
+        result.update(summarize(samples))
+        result.update(extra)
+        self.results.append(result)
+        print(f"{stage:<12} {case:<24} median {result['median'] * 1000:10.3f} ms  "
+              f"p99 {result['p99'] * 1000:10.3f} ms  ({result['samples']} samples)",
+              file=sys.stderr)
+        return result
+
+    def report(self):
+        """Return the results together with information about the run"""
+        return {
+            "commit": current_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": self.results,
+        }
+
+
+def current_commit():
+    """Return the git commit being benchmarked, or None outside a checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def time_calls(func, repeat):
+    """Call func repeat times and return the duration of each call"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
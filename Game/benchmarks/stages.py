@@ -0,0 +1,189 @@
+"""
+Benchmark stages for the Guitar Hero Game
+"""
+import asyncio
+import os
+import queue
+import random
+import shutil
+import socket
+import time
+import websockets
+from benchmarks.harness import quiet, time_calls
+from charts.chart import ChartLevel, DEFAULT_LEVEL
+from charts.chart_cache import ChartCache
+from game_instance import GameInstance
+from models.game_clock import SimulatedClock
+from models.game_server import GameServer
+from networking.protocol import NoteBatch
+from networking.websocket_server import GameWebSocketServer
+from screens.playing_game import PlayingGameScreen
+
+
+def make_game(music_dir, cache_dir, **chart_params):
+    """Create a headless game instance with a simulated clock and its own chart cache"""
+    game = GameInstance(headless=True, clock=SimulatedClock(), music_dir=music_dir)
+    game.chart_cache = ChartCache(cache_dir=cache_dir, **chart_params)
+    game.game_server = GameServer("Benchmark")
+    return game
+
+
+def packed_levels(target_duration):
+    """A single chart level that plays the whole song in target_duration without minimum spacing"""
+    return (ChartLevel(DEFAULT_LEVEL, 4, target_duration, 0.0, 0.0),)
+
+
+def make_screen(game, midi_path):
+    """Create and enter a playing screen for a specific song"""
+    game.get_random_midi_file = lambda: midi_path
+    with quiet():
+        screen = PlayingGameScreen(game)
+        game.switch_screen(screen)
+        return screen
+
+
+def bench_chart_load(results, songs, work_dir, repeat):
+    """Time PlayingGameScreen.load_midi until the song can start, with a cold and a warm chart cache"""
+    cache_dir = os.path.join(work_dir, "chart_load_cache")
+    game = make_game(work_dir, cache_dir)
+    for size, path in songs.items():
+        screen = make_screen(game, path)
+
+        def cold_load():
+            screen.chart.close()
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            screen.load_midi()
+
+        def warm_load():
+            screen.chart.close()
+            screen.load_midi()
+
+        with quiet():
+            results.add("chart_load", f"{size}/cold", time_calls(cold_load, repeat), notes=len(screen.chart))
+            # Cold loads stream the chart, fill the cache before timing warm loads
+            game.chart_cache.load(path).close()
+            results.add("chart_load", f"{size}/warm", time_calls(warm_load, repeat * 10), notes=len(screen.chart))
+        screen.chart.close()
+
+
+def bench_frame(results, songs, work_dir, frames, densities=(2, 20, 100)):
+    """Time PlayingGameScreen.update and draw at several note densities (notes per second)"""
+    path = songs["huge"]
+    for density in densities:
+        # Pack the song so it plays at the requested density
+        game = make_game(work_dir, os.path.join(work_dir, f"frame_cache_{density}"),
+                         levels=packed_levels(50000 / density))
+        # Compile the chart up front so frames do not share the CPU with a streaming compile
+        game.chart_cache.load(path).close()
+        screen = make_screen(game, path)
+        update_samples = []
+        draw_samples = []
+        with quiet():
+            for _ in range(frames):
+                start = time.perf_counter()
+                screen.update()
+                update_samples.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                screen.draw(game.screen)
+                draw_samples.append(time.perf_counter() - start)
+
+                game.clock.tick(game.fps)
+                game.game_server.get_queued_messages()
+        on_screen = len(screen.notes)
+        results.add("frame", f"update/{density}nps", update_samples, notes_on_screen=on_screen)
+        results.add("frame", f"draw/{density}nps", draw_samples, notes_on_screen=on_screen)
+        screen.chart.close()
+
+
+def bench_hit_judging(results, songs, work_dir, frames, storms=(1, 16, 128)):
+    """Time check_note_hit when every frame carries a storm of button presses"""
+    game = make_game(work_dir, os.path.join(work_dir, "hit_cache"), levels=packed_levels(500.0))
+    screen = make_screen(game, songs["huge"])
+    rng = random.Random(0)
+    for presses in storms:
+        samples = []
+        with quiet():
+            for _ in range(frames):
+                lanes = [rng.randrange(screen.num_tracks) for _ in range(presses)]
+                start = time.perf_counter()
+                for lane in lanes:
+                    screen.check_note_hit(lane)
+                samples.append(time.perf_counter() - start)
+                game.clock.tick(game.fps)
+        results.add("hit_judging", f"{presses}_presses_per_frame", samples)
+    screen.chart.close()
+
+
+def free_port():
+    """Return a TCP port that is currently free on localhost"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _run_broadcast(game_server, client_count, message_count):
+    """Connect client_count clients, broadcast message_count messages and time their delivery"""
+    sent_at = {}
+    latencies = []
+
+    async def client(ready, done):
+        async with websockets.connect(f"ws://127.0.0.1:{game_server.Port}", max_queue=None) as ws:
+            # Skip the state change and player object sent on connect
+            await ws.recv()
+            await ws.recv()
+            ready.set_result(None)
+            received = 0
+            while received < message_count:
+                message = await ws.recv()
+                now = time.perf_counter()
+                if message.startswith("PING-"):
+                    continue  # Clock sync requests are not part of the burst
+                seq = int(message.rsplit("-", 1)[1])
+                latencies.append(now - sent_at[seq])
+                received += 1
+            done.set_result(None)
+
+    loop = asyncio.get_running_loop()
+    readies = [loop.create_future() for _ in range(client_count)]
+    dones = [loop.create_future() for _ in range(client_count)]
+    tasks = [asyncio.create_task(client(r, d)) for r, d in zip(readies, dones)]
+    await asyncio.gather(*readies)
+
+    # Wait until the server has finished registering every client
+    while len(game_server.ConnectedClients) < client_count:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.1)
+
+    start = time.perf_counter()
+    for seq in range(message_count):
+        sent_at[seq] = time.perf_counter()
+        game_server.broadcast_message(NoteBatch([(seq % 4, seq)]))
+        # Let the clients drain so the bounded send buffers are not overrun
+        if seq % 32 == 31:
+            await asyncio.sleep(0)
+    await asyncio.gather(*dones)
+    total = time.perf_counter() - start
+
+    await asyncio.gather(*tasks)
+    return latencies, total
+
+
+def bench_broadcast(results, message_count, client_counts=(1, 8, 32, 128)):
+    """Time broadcast fan-out from GameWebSocketServer to simulated clients"""
+    for client_count in client_counts:
+        game_server = GameServer("Benchmark")
+        game_server.Port = free_port()
+        server = GameWebSocketServer(game_server, queue.Queue())
+        with quiet():
+            server.start()
+            time.sleep(0.5)
+            try:
+                latencies, total = asyncio.run(_run_broadcast(game_server, client_count, message_count))
+            finally:
+                server.stop()
+        results.add(
+            "broadcast", f"{client_count}_clients", latencies,
+            messages=message_count,
+            deliveries_per_second=client_count * message_count / total
+        )
@@ -0,0 +1,4 @@
+# Guitar Hero Game Charts Package
+"""
+This package contains the chart compiler and the on-disk chart cache for the Guitar Hero Game
+"""
@@ -0,0 +1,175 @@
+"""
+Compiled note chart for Guitar Hero Game songs
+"""
+import mmap
+import os
+import struct
+import tempfile
+from collections import namedtuple
+import numpy as np
+
+CHART_MAGIC = b"GHCH"
+CHART_VERSION = 2
+
+# Header layout: magic, version, section count, cache key
+HEADER_FORMAT = "<4sHH40s"
+HEADER_SIZE = 64
+
+# Section table entry after the header, one per difficulty level:
+# level name, lane count, note count, tempo scale, offset of the note arrays
+SECTION_FORMAT = "<16sHIdQ"
+SECTION_SIZE = struct.calcsize(SECTION_FORMAT)
+
+# A difficulty level of a song. Notes closer than note_gap seconds to the previous
+# kept note are dropped, the rest are pushed back to be at least min_spacing apart.
+ChartLevel = namedtuple("ChartLevel", ["name", "num_tracks", "target_duration", "min_spacing", "note_gap"])
+
+CHART_LEVELS = (
+    ChartLevel("Easy", 3, 120.0, 0.75, 0.5),
+    ChartLevel("Medium", 4, 120.0, 0.5, 0.0),
+    ChartLevel("Hard", 4, 120.0, 0.25, 0.0),
+)
+DEFAULT_LEVEL = "Medium"
+
+
+class Chart:
+    """
+    Packed arrays of hit time, lane and pitch for every note of one difficulty level of a song
+    """
+    def __init__(self, times, lanes, pitches, num_tracks=4, tempo_scale=1.0, key="", level=""):
+        self.times = times          # Hit time of each note in seconds (after scaling)
+        self.lanes = lanes          # Lane (track) index of each note
+        self.pitches = pitches      # Original MIDI pitch of each note
+        self.num_tracks = num_tracks
+        self.tempo_scale = tempo_scale
+        self.key = key
+        self.level = level          # Difficulty level name
+        self.available = len(times)  # Notes ready to play, see StreamingChart
+        self._mmap = None
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def duration(self):
+        """Hit time of the last note in seconds"""
+        return self.times[-1] if len(self.times) else 0.0
+
+    def lane_counts(self):
+        """Number of notes in each lane"""
+        return np.bincount(self.lanes, minlength=self.num_tracks)[:self.num_tracks].tolist()
+
+    def save(self, path):
+        """Write the chart to disk as a file with a single level"""
+        save_charts(path, [self], self.key)
+
+    @classmethod
+    def load(cls, path, expected_key=None, level=None):
+        """
+        Memory map one level of a chart file, the first if level is None, raising
+        ValueError if the file is invalid or stale and KeyError if it has no such level
+        """
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            key, sections = read_sections(mm, path, expected_key)
+            if level is None:
+                level = next(iter(sections))
+            if level not in sections:
+                raise KeyError(f"No {level} chart in {path}")
+            num_tracks, count, tempo_scale, offset = sections[level]
+
+            # Slice the packed arrays straight out of the mapping without copying
+            view = memoryview(mm)
+            times_end = offset + count * 8
+            lanes_end = times_end + count
+            chart = cls(
+                view[offset:times_end].cast("d"),
+                view[times_end:lanes_end],
+                view[lanes_end:lanes_end + count],
+                num_tracks=num_tracks,
+                tempo_scale=tempo_scale,
+                key=key,
+                level=level
+            )
+            view.release()
+        except Exception:
+            mm.close()
+            raise
+
+        chart._mmap = mm
+        return chart
+
+    def close(self):
+        """Release the memory map backing this chart, if any"""
+        if self._mmap is None:
+            return
+        for arr in (self.times, self.lanes, self.pitches):
+            arr.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Arrays built on top of the chart still reference the mapping,
+            # it is unmapped once the last of them is garbage collected
+            pass
+        self._mmap = None
+
+
+def save_charts(path, charts, key=""):
+    """Write the levels of a song into one chart file, replacing any existing file atomically"""
+    offset = HEADER_SIZE + SECTION_SIZE * len(charts)
+    header = struct.pack(HEADER_FORMAT, CHART_MAGIC, CHART_VERSION, len(charts), key.encode("ascii"))
+    sections = []
+    for chart in charts:
+        sections.append(struct.pack(
+            SECTION_FORMAT, chart.level.encode("ascii"), chart.num_tracks,
+            len(chart), chart.tempo_scale, offset
+        ))
+        offset += len(chart) * 10
+
+    # A temp file of its own, several threads may compile the same song at once
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            f.write(b"".join(sections))
+            for chart in charts:
+                f.write(np.ascontiguousarray(chart.times, dtype=np.float64).tobytes())
+                f.write(np.ascontiguousarray(chart.lanes, dtype=np.uint8).tobytes())
+                f.write(np.ascontiguousarray(chart.pitches, dtype=np.uint8).tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_sections(mm, path, expected_key=None):
+    """
+    Validate a mapped chart file and return its cache key and section table of
+    level -> (num_tracks, count, tempo_scale, offset) in file order
+    """
+    if len(mm) < HEADER_SIZE:
+        raise ValueError(f"Chart file too short: {path}")
+
+    magic, version, section_count, key = struct.unpack_from(HEADER_FORMAT, mm)
+    key = key.rstrip(b"\0").decode("ascii")
+    if magic != CHART_MAGIC or version != CHART_VERSION:
+        raise ValueError(f"Unsupported chart file: {path}")
+    if expected_key is not None and key != expected_key:
+        raise ValueError(f"Stale chart file: {path}")
+    table_end = HEADER_SIZE + SECTION_SIZE * section_count
+    if not section_count or len(mm) < table_end:
+        raise ValueError(f"Truncated chart file: {path}")
+
+    sections = {}
+    end = table_end
+    for i in range(section_count):
+        level, num_tracks, count, tempo_scale, offset = struct.unpack_from(
+            SECTION_FORMAT, mm, HEADER_SIZE + SECTION_SIZE * i
+        )
+        sections[level.rstrip(b"\0").decode("ascii")] = (num_tracks, count, tempo_scale, offset)
+        end = max(end, offset + count * 10)
+    if len(mm) != end:
+        raise ValueError(f"Truncated chart file: {path}")
+    return key, sections
@@ -0,0 +1,101 @@
+"""
+On-disk cache of compiled charts for the Guitar Hero Game
+"""
+import logging
+import hashlib
+import os
+from charts.chart import Chart, CHART_LEVELS, CHART_VERSION, DEFAULT_LEVEL, save_charts
+from charts.chart_compiler import compile_midi
+from charts.streaming_chart import StreamingChart
+
+logger = logging.getLogger(__name__)
+
+
+class ChartCache:
+    """
+    Stores compiled charts keyed by MIDI file hash and scaling parameters.
+
+    Each song is compiled into every difficulty level in levels from a single
+    parse, and all of them are stored in one file, so switching level only maps
+    another section of the same file.
+    """
+    def __init__(self, cache_dir=None, levels=CHART_LEVELS, lane_mapping="linear"):
+        if cache_dir is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            cache_dir = os.path.join(base_dir, '.chart_cache')
+        self.cache_dir = cache_dir
+        self.levels = tuple(levels)
+        self.lane_mapping = lane_mapping  # See midi_stream.lane_table
+
+    def cache_key(self, midi_path):
+        """Hash the MIDI file contents together with the chart parameters"""
+        digest = hashlib.sha1()
+        with open(midi_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                digest.update(block)
+        params = f"{CHART_VERSION}:{self.lane_mapping}:{self.levels}"
+        digest.update(params.encode("ascii"))
+        return digest.hexdigest()
+
+    def chart_path(self, key):
+        """Return the cache file path for a chart key"""
+        return os.path.join(self.cache_dir, f"{key}.chart")
+
+    @property
+    def default_level(self):
+        """Name of the level to play when none is chosen"""
+        names = self.level_names()
+        return DEFAULT_LEVEL if DEFAULT_LEVEL in names else names[0]
+
+    def level_names(self):
+        """Return the names of the difficulty levels, easiest first"""
+        return [level.name for level in self.levels]
+
+    def load(self, midi_path, level=None, streaming=False):
+        """
+        Load one level of the chart for a MIDI file, the default level if level is None,
+        rebuilding the chart if the cache is missing or stale.
+
+        With streaming, a missing chart is returned as a StreamingChart that is still
+        compiling in the background and is written to the cache once it is complete.
+        """
+        if level is None:
+            level = self.default_level
+        chart_level = next((entry for entry in self.levels if entry.name == level), None)
+        if chart_level is None:
+            raise KeyError(f"Unknown chart level {level}")
+        key = self.cache_key(midi_path)
+        path = self.chart_path(key)
+
+        try:
+            return Chart.load(path, expected_key=key, level=level)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.info("Rebuilding chart cache entry: %s", e)
+
+        if streaming:
+            return StreamingChart(
+                midi_path,
+                chart_level,
+                levels=self.levels,
+                lane_mapping=self.lane_mapping,
+                key=key,
+                on_complete=lambda charts: self.store(charts, key)
+            )
+
+        charts = compile_midi(midi_path, self.levels, self.lane_mapping, key)
+        if self.store(charts, key):
+            return Chart.load(path, expected_key=key, level=level)
+        # Fall back to the in-memory chart if the cache is not writable
+        return next(chart for chart in charts if chart.level == level)
+
+    def store(self, charts, key):
+        """Write the compiled levels of a song to the cache, returning False if that failed"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            save_charts(self.chart_path(key), charts, key)
+            return True
+        except OSError as e:
+            logger.warning("Could not write chart cache: %s", e)
+            return False
@@ -0,0 +1,79 @@
+"""
+Compiles MIDI files into note charts for the Guitar Hero Game
+"""
+from array import array
+import numpy as np
+from charts.chart import Chart, CHART_LEVELS
+from charts.midi_stream import SmfReader, lane_table
+
+
+def read_notes(midi_path):
+    """Return the raw hit times and pitches of every note in a MIDI file as arrays"""
+    times = array("d")
+    pitches = array("B")
+    with SmfReader(midi_path) as reader:
+        for time, pitch in reader.note_events():
+            times.append(time)
+            pitches.append(pitch)
+    return np.array(times, dtype=np.float64), np.array(pitches, dtype=np.uint8)
+
+
+def tempo_scale_for(raw_times, target_duration):
+    """Return the scale that makes the song last target_duration, or None if it cannot be scaled"""
+    if len(raw_times) < 2 or raw_times[-1] <= 0:
+        return None
+    return target_duration / raw_times[-1]
+
+
+def thin_notes(times, note_gap):
+    """Return the indices of the notes kept when dropping notes closer than note_gap to the last kept one"""
+    if note_gap <= 0 or not len(times):
+        return np.arange(len(times))
+    kept = [0]
+    # Jump straight to the next note far enough away, one search per kept note
+    while True:
+        following = int(np.searchsorted(times, times[kept[-1]] + note_gap, side="left"))
+        if following >= len(times):
+            return np.array(kept, dtype=np.intp)
+        kept.append(following)
+
+
+def space_times(times, min_spacing):
+    """Push notes back so consecutive notes are at least min_spacing apart"""
+    # Pushing each note to max(time, previous + min_spacing) unrolls into
+    # i * min_spacing + the running maximum of time_j - j * min_spacing
+    steps = np.arange(len(times)) * min_spacing
+    return np.maximum.accumulate(times - steps) + steps
+
+
+def compile_level(raw_times, pitches, level, lane_mapping="linear", key=""):
+    """Build the chart of one difficulty level from the raw notes of a song"""
+    # Lanes come from the pitches of the whole song, before any notes are dropped
+    lanes = np.array(lane_table(np.bincount(pitches, minlength=128).tolist(), level.num_tracks, lane_mapping),
+                     dtype=np.uint8)
+
+    tempo_scale = tempo_scale_for(raw_times, level.target_duration)
+    if tempo_scale is None:
+        # Default scaling if we don't have enough events
+        times = raw_times.copy()
+        tempo_scale = 1.0
+    else:
+        # Scale the timings so the whole song takes about target_duration
+        times = raw_times * tempo_scale
+        kept = thin_notes(times, level.note_gap)
+        times = space_times(times[kept], level.min_spacing)
+        pitches = pitches[kept]
+
+    return Chart(times, lanes[pitches], pitches, num_tracks=level.num_tracks, tempo_scale=tempo_scale,
+                 key=key, level=level.name)
+
+
+def compile_levels(raw_times, pitches, levels=CHART_LEVELS, lane_mapping="linear", key=""):
+    """Build a chart for every difficulty level from the same raw notes"""
+    return [compile_level(raw_times, pitches, level, lane_mapping, key) for level in levels]
+
+
+def compile_midi(midi_path, levels=CHART_LEVELS, lane_mapping="linear", key=""):
+    """Parse a MIDI file once and build a chart of scaled hit times, lanes and pitches for each level"""
+    raw_times, pitches = read_notes(midi_path)
+    return compile_levels(raw_times, pitches, levels, lane_mapping, key)
@@ -0,0 +1,72 @@
+"""
+Per-lane sorted hit times for judging notes in a chart
+"""
+import numpy as np
+
+
+class LaneIndex:
+    """
+    Splits a chart into one sorted timestamp array per lane so a hit can be
+    judged with a binary search instead of scanning every note.
+
+    Only the first count notes are indexed, extend() adds the notes a
+    StreamingChart has compiled since. The lane arrays are allocated once from
+    the chart's lane counts and filled in place.
+    """
+    def __init__(self, chart, count=None):
+        self.times = np.asarray(chart.times, dtype=np.float64)
+        self.lanes = np.asarray(chart.lanes)
+        self.count = 0
+        capacity = chart.lane_counts()
+        self.lane_times = [np.empty(size) for size in capacity]  # Sorted hit times of the notes in each lane
+        self.lane_notes = [np.empty(size, dtype=np.intp) for size in capacity]  # Chart note index of each entry
+        self.filled = [0] * len(capacity)  # Entries of each lane indexed so far
+        self.extend(len(self.times) if count is None else count)
+
+    def extend(self, count):
+        """Index the chart notes up to count, which are later than every indexed note"""
+        if count <= self.count:
+            return
+        start = self.count
+        lanes = self.lanes[start:count]
+        for lane in range(len(self.lane_notes)):
+            notes = np.flatnonzero(lanes == lane) + start
+            if not len(notes):
+                continue
+            begin = self.filled[lane]
+            end = begin + len(notes)
+            if end > len(self.lane_notes[lane]):
+                self._grow(lane, end)
+            self.lane_notes[lane][begin:end] = notes
+            self.lane_times[lane][begin:end] = self.times[notes]
+            self.filled[lane] = end
+        self.count = count
+
+    def _grow(self, lane, size):
+        """Make room for size entries in a lane whose count was underestimated"""
+        size = max(size, 2 * len(self.lane_notes[lane]))
+        filled = self.filled[lane]
+        for arrays in (self.lane_notes, self.lane_times):
+            grown = np.empty(size, dtype=arrays[lane].dtype)
+            grown[:filled] = arrays[lane][:filled]
+            arrays[lane] = grown
+
+    def hit_time(self, note):
+        """Return the hit time of a chart note"""
+        return float(self.times[note])
+
+    def find(self, lane, hit_time, window, judged):
+        """Return the earliest unjudged note in the lane within window seconds of hit_time, or -1"""
+        if not 0 <= lane < len(self.lane_times):
+            return -1
+        lane_times = self.lane_times[lane][:self.filled[lane]]
+        lo = int(np.searchsorted(lane_times, hit_time - window, side="left"))
+        hi = int(np.searchsorted(lane_times, hit_time + window, side="right"))
+
+        # Only the few notes inside the window are ever inspected
+        lane_notes = self.lane_notes[lane]
+        for i in range(lo, hi):
+            note = lane_notes[i]
+            if not judged[note]:
+                return int(note)
+        return -1
@@ -0,0 +1,315 @@
+"""
+Streaming MIDI reader and chart pipeline for the Guitar Hero Game
+"""
+import heapq
+import mmap
+import struct
+from collections import namedtuple
+from operator import itemgetter
+
+DEFAULT_TEMPO = 500000  # Microseconds per beat until the first set_tempo
+
+# Event kinds yielded by SmfReader.track_events
+NOTE = 0
+TEMPO = 1
+
+# Data byte count of the system common messages, which have no running status
+SYSTEM_DATA_LENGTHS = {0xF1: 1, 0xF2: 2, 0xF3: 1}
+
+# How pitches are split between lanes, see lane_table
+LANE_MAPPINGS = ("linear", "quantile")
+
+NoteSummary = namedtuple("NoteSummary", ["note_count", "last_time", "min_pitch", "max_pitch", "pitch_counts"])
+
+
+class SmfReader:
+    """
+    Reads the note_on and set_tempo events of a Standard MIDI File straight from
+    a memory map, one track event at a time, without building message objects
+    """
+    def __init__(self, midi_path):
+        with open(midi_path, "rb") as f:
+            try:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f"{midi_path} is empty")
+
+        if self.data[:4] != b"MThd":
+            self.close()
+            raise ValueError(f"{midi_path} is not a MIDI file")
+        header_length = struct.unpack_from(">I", self.data, 4)[0]
+        self.type, _, self.ticks_per_beat = struct.unpack_from(">HHH", self.data, 8)
+
+        # Find the track chunks, skipping any chunk type we do not know
+        self.tracks = []  # (start, end) offsets of each track's events
+        pos = 8 + header_length
+        while pos + 8 <= len(self.data):
+            name = self.data[pos:pos + 4]
+            length = struct.unpack_from(">I", self.data, pos + 4)[0]
+            start = pos + 8
+            if name == b"MTrk":
+                self.tracks.append((start, min(start + length, len(self.data))))
+            pos = start + length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def track_events(self, track):
+        """Yield (tick, kind, value) for the notes and tempo changes of a track"""
+        data = self.data
+        pos, end = self.tracks[track]
+        tick = 0
+        status = None
+        while pos < end:
+            # Delta time as a variable length quantity
+            byte = data[pos]
+            pos += 1
+            delta = byte & 0x7F
+            while byte & 0x80:
+                byte = data[pos]
+                pos += 1
+                delta = (delta << 7) | (byte & 0x7F)
+            tick += delta
+
+            byte = data[pos]
+            if byte >= 0x80:
+                pos += 1
+                if byte == 0xFF:
+                    # Meta event, these do not change the running status
+                    meta_type = data[pos]
+                    pos += 1
+                    length = 0
+                    while True:
+                        byte = data[pos]
+                        pos += 1
+                        length = (length << 7) | (byte & 0x7F)
+                        if byte < 0x80:
+                            break
+                    if meta_type == 0x51 and length == 3:
+                        yield tick, TEMPO, (data[pos] << 16) | (data[pos + 1] << 8) | data[pos + 2]
+                    pos += length
+                    continue
+                status = byte
+            elif status is None:
+                raise ValueError("Running status without a previous status byte")
+
+            if status in (0xF0, 0xF7):
+                # System exclusive data with its own length
+                length = 0
+                while True:
+                    byte = data[pos]
+                    pos += 1
+                    length = (length << 7) | (byte & 0x7F)
+                    if byte < 0x80:
+                        break
+                pos += length
+            elif status >= 0xF0:
+                pos += SYSTEM_DATA_LENGTHS.get(status, 0)
+            elif status & 0xF0 in (0xC0, 0xD0):
+                pos += 1
+            else:
+                if status & 0xF0 == 0x90 and data[pos + 1] > 0:
+                    yield tick, NOTE, data[pos]
+                pos += 2
+
+    def note_events(self):
+        """
+        Yield (time_in_seconds, pitch) for every note_on of every track in playback
+        order, the same times iterating a mido.MidiFile gives
+        """
+        if self.type == 2:
+            raise TypeError("can't merge tracks in type 2 (asynchronous) file")
+
+        tempo = DEFAULT_TEMPO
+        seconds_per_tick = 1e-6 / self.ticks_per_beat
+        last_tick = 0
+        seconds = 0.0
+        tracks = [self.track_events(track) for track in range(len(self.tracks))]
+        # Only the next event of each track is held in memory while merging
+        for tick, kind, value in heapq.merge(*tracks, key=itemgetter(0)):
+            if tick != last_tick:
+                seconds += (tick - last_tick) * tempo * seconds_per_tick
+                last_tick = tick
+            if kind == NOTE:
+                yield seconds, value
+            else:
+                tempo = value
+
+    def summarize(self):
+        """
+        Count the notes of each pitch and find the time of the last note.
+
+        Cheaper than a pass over note_events(): each track is walked on its own
+        without merging, and only the last note tick is converted to seconds.
+        """
+        if self.type == 2:
+            raise TypeError("can't merge tracks in type 2 (asynchronous) file")
+
+        pitch_counts = [0] * 128
+        last_tick = 0
+        tempos = []  # (tick, tempo) in the order note_events() applies them
+        for track in range(len(self.tracks)):
+            track_last = 0  # Ticks only grow within a track
+            for tick, kind, value in self.track_events(track):
+                if kind == NOTE:
+                    pitch_counts[value] += 1
+                    track_last = tick
+                else:
+                    tempos.append((tick, value))
+            last_tick = max(last_tick, track_last)
+        tempos.sort(key=itemgetter(0))
+
+        # Seconds at the last note tick with the tempo map of the whole file
+        tempo = DEFAULT_TEMPO
+        seconds_per_tick = 1e-6 / self.ticks_per_beat
+        tick = 0
+        seconds = 0.0
+        for change_tick, value in tempos:
+            if change_tick >= last_tick:
+                break
+            seconds += (change_tick - tick) * tempo * seconds_per_tick
+            tick = change_tick
+            tempo = value
+        seconds += (last_tick - tick) * tempo * seconds_per_tick
+
+        note_count = sum(pitch_counts)
+        used = [pitch for pitch, count in enumerate(pitch_counts) if count]
+        min_pitch = used[0] if used else 0
+        max_pitch = used[-1] if used else 0
+        return NoteSummary(note_count, seconds if note_count else 0.0, min_pitch, max_pitch, pitch_counts)
+
+
+def lane_table(pitch_counts, num_tracks, mapping="linear"):
+    """
+    Return the lane of every MIDI pitch given how many notes each pitch has.
+
+    linear splits the pitch range into equally wide lanes, quantile splits the
+    notes so each lane gets about the same number of them. Both keep lower
+    pitches in lower lanes.
+    """
+    if mapping not in LANE_MAPPINGS:
+        raise ValueError(f"Unknown lane mapping {mapping}")
+    used = [pitch for pitch, count in enumerate(pitch_counts) if count]
+    last_lane = num_tracks - 1
+
+    if mapping == "quantile" and used:
+        # Place each pitch by the middle of its notes in the sorted order of all notes
+        total = sum(pitch_counts)
+        table = []
+        below = 0
+        for count in pitch_counts:
+            table.append(min(int((below + count / 2) * num_tracks / total), last_lane))
+            below += count
+        return table
+
+    # Default pitch range if there are no notes
+    note_min = used[0] if used else 60
+    note_max = used[-1] if used else 72
+    note_range = max(note_max - note_min, 1)
+    return [min(max(int((pitch - note_min) * num_tracks / note_range), 0), last_lane)
+            for pitch in range(len(pitch_counts))]
+
+
+def scale_times(note_events, tempo_scale):
+    """Stretch note times by tempo_scale"""
+    for time, pitch in note_events:
+        yield time * tempo_scale, pitch
+
+
+def drop_close_notes(note_events, note_gap):
+    """Drop notes closer than note_gap seconds to the last note that was kept"""
+    next_time = float("-inf")
+    for time, pitch in note_events:
+        if time >= next_time:
+            next_time = time + note_gap
+            yield time, pitch
+
+
+def enforce_spacing(note_events, min_spacing):
+    """
+    Push notes back so consecutive notes are at least min_spacing seconds apart.
+
+    Note i ends up at i * min_spacing + max(time_j - j * min_spacing for j <= i),
+    which is the same as moving each note to max(time, previous + min_spacing)
+    and matches the vectorized version in chart_compiler exactly.
+    """
+    shifted = float("-inf")
+    for i, (time, pitch) in enumerate(note_events):
+        step = i * min_spacing
+        shifted = max(shifted, time - step)
+        yield shifted + step, pitch
+
+
+def assign_lanes(note_events, lanes):
+    """Look up the lane of each pitch in a lane_table, yielding (time, lane, pitch)"""
+    for time, pitch in note_events:
+        yield time, lanes[pitch], pitch
+
+
+class ChartStream:
+    """
+    The notes of a MIDI file as a lazily computed chart.
+
+    A summary pass finds what the scaling and lane mapping need, then iterating
+    yields (time, lane, pitch) for one ChartLevel one note at a time, so a chart
+    of any length can be built while holding only one pending event per MIDI
+    track. The result is the same as chart_compiler.compile_level, up to
+    float rounding of the last note time.
+
+    The summary has to see the whole file: the scale stretches the song to the
+    level's target duration, so the first hit time depends on the last note,
+    and the lanes split the pitches of the whole song. A chart built from a
+    first window would differ from the cached one the next time it is played.
+    """
+    def __init__(self, midi_path, level, lane_mapping="linear"):
+        self.reader = SmfReader(midi_path)
+        self.level = level
+        try:
+            self.summary = self.reader.summarize()
+            self.lane_of_pitch = lane_table(self.summary.pitch_counts, level.num_tracks, lane_mapping)
+        except Exception:
+            self.close()
+            raise
+
+        # Scale the timings so the whole song takes about target_duration
+        self.tempo_scale = 1.0
+        self.scaled = self.summary.note_count > 1 and self.summary.last_time > 0
+        if self.scaled:
+            self.tempo_scale = level.target_duration / self.summary.last_time
+
+    def __len__(self):
+        """Number of notes in the song, an upper bound on the notes of a level that drops notes"""
+        return self.summary.note_count
+
+    def lane_counts(self):
+        """Number of notes in each lane, an upper bound for a level that drops notes"""
+        counts = [0] * self.level.num_tracks
+        for lane, count in zip(self.lane_of_pitch, self.summary.pitch_counts):
+            counts[lane] += count
+        return counts
+
+    def __iter__(self):
+        notes = self.reader.note_events()
+        if self.scaled:
+            notes = scale_times(notes, self.tempo_scale)
+            if self.level.note_gap > 0:
+                notes = drop_close_notes(notes, self.level.note_gap)
+            notes = enforce_spacing(notes, self.level.min_spacing)
+        return assign_lanes(notes, self.lane_of_pitch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.reader.close()
@@ -0,0 +1,36 @@
+"""
+Lookahead scheduling of chart notes for the controllers
+"""
+import numpy as np
+
+
+class NoteScheduler:
+    """
+    Hands out the next few seconds of a chart in one go, so controllers receive
+    a handful of batched frames instead of one frame per note
+    """
+    def __init__(self, chart, lead_in, lookahead=4.0, refill=1.0):
+        self.chart = chart
+        self.times = np.asarray(chart.times, dtype=np.float64)
+        self.lanes = np.asarray(chart.lanes)
+        self.lead_in = lead_in      # Seconds between the game start and song time zero
+        self.lookahead = lookahead  # Seconds of chart sent ahead of the song clock
+        self.refill = refill        # Send the next batch when less than this much is left
+        self.next_index = 0
+        self.sent_until = None
+
+    def poll(self, song_time):
+        """Return the (track, time_in_ms) pairs that are due to be sent, or an empty list"""
+        if self.next_index >= len(self.times):
+            return []
+        if self.sent_until is not None and song_time + self.refill < self.sent_until:
+            return []
+
+        self.sent_until = song_time + self.lookahead
+        end = int(np.searchsorted(self.times, self.sent_until, side="right"))
+        start = self.next_index
+        self.next_index = max(end, start)
+
+        # Note times are sent in ms since the game start
+        times_ms = ((self.times[start:end] + self.lead_in) * 1000).astype(np.int64)
+        return list(zip(self.lanes[start:end].tolist(), times_ms.tolist()))
@@ -0,0 +1,176 @@
+"""
+Persistent index of the songs in the music directory
+"""
+import logging
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from charts.midi_stream import SmfReader
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# Note density thresholds in notes per second of the original song
+DIFFICULTIES = [("Easy", 2.0), ("Medium", 5.0), ("Hard", float("inf"))]
+
+SongInfo = namedtuple("SongInfo", [
+    "path", "name", "track_count", "note_count", "duration",
+    "min_pitch", "max_pitch", "note_density", "difficulty"
+])
+
+SONG_COLUMNS = ", ".join(SongInfo._fields)
+
+
+def difficulty_for(note_density):
+    """Name the difficulty of a song from its note density"""
+    for name, limit in DIFFICULTIES:
+        if note_density < limit:
+            return name
+    return DIFFICULTIES[-1][0]
+
+
+def read_song_info(midi_path):
+    """Extract the metadata of a MIDI file, runs in a worker process"""
+    with SmfReader(midi_path) as reader:
+        note_count, last_note, min_pitch, max_pitch, _ = reader.summarize()
+        track_count = len(reader.tracks)
+
+    note_density = note_count / last_note if last_note > 0 else 0.0
+    name = os.path.splitext(os.path.basename(midi_path))[0]
+    return SongInfo(midi_path, name, track_count, note_count, last_note,
+                    min_pitch, max_pitch, note_density, difficulty_for(note_density))
+
+
+class SongIndex:
+    """
+    SQLite index of song metadata.
+
+    Metadata is read once per file and only re-read when the file's mtime or size
+    changes, so even thousands of songs are cheap to keep up to date and can be
+    searched in milliseconds.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.lock, self.db:
+            version = self.db.execute("PRAGMA user_version").fetchone()[0]
+            if version != INDEX_VERSION:
+                # Rebuild rather than migrate, the index only caches what is in the files
+                self.db.execute("DROP TABLE IF EXISTS songs")
+                self.db.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS songs (
+                    path TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    track_count INTEGER,
+                    note_count INTEGER,
+                    duration REAL,
+                    min_pitch INTEGER,
+                    max_pitch INTEGER,
+                    note_density REAL,
+                    difficulty TEXT
+                )
+            """)
+            self.db.execute("CREATE INDEX IF NOT EXISTS songs_name ON songs (name COLLATE NOCASE)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS songs_density ON songs (note_density)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS songs_duration ON songs (duration)")
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+
+    def stale(self, files):
+        """
+        Return the paths in files, a dict of path -> (mtime, size), that are new or
+        changed, and delete the songs that are gone
+        """
+        with self.lock, self.db:
+            known = {path: (mtime, size) for path, mtime, size in
+                     self.db.execute("SELECT path, mtime, size FROM songs")}
+            removed = [(path,) for path in known if path not in files]
+            self.db.executemany("DELETE FROM songs WHERE path = ?", removed)
+        return [path for path, stat in files.items() if known.get(path) != stat]
+
+    def update(self, files, read_info=read_song_info, map_func=map):
+        """
+        Bring the index up to date with files, reading metadata of new and changed
+        songs with map_func so a process pool can do the parsing
+        """
+        stale = self.stale(files)
+        if not stale:
+            return 0
+
+        rows = []
+        for path, info in zip(stale, map_func(_read_or_none, [read_info] * len(stale), stale)):
+            if info is None:
+                logger.warning("Could not index %s", os.path.basename(path))
+                continue
+            mtime, size = files[path]
+            rows.append((info.path, info.name, mtime, size) + tuple(info[2:]))
+
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO songs (path, name, mtime, size, track_count, note_count, duration, "
+                "min_pitch, max_pitch, note_density, difficulty) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def get(self, path):
+        """Return the SongInfo of a song, or None"""
+        with self.lock:
+            row = self.db.execute(f"SELECT {SONG_COLUMNS} FROM songs WHERE path = ?", (path,)).fetchone()
+        return SongInfo(*row) if row else None
+
+    def search(self, text="", difficulty=None, min_duration=None, max_duration=None,
+               min_density=None, max_density=None, order_by="name", limit=50, offset=0):
+        """Find songs by name, difficulty, duration and note density"""
+        if order_by not in ("name", "duration", "note_density", "note_count"):
+            raise ValueError(f"Cannot order songs by {order_by}")
+
+        conditions = []
+        params = []
+        if text:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        for column, operator, value in (
+            ("difficulty", "=", difficulty),
+            ("duration", ">=", min_duration),
+            ("duration", "<=", max_duration),
+            ("note_density", ">=", min_density),
+            ("note_density", "<=", max_density),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        collate = " COLLATE NOCASE" if order_by == "name" else ""
+        query = f"SELECT {SONG_COLUMNS} FROM songs {where} ORDER BY {order_by}{collate} LIMIT ? OFFSET ?"
+        with self.lock:
+            rows = self.db.execute(query, params + [limit, offset]).fetchall()
+        return [SongInfo(*row) for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def _read_or_none(read_info, path):
+    """Read song info, returning None for files that cannot be parsed"""
+    try:
+        return read_info(path)
+    except Exception:
+        return None
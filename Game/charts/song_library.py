@@ -0,0 +1,179 @@
+"""
+Song library for the Guitar Hero Game, indexes the music directory and prepares charts in the background
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from charts.chart_cache import ChartCache
+from charts.song_index import SongIndex
+
+logger = logging.getLogger(__name__)
+
+MIDI_EXTENSIONS = ('.mid', '.midi')
+
+
+def prepare_chart(midi_path, cache_dir, levels, lane_mapping):
+    """Make sure the charts for midi_path are in the cache, runs in a worker process"""
+    cache = ChartCache(cache_dir, levels, lane_mapping)
+    cache.load(midi_path).close()
+    return midi_path
+
+
+class SongLibrary:
+    """
+    Keeps an index of the MIDI files in the music directory and a queue of songs
+    whose charts are already compiled, so starting a round never parses MIDI.
+
+    The directory is scanned once and then polled for changes by a watcher thread.
+    Charts are compiled into the chart cache by a process pool because MIDI parsing
+    is CPU-bound Python, and the compiled songs are handed out by next_song(). The
+    watcher also keeps a SongIndex of song metadata up to date for search().
+    """
+    def __init__(self, music_dir, chart_cache, ready_size=2, workers=2, scan_interval=2.0):
+        self.music_dir = music_dir
+        self.chart_cache = chart_cache
+        self.ready_size = ready_size    # Songs to keep compiled ahead of time
+        self.workers = workers
+        self.scan_interval = scan_interval
+        self.lock = threading.RLock()  # Done callbacks may run inside _fill
+        self.files = None               # name -> (mtime, size) from the last scan
+        self.song_paths = []
+        self.ready = queue.Queue()      # Paths of songs with a compiled chart
+        self.pending = set()            # Paths being compiled
+        self.executor = None
+        self.watcher = None
+        self.index = None               # SongIndex, opened by start()
+        self.stop_event = threading.Event()
+
+    def songs(self):
+        """Return the indexed MIDI files, scanning the directory on first use"""
+        if self.files is None:
+            self.scan()
+        return self.song_paths
+
+    def scan(self):
+        """Index the music directory, returning True if it changed since the last scan"""
+        files = {}
+        try:
+            with os.scandir(self.music_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.lower().endswith(MIDI_EXTENSIONS):
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_mtime, stat.st_size)
+        except FileNotFoundError:
+            pass
+
+        with self.lock:
+            if files == self.files:
+                return False
+            self.files = files
+            self.song_paths = sorted(os.path.join(self.music_dir, name) for name in files)
+        return True
+
+    def start(self):
+        """Index the library and start compiling songs in the background"""
+        if self.executor:
+            return
+        self.scan()
+        self.stop_event.clear()
+        try:
+            self.index = SongIndex(os.path.join(self.chart_cache.cache_dir, "song_index.sqlite"))
+        except Exception as e:
+            logger.warning("Could not open the song index: %s", e)
+        # Spawned workers do not inherit the window or the server threads
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self.watcher = threading.Thread(target=self._watch, daemon=True)
+        self.watcher.start()
+        self._fill()
+
+    def stop(self):
+        """Stop the watcher and the worker processes"""
+        self.stop_event.set()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.watcher:
+            self.watcher.join(1.0)
+            self.watcher = None
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+    def search(self, **filters):
+        """Search the song index, see SongIndex.search for the filters"""
+        if self.index is None:
+            return []
+        return self.index.search(**filters)
+
+    def next_song(self):
+        """Take a song with a compiled chart off the ready queue, or None if none is ready yet"""
+        song = None
+        while song is None:
+            try:
+                song = self.ready.get_nowait()
+            except queue.Empty:
+                break
+            if not os.path.exists(song):
+                song = None  # Removed since it was compiled
+        self._fill()
+        return song
+
+    def _watch(self):
+        """Keep the index up to date and rescan the music directory until stopped"""
+        self._update_index()
+        while not self.stop_event.wait(self.scan_interval):
+            if self.scan():
+                logger.info("Music library changed, %d songs", len(self.song_paths))
+                self._fill()
+                self._update_index()
+
+    def _update_index(self):
+        """Read the metadata of new and changed songs in the worker processes"""
+        executor = self.executor
+        if self.index is None or not executor:
+            return
+        with self.lock:
+            files = {os.path.join(self.music_dir, name): stat for name, stat in self.files.items()}
+        try:
+            indexed = self.index.update(files, map_func=lambda *args: executor.map(*args, chunksize=8))
+            if indexed:
+                logger.info("Indexed %d songs", indexed)
+        except Exception as e:
+            if not self.stop_event.is_set():
+                logger.error("Error updating the song index: %s", e)
+
+    def _fill(self):
+        """Queue songs for compiling until enough are ready or in progress"""
+        if not self.executor:
+            return
+        with self.lock:
+            queued = set(self.ready.queue) | self.pending
+            candidates = [path for path in self.song_paths if path not in queued]
+            while candidates and self.ready.qsize() + len(self.pending) < self.ready_size:
+                path = candidates.pop(random.randrange(len(candidates)))
+                self.pending.add(path)
+                cache = self.chart_cache
+                try:
+                    future = self.executor.submit(prepare_chart, path, cache.cache_dir, cache.levels,
+                                                  cache.lane_mapping)
+                except RuntimeError:
+                    # The pool is shutting down
+                    self.pending.discard(path)
+                    return
+                future.add_done_callback(lambda future, path=path: self._prepared(path, future))
+
+    def _prepared(self, path, future):
+        """Move a compiled song to the ready queue"""
+        with self.lock:
+            self.pending.discard(path)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error:
+            logger.error("Error preparing chart for %s: %s", os.path.basename(path), error)
+            return
+        self.ready.put(path)
@@ -0,0 +1,125 @@
+"""
+Chart that is compiled in the background while the song is already playing
+"""
+import logging
+import threading
+import numpy as np
+from charts.chart import Chart, CHART_LEVELS
+from charts.chart_compiler import compile_midi
+from charts.midi_stream import ChartStream
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingChart(Chart):
+    """
+    A chart whose notes are filled in by a background thread from a ChartStream.
+
+    The arrays are allocated up front from the stream's note count with every
+    hit time at infinity, so code that searches or scans the times simply sees
+    the notes that are not compiled yet as being in the far future. available is
+    the number of notes compiled so far, notes are only ever appended in order.
+    Levels that drop notes have fewer notes than len(), the rest stay at infinity.
+    These arrays are the chart itself, which is judged, drawn and cached, so
+    nothing else of the song is held while it compiles.
+
+    Once complete, the compiled notes and the other levels in levels, compiled
+    from the MIDI file again, are handed to on_complete so the cache gets all
+    of them.
+    """
+    def __init__(self, midi_path, level, levels=CHART_LEVELS, lane_mapping="linear", key="",
+                 chunk_size=1024, on_complete=None):
+        self.midi_path = midi_path
+        self.stream = ChartStream(midi_path, level, lane_mapping)
+        count = len(self.stream)
+        super().__init__(
+            np.full(count, np.inf),
+            np.zeros(count, dtype=np.uint8),
+            np.zeros(count, dtype=np.uint8),
+            num_tracks=level.num_tracks,
+            tempo_scale=self.stream.tempo_scale,
+            key=key,
+            level=level.name
+        )
+        self.levels = levels
+        self.lane_mapping = lane_mapping
+        self.chunk_size = chunk_size
+        self.on_complete = on_complete  # Called with the charts of every level once compiled
+        self.available = 0  # Notes compiled so far
+        self.complete = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._compile, daemon=True)
+        self.thread.start()
+
+    @property
+    def duration(self):
+        """Hit time of the last compiled note in seconds"""
+        return float(self.times[self.available - 1]) if self.available else 0.0
+
+    def lane_counts(self):
+        """Number of notes in each lane from the stream's summary, known before they are compiled"""
+        return self.stream.lane_counts()
+
+    def wait(self, timeout=None):
+        """Block until compiling stops, returning True if the whole chart was compiled"""
+        self.thread.join(timeout)
+        return self.complete.is_set()
+
+    def _compile(self):
+        """Fill the arrays a chunk at a time from the stream"""
+        times = np.empty(self.chunk_size)
+        lanes = np.empty(self.chunk_size, dtype=np.uint8)
+        pitches = np.empty(self.chunk_size, dtype=np.uint8)
+        try:
+            with self.stream:
+                filled = 0
+                for time, lane, pitch in self.stream:
+                    times[filled] = time
+                    lanes[filled] = lane
+                    pitches[filled] = pitch
+                    filled += 1
+                    if filled == self.chunk_size:
+                        if self.stop_event.is_set():
+                            return
+                        self._publish(times, lanes, pitches, filled)
+                        filled = 0
+                self._publish(times, lanes, pitches, filled)
+        except Exception as e:
+            logger.error("Error compiling chart: %s", e)
+            return
+        self.complete.set()
+
+        if self.on_complete:
+            try:
+                self.on_complete(self._all_levels())
+            except Exception as e:
+                logger.error("Error finishing chart: %s", e)
+
+    def _all_levels(self):
+        """Return the charts of every level in levels, this one without the unused notes"""
+        others = [level for level in self.levels if level.name != self.level]
+        compiled = {}
+        if others:
+            compiled = {chart.level: chart
+                        for chart in compile_midi(self.midi_path, others, self.lane_mapping, self.key)}
+        end = self.available
+        compiled[self.level] = Chart(self.times[:end], self.lanes[:end], self.pitches[:end],
+                                     num_tracks=self.num_tracks, tempo_scale=self.tempo_scale,
+                                     key=self.key, level=self.level)
+        return [compiled[level.name] for level in self.levels]
+
+    def _publish(self, times, lanes, pitches, filled):
+        """Copy a compiled chunk into the chart and make it visible"""
+        start = self.available
+        end = start + filled
+        # Lanes and pitches first, readers only look at notes whose time is set
+        self.lanes[start:end] = lanes[:filled]
+        self.pitches[start:end] = pitches[:filled]
+        self.times[start:end] = times[:filled]
+        self.available = end
+
+    def close(self):
+        """Stop compiling"""
+        self.stop_event.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
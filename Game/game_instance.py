@@ -1,68 +1,178 @@
+import logging
 import pygame
 import os
 import random
+import time
 from models.game_server import GameServer
 from networking.network_manager import NetworkManager
+from charts.chart_cache import ChartCache
+from charts.song_library import SongLibrary
+from models.game_clock import SystemClock
+from rendering.text_cache import TextCache
+from rendering.asset_manager import AssetManager, UI_FONTS
+from screens.screen_registry import ScreenRegistry
+from game_logging import setup_logging
+from game_metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+FRAME_PHASES = ("events", "update", "draw", "flip", "tick")
 
 class GameInstance:
-    def __init__(self):
+    def __init__(self, headless=False, clock=None, music_dir=None):
+        # Headless instances never open a window, e.g. for simulations on build machines
+        self.headless = headless
+        if headless:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        
         # Initialize pygame
         pygame.init()
-        pygame.display.set_caption("Guitar Hero Game")
         
         # Screen dimensions
         self.screen_width = 800
         self.screen_height = 600
-        self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
-        self.clock = pygame.time.Clock()
+        if headless:
+            # Off-screen surface so screens can still draw if asked to
+            self.screen = pygame.Surface((self.screen_width, self.screen_height))
+        else:
+            pygame.display.set_caption("Guitar Hero Game")
+            self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
+        self.render = not headless
+        self.text_cache = TextCache()  # Rendered strings shared by every screen
+        self.assets = AssetManager()   # Fonts shared by every screen
+        
+        # Injectable clock, screens read the time from here instead of calling time.time()
+        self.clock = clock or SystemClock()
         self.fps = 60
         
+        # Frame and network timings, served by the discovery server on /metrics
+        self.metrics = MetricsRegistry()
+        self.frame_phases = {
+            phase: self.metrics.histogram("frame_phase_seconds", "Time spent in each phase of a frame", phase=phase)
+            for phase in FRAME_PHASES}
+        self.inbound_queue_depth = self.metrics.gauge(
+            "inbound_queue_depth", "Controller messages waiting for the game loop")
+        self.outgoing_queue_depth = self.metrics.gauge(
+            "outgoing_queue_depth", "Game messages waiting for the WebSocket server")
+        
         # Game state
         self.running = True
         self.current_screen = None
+        self.screens = ScreenRegistry(self)  # Screens are reused between visits
         
         # Server settings
         self.game_server = None
-        self.network_manager = NetworkManager()
+        self.network_manager = NetworkManager(self.clock, self.metrics)
+        
+        # Songs and compiled charts
+        if music_dir is None:
+            music_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'music')
+        self.music_dir = music_dir
+        # Quantile lanes give every lane about the same number of notes
+        self.chart_cache = ChartCache(lane_mapping="quantile")
+        self.song_library = SongLibrary(music_dir, self.chart_cache)
         
     def start(self):
         """Start the game loop"""
         # Import here to avoid circular imports
         from screens.main_menu import MainMenuScreen
         
+        # Find the font files of the later screens while the menu is showing
+        self.assets.preload_fonts(UI_FONTS)
+        
+        # Index the songs and compile the first charts in the background
+        self.song_library.start()
+        
         # Set initial screen
-        self.current_screen = MainMenuScreen(self)
+        self.switch_screen(self.screens.get(MainMenuScreen))
         
         # Main game loop
         while self.running:
-            # Process events
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.QUIT:
-                    self.running = False
-                    
-            # Handle events for current screen
-            self.current_screen.handle_events(events)
-            
-            # Update screen logic
-            self.current_screen.update()
-            
-            # Check for screen transition
-            next_screen = self.current_screen.get_next_screen()
-            if next_screen:
-                self.current_screen = next_screen
-            
-            # Draw current screen
-            self.current_screen.draw(self.screen)
-            
-            # Update display
-            pygame.display.flip()
-            self.clock.tick(self.fps)
+            self.step(pygame.event.get())
         
         # Clean up
+        self.switch_screen(None)
+        self.screens.clear()
+        self.song_library.stop()
         self.stop_server()
         pygame.quit()
     
+    def step(self, events):
+        """Run a single frame of the game loop"""
+        phases = self.frame_phases
+        started = time.perf_counter()
+        
+        # Process events
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.running = False
+            elif event.type == pygame.WINDOWEXPOSED:
+                # The window contents were lost, so partial updates are not enough
+                self.current_screen.invalidate()
+                
+        # Handle events for current screen
+        self.current_screen.handle_events(events)
+        now = time.perf_counter()
+        phases["events"].observe(now - started)
+        started = now
+        
+        # Update screen logic
+        self.current_screen.update()
+        
+        # Check for screen transition
+        next_screen = self.current_screen.get_next_screen()
+        if next_screen:
+            self.switch_screen(next_screen)
+        now = time.perf_counter()
+        phases["update"].observe(now - started)
+        started = now
+        
+        # Draw current screen
+        if self.render:
+            dirty_rects = self.current_screen.draw(self.screen)
+            now = time.perf_counter()
+            phases["draw"].observe(now - started)
+            started = now
+            
+            # Update only what changed when the screen reports it
+            if dirty_rects is None:
+                pygame.display.flip()
+            elif dirty_rects:
+                pygame.display.update(dirty_rects)
+            now = time.perf_counter()
+            phases["flip"].observe(now - started)
+            started = now
+        
+        self.record_queue_depths()
+        self.clock.tick(self.fps)
+        phases["tick"].observe(time.perf_counter() - started)
+    
+    def record_queue_depths(self):
+        """Sample how many messages are waiting in each direction"""
+        self.inbound_queue_depth.set(self.network_manager.message_queue.qsize())
+        game_server = self.game_server
+        self.outgoing_queue_depth.set(game_server.outgoing_message_queue.qsize() if game_server else 0)
+    
+    def switch_screen(self, screen):
+        """Leave the current screen and enter screen, finishing its preload first"""
+        previous = self.current_screen
+        if previous:
+            previous.on_exit()
+        self.current_screen = screen
+        if screen:
+            screen.finish_preload()
+            screen.on_enter()
+        # Released after the next screen took its assets, so the fonts both use stay loaded
+        if previous and previous is not screen:
+            previous.release_assets()
+    
+    def run_for(self, seconds):
+        """Run the game loop without input for a span of clock time"""
+        end_time = self.clock.time() + seconds
+        while self.running and self.clock.time() < end_time:
+            self.step([])
+    
     def create_game_server(self, game_name):
         """Create and start the game server with the specified name"""
         try:
@@ -72,39 +182,33 @@ class GameInstance:
             # Start network services
             self.network_manager.start_services(self.game_server)
             
-            print(f"Game server created: {game_name}")
-            print(f"Server running at: {self.game_server.HostIP}:{self.game_server.Port}")
-            print(f"HTTP discovery service running at: http://{self.game_server.HostIP}:{self.network_manager.http_port}/guitargame")
-        except Exception as e:
-            print(f"Error creating game server: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.info("Game server created: %s", game_name)
+            logger.info("Server running at: %s:%s", self.game_server.HostIP, self.game_server.Port)
+            logger.info("HTTP discovery service running at: http://%s:%s/guitargame",
+                        self.game_server.HostIP, self.network_manager.http_port)
+        except Exception:
+            logger.exception("Error creating game server")
     
     def process_messages(self):
         """Process game messages from controllers"""
         # Get messages from network manager
         messages = self.network_manager.process_messages()
+        if not self.game_server:
+            return
         
-        # Process each message
-        for message in messages:
+        # Collect this frame's button presses, each attributed to the player who sent it
+        presses = []
+        for inbound in messages:
             try:
-                # For example, if message contains note data:
-                # Parse message and add notes to the game
-                # This is just an example - actual implementation would depend on message format
-                
-                # Assuming messages are integers representing tracks (0-3)
-                try:
-                    track = int(message)
-                    if 0 <= track < 4:
-                        # If we're on the playing screen, add a note
-                        if hasattr(self.current_screen, 'add_note'):
-                            self.current_screen.add_note(track)
-                except ValueError:
-                    # Not a valid track number
-                    pass
-                    
+                press = self.game_server.button_press(inbound)
+                if press is not None:
+                    presses.append(press)
             except Exception as e:
-                print(f"Error processing message: {e}")
+                logger.warning("Error processing message: %s", e)
+        
+        # Judge all presses in one batch if the current screen is playing a song
+        if presses and hasattr(self.current_screen, 'judge_presses'):
+            self.current_screen.judge_presses(presses)
     
     def stop_server(self):
         """Stop the game server and all networking services"""
@@ -114,42 +218,36 @@ class GameInstance:
             
         # Reset game server
         self.game_server = None
-        print("Server shutdown completed")
+        logger.info("Server shutdown completed")
     
     def get_random_midi_file(self):
-        """Get a random MIDI file from the music directory"""
+        """Get a random MIDI file from the music library, preferring one whose chart is compiled"""
         try:
-            # Get the directory of the current script
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            music_dir = os.path.join(base_dir, 'music')
-            
-            # Check if music directory exists
-            if not os.path.exists(music_dir):
-                print(f"Music directory not found: {music_dir}")
-                return None
-            
-            # Get all MIDI files (.mid or .midi extensions)
-            midi_files = [f for f in os.listdir(music_dir) 
-                         if f.lower().endswith(('.mid', '.midi'))]
-            
-            # Check if any MIDI files were found
-            if not midi_files:
-                print("No MIDI files found in the music directory")
-                return None
-            
-            # Select a random MIDI file
-            random_midi = random.choice(midi_files)
-            midi_path = os.path.join(music_dir, random_midi)
+            # Songs from the ready queue load without parsing any MIDI
+            midi_path = self.song_library.next_song()
+            if midi_path is None:
+                # Check if music directory exists
+                if not os.path.exists(self.music_dir):
+                    logger.warning("Music directory not found: %s", self.music_dir)
+                    return None
+                
+                # Check if any MIDI files were found
+                midi_files = self.song_library.songs()
+                if not midi_files:
+                    logger.warning("No MIDI files found in the music directory")
+                    return None
+                
+                # Select a random MIDI file
+                midi_path = random.choice(midi_files)
             
-            print(f"Selected random MIDI file: {random_midi}")
+            logger.info("Selected random MIDI file: %s", os.path.basename(midi_path))
             return midi_path
             
-        except Exception as e:
-            print(f"Error loading random MIDI file: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error loading random MIDI file")
             return None
 
 if __name__ == "__main__":
+    setup_logging()
     game = GameInstance()
     game.start()
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Logging setup for the Guitar Hero Game
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+# Environment variable with extra levels, e.g. "warning" for a show build or
+# "info,networking=debug" to trace every message the server sends and receives
+LOG_ENV = "GUITARHERO_LOG"
+
+# Per-message and per-note logging is DEBUG, so none of it is formatted by default
+DEFAULT_LEVELS = {"": logging.INFO}
+
+_listener = None
+_queue_handler = None
+
+
+def parse_levels(spec):
+    """Parse "info,networking=debug" into {logger name: level}, a bare level sets the root logger"""
+    levels = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, level = part.rpartition("=")
+        value = logging.getLevelName(level.strip().upper())
+        if not isinstance(value, int):
+            raise ValueError(f"Unknown log level {level}")
+        levels[name.strip()] = value
+    return levels
+
+
+def setup_logging(levels=None, stream=None):
+    """
+    Route all logging through a queue to a background writer thread and set the
+    level of each logger.
+
+    levels maps logger names to levels, "" being the root logger. By default
+    DEFAULT_LEVELS is used, overridden by the GUITARHERO_LOG environment variable.
+    Calling this again only changes the levels.
+    """
+    global _listener, _queue_handler
+    if levels is None:
+        levels = dict(DEFAULT_LEVELS)
+        try:
+            levels.update(parse_levels(os.environ.get(LOG_ENV, "")))
+        except ValueError as e:
+            print(f"Ignoring {LOG_ENV}: {e}", file=sys.stderr)
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    if _listener is not None:
+        return
+
+    # The game loop and the server thread only put records on the queue, the
+    # listener thread does the slow writes to the console
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    logging.getLogger().addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write out the queued records and stop the writer thread"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
@@ -0,0 +1,191 @@
+"""
+Runtime metrics for the Guitar Hero Game
+"""
+import json
+import threading
+import time
+from array import array
+import numpy as np
+
+METRIC_PREFIX = "guitarhero_"
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Counter:
+    """
+    Monotonic count of events, with the rate over the last few seconds.
+
+    Events are added to per-second buckets of a ring, so counting is a few
+    attribute updates and never takes a lock. Each counter should only be
+    incremented from one thread.
+    """
+    kind = "counter"
+
+    def __init__(self, rate_window=10):
+        self.value = 0
+        self.rate_window = rate_window
+        self.buckets = array("q", bytes(8 * (rate_window + 1)))
+        self.bucket_second = int(time.monotonic())
+
+    def inc(self, amount=1):
+        self.value += amount
+        second = int(time.monotonic())
+        if second != self.bucket_second:
+            self._advance(second)
+        self.buckets[second % len(self.buckets)] += amount
+
+    def _advance(self, second):
+        """Clear the buckets of the seconds that passed without events"""
+        for skipped in range(max(self.bucket_second + 1, second - len(self.buckets) + 1), second + 1):
+            self.buckets[skipped % len(self.buckets)] = 0
+        self.bucket_second = second
+
+    def rate(self):
+        """Events per second over the last rate_window complete seconds"""
+        second = int(time.monotonic())
+        # Buckets hold the seconds up to bucket_second, later seconds had no events
+        oldest = self.bucket_second - len(self.buckets)
+        total = sum(self.buckets[s % len(self.buckets)]
+                    for s in range(second - self.rate_window, second)
+                    if oldest < s <= self.bucket_second)
+        return total / self.rate_window
+
+    def snapshot(self):
+        return {"value": self.value, "rate": self.rate()}
+
+
+class Gauge:
+    """Last observed value of something, like a queue depth"""
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Histogram:
+    """
+    Distribution of the most recent samples of a timing.
+
+    Samples go into a fixed ring buffer, so observing is an array store and an
+    index update with no lock and no allocation. Readers copy the ring and may
+    see one sample being overwritten, which does not matter for percentiles.
+    Each histogram should only be observed from one thread.
+    """
+    kind = "summary"
+
+    def __init__(self, size=1024):
+        self.samples = array("d", bytes(8 * size))
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+        self.total += value
+
+    def snapshot(self):
+        count = self.count
+        window = np.frombuffer(self.samples, dtype=np.float64)[:min(count, len(self.samples))].copy()
+        result = {"count": count, "sum": self.total}
+        if len(window):
+            for q, value in zip(QUANTILES, np.quantile(window, QUANTILES)):
+                result[f"p{round(q * 100)}"] = float(value)
+            result["max"] = float(window.max())
+        return result
+
+
+class MetricsRegistry:
+    """
+    Named metrics with optional labels, exported as JSON or Prometheus text.
+
+    Metrics are created once, usually up front, and the returned objects are
+    updated directly on the hot path. Only creating a metric takes the lock.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}      # (name, labels) -> metric
+        self.help = {}         # name -> description
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", **labels):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help="", **labels):
+        return self._get(Histogram, name, help, labels)
+
+    def _get(self, cls, name, help, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    metric = self.metrics[key] = cls()
+                    self.help.setdefault(name, help)
+        if not isinstance(metric, cls):
+            raise TypeError(f"Metric {name} is a {metric.kind}")
+        return metric
+
+    def remove(self, name, **labels):
+        """Forget a labelled metric, e.g. of a player that left"""
+        with self.lock:
+            self.metrics.pop((name, tuple(sorted(labels.items()))), None)
+
+    def snapshot(self):
+        """Return {name: [{"labels": ..., values...}]} of every metric"""
+        with self.lock:
+            items = list(self.metrics.items())
+        result = {}
+        for (name, labels), metric in sorted(items, key=lambda item: item[0]):
+            entry = {"labels": dict(labels)} if labels else {}
+            entry.update(metric.snapshot())
+            result.setdefault(name, []).append(entry)
+        return result
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self.lock:
+            items = sorted(self.metrics.items(), key=lambda item: item[0])
+        lines = []
+        described = set()
+        for (name, labels), metric in items:
+            full_name = METRIC_PREFIX + name
+            if name not in described:
+                described.add(name)
+                if self.help.get(name):
+                    lines.append(f"# HELP {full_name} {self.help[name]}")
+                lines.append(f"# TYPE {full_name} {metric.kind}")
+            values = metric.snapshot()
+            if metric.kind in ("counter", "gauge"):
+                lines.append(f"{full_name}{_labels(labels)} {values['value']}")
+            else:
+                for q in QUANTILES:
+                    key = f"p{round(q * 100)}"
+                    if key in values:
+                        lines.append(f"{full_name}{_labels(labels + (('quantile', str(q)),))} {values[key]}")
+                lines.append(f"{full_name}_sum{_labels(labels)} {values['sum']}")
+                lines.append(f"{full_name}_count{_labels(labels)} {values['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    """Format label pairs as {a="1",b="2"}"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value):
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
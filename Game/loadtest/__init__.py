@@ -0,0 +1,5 @@
+# Guitar Hero Game Load Testing Package
+"""
+This package contains a simulated controller swarm for load testing the Guitar Hero Game server.
+Run it from the Game directory with: python -m loadtest --help
+"""
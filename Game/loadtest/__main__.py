@@ -0,0 +1,199 @@
+"""
+Command line entry point for the simulated controller swarm
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+
+# Make the game modules importable when run as "python -m loadtest" from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import quiet, summarize
+from loadtest.controller_swarm import run_swarm
+from networking.udp_discovery import discover_games
+
+
+def build_report(controllers, players=()):
+    """Aggregate the measurements of every fake controller and the server's view of them"""
+    stats = [controller.stats for controller in controllers]
+    connect_latencies = [s.connect_latency for s in stats if s.connect_latency is not None]
+    ping_rtts = [rtt for s in stats for rtt in s.ping_rtts]
+    note_leads = [lead for s in stats for lead in s.note_leads]
+    notes_received = [s.notes_received for s in stats]
+    most_notes = max(notes_received, default=0)
+    synced = [player.clock_sync for player in players if player.clock_sync.synced]
+
+    return {
+        "clients": len(stats),
+        "connected": len(connect_latencies),
+        "errors": [s.error for s in stats if s.error],
+        "connect_latency": summarize(connect_latencies) if connect_latencies else None,
+        "ping_rtt": summarize(ping_rtts) if ping_rtts else None,
+        "note_lead": summarize(note_leads) if note_leads else None,
+        "late_notes": sum(1 for lead in note_leads if lead < 0),
+        "notes_received": {"min": min(notes_received, default=0), "max": most_notes},
+        # Every controller should see the same notes, so anything short of the best is a drop
+        "dropped_notes": sum(most_notes - count for count in notes_received),
+        "presses_sent": sum(s.presses_sent for s in stats),
+        "messages_received": sum(s.messages_received for s in stats),
+        "clock_synced": len(synced),
+        "clock_rtt": summarize([sync.srtt for sync in synced]) if synced else None,
+        "clock_jitter": summarize([sync.rttvar for sync in synced]) if synced else None,
+    }
+
+
+def start_local_game(song, port, http_port):
+    """Start a headless game with real network services that will play song"""
+    from game_instance import GameInstance
+    from models.game_server import GameServer
+
+    game = GameInstance(headless=True)
+    game.get_random_midi_file = lambda: song
+    game.game_server = GameServer("Load Test")
+    game.game_server.Port = port
+    game.network_manager.http_port = http_port
+    game.network_manager.start_services(game.game_server)
+    return game
+
+
+def run_lobbies(args):
+    """Host args.lobbies lobbies playing args.serve and spread the controllers over them"""
+    from charts.chart_cache import ChartCache
+    from networking.session_manager import SessionManager
+
+    manager = SessionManager(ChartCache(lane_mapping="quantile"), port=args.port)
+    manager.start()
+    try:
+        lobby_ids = [manager.create_lobby(f"Load Test {i + 1}").lobby_id for i in range(args.lobbies)]
+        players = []
+
+        async def swarm(lobby_id, clients):
+            async def on_connected(controllers):
+                session = manager.get(lobby_id)
+                for _ in range(100):
+                    if len(session.game_server.clients) >= clients:
+                        break
+                    await asyncio.sleep(0.1)
+                players.extend(session.game_server.ConnectedClients)
+                await asyncio.to_thread(manager.start_round, lobby_id, args.serve)
+
+            return await run_swarm(
+                f"ws://{args.host}:{args.port}/lobby/{lobby_id}", clients, args.duration,
+                ramp=args.ramp,
+                on_connected=on_connected,
+                binary=args.binary,
+                jitter=args.jitter_ms / 1000,
+                miss_rate=args.miss_rate
+            )
+
+        async def run_all():
+            # Controllers are dealt to the lobbies like cards
+            counts = [len(range(i, args.clients, args.lobbies)) for i in range(args.lobbies)]
+            return await asyncio.gather(*(swarm(lobby_id, count) for lobby_id, count in zip(lobby_ids, counts) if count))
+
+        by_lobby = asyncio.run(run_all())
+    finally:
+        manager.stop()
+
+    report = build_report([c for controllers in by_lobby for c in controllers], players)
+    # Lobbies start their rounds at different times, so only compare controllers in the same lobby
+    report["dropped_notes"] = sum(build_report(controllers)["dropped_notes"] for controllers in by_lobby)
+    report["lobbies"] = args.lobbies
+    report["lobby_tick"] = manager.tick_seconds.snapshot()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Guitar Hero Game server with fake controllers")
+    parser.add_argument("--host", default="127.0.0.1", help="game server address")
+    parser.add_argument("--discover", action="store_true", help="find the game server with UDP discovery")
+    parser.add_argument("--port", type=int, default=8765, help="game server WebSocket port")
+    parser.add_argument("--clients", type=int, default=8, help="number of fake controllers")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to play after everyone connected")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which to spread the connects")
+    parser.add_argument("--jitter-ms", type=float, default=30.0, help="standard deviation of press timing")
+    parser.add_argument("--miss-rate", type=float, default=0.05, help="fraction of notes never pressed")
+    parser.add_argument("--binary", action="store_true", help="negotiate binary frames like new firmware")
+    parser.add_argument("--serve", metavar="SONG", help="host a headless game playing this MIDI file")
+    parser.add_argument("--http-port", type=int, default=8080, help="discovery port when using --serve")
+    parser.add_argument("--lobbies", type=int, default=0,
+                        help="with --serve, host this many lobbies in one process and spread the controllers over them")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+    if args.lobbies and not args.serve:
+        parser.error("--lobbies needs --serve")
+
+    if args.lobbies:
+        with quiet():
+            report = run_lobbies(args)
+        write_report(report, args.output)
+        return
+
+    game = None
+    game_thread = None
+    players = []
+
+    async def on_connected(controllers):
+        nonlocal game_thread
+        if not game:
+            return
+        # Start the round once the server has registered every controller
+        for _ in range(100):
+            if len(game.game_server.ConnectedClients) >= args.clients:
+                break
+            await asyncio.sleep(0.1)
+        players.extend(game.game_server.ConnectedClients)
+
+        def play():
+            from screens.playing_game import PlayingGameScreen
+            game.switch_screen(game.screens.get(PlayingGameScreen))
+            game.run_for(args.duration)
+
+        game_thread = threading.Thread(target=play, daemon=True)
+        game_thread.start()
+
+    with quiet():
+        if args.serve:
+            game = start_local_game(args.serve, args.port, args.http_port)
+        try:
+            host, port = args.host, args.port
+            if args.discover:
+                # The first host to answer, a local game answers while it starts up
+                games = discover_games(timeout=1.5)
+                if not games:
+                    sys.exit("No game server answered the discovery probe")
+                host, port = games[0].ip, games[0].port
+            url = f"ws://{host}:{port}"
+            controllers = asyncio.run(run_swarm(
+                url, args.clients, args.duration,
+                ramp=args.ramp,
+                on_connected=on_connected,
+                binary=args.binary,
+                jitter=args.jitter_ms / 1000,
+                miss_rate=args.miss_rate
+            ))
+        finally:
+            if game:
+                game.running = False
+                if game_thread:
+                    game_thread.join(5.0)
+                game.stop_server()
+
+    write_report(build_report(controllers, players), args.output)
+
+
+def write_report(report, output=None):
+    """Write the JSON report to output, or print it"""
+    report = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
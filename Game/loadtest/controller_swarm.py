@@ -0,0 +1,194 @@
+"""
+Simulated MKR IoT Carrier controllers speaking the same protocol as
+Controller/src/websockets/websocket.cpp
+"""
+import asyncio
+import heapq
+import random
+import time
+import websockets
+from networking.protocol import (
+    HEADER, NOTE_RECORD, PLAYER_RECORD, PROTOCOL_BINARY,
+    MSG_NOTES, MSG_GAME_START, MSG_GAME_END, MSG_PLAYER
+)
+
+
+class ControllerStats:
+    """
+    Measurements collected by one fake controller
+    """
+    def __init__(self):
+        self.connect_latency = None   # Seconds until SM-PlayingState arrived
+        self.ping_rtts = []           # WebSocket ping round trips in seconds
+        self.note_leads = []          # Seconds between receiving a note and its hit time
+        self.notes_received = 0
+        self.presses_sent = 0
+        self.messages_received = 0
+        self.error = None
+
+
+class FakeController:
+    """
+    A single simulated controller that follows the firmware's state machine
+    """
+    def __init__(self, url, binary=False, jitter=0.03, miss_rate=0.05, ping_interval=1.0, seed=None):
+        self.url = url
+        self.binary = binary
+        self.jitter = jitter            # Standard deviation of press timing in seconds
+        self.miss_rate = miss_rate      # Fraction of notes that are never pressed
+        self.ping_interval = ping_interval
+        self.rng = random.Random(seed)
+        self.stats = ControllerStats()
+        self.state = "MenuState"
+        self.player_name = None
+        self.game_start = None
+        self.pending_presses = []  # Heap of (press_time, track)
+        self.press_event = asyncio.Event()
+
+    async def run(self, stop_event):
+        """Connect, play until stop_event is set and then disconnect"""
+        start = time.perf_counter()
+        try:
+            async with websockets.connect(self.url, max_queue=None) as websocket:
+                if self.binary:
+                    await websocket.send("PROTO-1")
+                tasks = [
+                    asyncio.create_task(self._receive_loop(websocket, start)),
+                    asyncio.create_task(self._press_loop(websocket)),
+                    asyncio.create_task(self._ping_loop(websocket)),
+                ]
+                stop_task = asyncio.create_task(stop_event.wait())
+                await asyncio.wait(tasks + [stop_task], return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks + [stop_task]:
+                    task.cancel()
+                await asyncio.gather(*tasks, stop_task, return_exceptions=True)
+                if not stop_event.is_set():
+                    self.stats.error = "connection closed by server"
+        except Exception as e:
+            self.stats.error = str(e) or type(e).__name__
+
+    async def _receive_loop(self, websocket, start):
+        """Handle messages the way websocket::webSocketEvent and the states do"""
+        async for message in websocket:
+            self.stats.messages_received += 1
+            if isinstance(message, bytes):
+                self.handle_binary(message)
+            elif message.startswith("PING-"):
+                # Clock sync is answered in any state, like websocket::webSocketEvent
+                await websocket.send(f"PONG-{message[5:]}-{self.millis()}")
+            elif message.startswith("SM-"):
+                self.state = message[3:]
+                if self.stats.connect_latency is None:
+                    self.stats.connect_latency = time.perf_counter() - start
+            else:
+                self.handle_text(message)
+
+    def handle_text(self, message):
+        """Handle a text message in the current state"""
+        if self.state != "PlayingState":
+            return
+        if message.startswith("PlayerObject"):
+            for line in message.split("\n"):
+                if line.startswith("Player="):
+                    self.player_name = line[len("Player="):].strip()
+        elif message.startswith("Game-Start"):
+            self.start_game()
+        elif message.startswith("Game-End"):
+            self.game_start = None
+        elif message.startswith("NOTES-"):
+            for note in message[6:].split(";"):
+                track, time_ms = note.split("-")
+                self.add_note(int(track), int(time_ms))
+        elif message.startswith("NOTE-"):
+            _, track, time_ms = message.split("-")
+            self.add_note(int(track), int(float(time_ms)))
+
+    def handle_binary(self, frame):
+        """Handle a binary frame in the current state"""
+        version, msg_type, count = HEADER.unpack_from(frame)
+        if version != PROTOCOL_BINARY:
+            return
+        if msg_type == MSG_NOTES:
+            for offset in range(HEADER.size, HEADER.size + count * NOTE_RECORD.size, NOTE_RECORD.size):
+                self.add_note(*NOTE_RECORD.unpack_from(frame, offset))
+        elif msg_type == MSG_GAME_START:
+            self.start_game()
+        elif msg_type == MSG_GAME_END:
+            self.game_start = None
+        elif msg_type == MSG_PLAYER:
+            offset = HEADER.size + PLAYER_RECORD.size
+            self.player_name = frame[offset:offset + count].decode("utf-8")
+
+    def millis(self):
+        """Controller clock in ms, like Arduino's millis()"""
+        return int(time.perf_counter() * 1000)
+
+    def start_game(self):
+        """Reset the game clock like PlayingState does on Game-Start"""
+        self.game_start = time.perf_counter()
+        self.pending_presses = []
+
+    def add_note(self, track, time_ms):
+        """Record a note and schedule the button press for it"""
+        self.stats.notes_received += 1
+        if self.game_start is None:
+            return
+        hit_at = self.game_start + time_ms / 1000
+        self.stats.note_leads.append(hit_at - time.perf_counter())
+        if self.rng.random() >= self.miss_rate:
+            press_at = hit_at + self.rng.gauss(0, self.jitter)
+            heapq.heappush(self.pending_presses, (press_at, track))
+            self.press_event.set()
+
+    async def _press_loop(self, websocket):
+        """Send button presses when their scheduled time arrives"""
+        while True:
+            if not self.pending_presses:
+                self.press_event.clear()
+                await self.press_event.wait()
+                continue
+            press_at, track = self.pending_presses[0]
+            delay = press_at - time.perf_counter()
+            if delay > 0:
+                # Wake early if a nearer press gets scheduled
+                self.press_event.clear()
+                try:
+                    await asyncio.wait_for(self.press_event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.pending_presses)
+            await websocket.send(f"HIT-{track}-{self.millis()}")
+            self.stats.presses_sent += 1
+
+    async def _ping_loop(self, websocket):
+        """Measure round trips through the server's event loop"""
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            start = time.perf_counter()
+            pong = await websocket.ping()
+            await pong
+            self.stats.ping_rtts.append(time.perf_counter() - start)
+
+
+async def run_swarm(url, clients, duration, ramp=0.0, on_connected=None, **controller_options):
+    """Run clients fake controllers against url for duration seconds and return them"""
+    stop_event = asyncio.Event()
+    controllers = [
+        FakeController(url, seed=i, **controller_options)
+        for i in range(clients)
+    ]
+
+    tasks = []
+    for controller in controllers:
+        tasks.append(asyncio.create_task(controller.run(stop_event)))
+        if ramp:
+            await asyncio.sleep(ramp / clients)
+
+    if on_connected:
+        await on_connected(controllers)
+
+    await asyncio.sleep(duration)
+    stop_event.set()
+    await asyncio.gather(*tasks)
+    return controllers
@@ -0,0 +1,105 @@
+"""
+Registry of the players connected to a game server
+"""
+import threading
+
+
+class ClientRegistry:
+    """
+    Connected players keyed by connection, with stable player IDs and a name index.
+
+    Writers hold a lock and publish new dictionaries instead of mutating the
+    current ones (copy-on-write), so the pygame thread can read while the
+    asyncio thread connects and disconnects players without any locking.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._by_connection = {}
+        self._by_id = {}
+        self._by_name = {}
+        self._snapshot = ()
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __iter__(self):
+        return iter(self._snapshot)
+
+    def __contains__(self, websocket):
+        return websocket in self._by_connection
+
+    def snapshot(self):
+        """Return an immutable tuple of the connected players"""
+        return self._snapshot
+
+    def get(self, websocket):
+        """Return the player for a connection, or None"""
+        return self._by_connection.get(websocket)
+
+    def get_by_id(self, player_id):
+        """Return the player with a player ID, or None"""
+        return self._by_id.get(player_id)
+
+    def get_by_name(self, player_name):
+        """Return the player with a name, or None"""
+        return self._by_name.get(player_name)
+
+    def add(self, player):
+        """Register a player under its websocket and assign it a player ID"""
+        with self._lock:
+            player.player_id = self._next_id
+            self._next_id += 1
+
+            # Random names can collide, keep the name index unique
+            if player.player_name in self._by_name:
+                player.player_name = f"{player.player_name}-{player.player_id}"
+
+            self._publish(
+                {**self._by_connection, player.websocket: player},
+                {**self._by_id, player.player_id: player},
+                {**self._by_name, player.player_name: player}
+            )
+        return player
+
+    def replace(self, websocket, player):
+        """Swap the player registered for a connection, keeping its player ID"""
+        with self._lock:
+            existing = self._by_connection.get(websocket)
+            if existing is None:
+                return None
+            player.player_id = existing.player_id
+
+            by_name = dict(self._by_name)
+            by_name.pop(existing.player_name, None)
+            by_name[player.player_name] = player
+            self._publish(
+                {**self._by_connection, websocket: player},
+                {**self._by_id, player.player_id: player},
+                by_name
+            )
+        return player
+
+    def remove(self, websocket):
+        """Unregister the player for a connection and return it, or None"""
+        with self._lock:
+            player = self._by_connection.get(websocket)
+            if player is None:
+                return None
+
+            by_connection = dict(self._by_connection)
+            by_id = dict(self._by_id)
+            by_name = dict(self._by_name)
+            del by_connection[websocket]
+            by_id.pop(player.player_id, None)
+            if by_name.get(player.player_name) is player:
+                del by_name[player.player_name]
+            self._publish(by_connection, by_id, by_name)
+        return player
+
+    def _publish(self, by_connection, by_id, by_name):
+        """Swap in new indexes, readers see either the old or the new state"""
+        self._by_connection = by_connection
+        self._by_id = by_id
+        self._by_name = by_name
+        self._snapshot = tuple(by_connection.values())
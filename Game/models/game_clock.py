@@ -0,0 +1,60 @@
+"""
+Clocks that drive the Guitar Hero Game loop
+"""
+import time
+import pygame
+
+
+class SystemClock:
+    """
+    Wall clock time with pygame's frame limiter
+    """
+    def __init__(self):
+        self._clock = pygame.time.Clock()
+
+    def time(self):
+        """Current time in seconds"""
+        return time.time()
+
+    def ticks(self):
+        """Milliseconds since pygame was initialized"""
+        return pygame.time.get_ticks()
+
+    def tick(self, fps):
+        """Wait until the next frame is due"""
+        self._clock.tick(fps)
+
+
+class WallClock:
+    """
+    Wall clock time without a frame limiter, for lobbies that have no frame loop
+    """
+    def time(self):
+        """Current time in seconds"""
+        return time.time()
+
+
+class SimulatedClock:
+    """
+    Deterministic clock that advances exactly one frame per tick and never sleeps,
+    so headless runs can go faster than real time
+    """
+    def __init__(self, start_time=0.0):
+        self.start_time = start_time
+        self.now = start_time
+
+    def time(self):
+        """Current simulated time in seconds"""
+        return self.now
+
+    def ticks(self):
+        """Simulated milliseconds since the clock was created"""
+        return int((self.now - self.start_time) * 1000)
+
+    def tick(self, fps):
+        """Advance the clock by one frame"""
+        self.now += 1.0 / fps
+
+    def advance(self, seconds):
+        """Advance the clock by an arbitrary amount of time"""
+        self.now += seconds
@@ -1,7 +1,13 @@
+import logging
 import asyncio
 import socket
 import queue
 from models.player import Player
+from models.client_registry import ClientRegistry
+from models.scoring_engine import ButtonPress
+from networking.protocol import parse_hit
+
+logger = logging.getLogger(__name__)
 
 
 class GameServer:
@@ -9,55 +15,90 @@ class GameServer:
     HostName = socket.gethostname()
     HostIP = socket.gethostbyname(HostName)
     Port = 8765
-    ConnectedClients = set()
 
     def __init__(self, gameName=str):
         self.GameName = gameName
         self.HostName = socket.gethostname()
         self.HostIP = socket.gethostbyname(self.HostName)
         self.Port = 8765
+        self.clients = ClientRegistry()
         self.outgoing_message_queue = queue.Queue()
+        self.message_listener = None
+        
+    @property
+    def ConnectedClients(self):
+        """Snapshot of the connected players, safe to read from any thread"""
+        return self.clients.snapshot()
         
     def add_client(self, websocket):
-        """Add a new client to the connected clients set"""
-        player = Player(websocket)
-        self.ConnectedClients.add(player)
-        print(f"New client connected: {player.player_name}")
+        """Register a new client and return its player"""
+        player = self.clients.add(Player(websocket))
+        logger.info("New client connected: %s", player.player_name)
         return player
     
     def get_client(self, websocket):
-        """Get a client from the connected clients set"""
-        for player in self.ConnectedClients:
-            if player.websocket == websocket:
-                return player
-        return None
+        """Get the player for a client connection"""
+        return self.clients.get(websocket)
+    
+    def get_client_by_id(self, player_id):
+        """Get a player by its player ID"""
+        return self.clients.get_by_id(player_id)
+    
+    def button_press(self, inbound):
+        """Return the ButtonPress of an InboundMessage "HIT-..." message, or None for other messages"""
+        hit = parse_hit(inbound.message)
+        if hit is None:
+            return None
+        track, client_ms = hit
+        # Compensate for the controller's clock offset and latency
+        pressed_at = inbound.received_at
+        player = self.get_client_by_id(inbound.player_id)
+        if player:
+            pressed_at = player.clock_sync.press_time(inbound.received_at, client_ms)
+        return ButtonPress(inbound.player_id, track, pressed_at)
+    
+    def get_client_by_name(self, player_name):
+        """Get a player by its name"""
+        return self.clients.get_by_name(player_name)
     
     def update_client(self, websocket, player):
-        """Update a client's information in the connected clients set"""
-        for idx, existing_player in enumerate(self.ConnectedClients):
-            if existing_player.websocket == websocket:
-                self.ConnectedClients[idx] = player
-                print(f"Client updated: {player.player_name}")
-                break
+        """Replace the player registered for a client connection"""
+        if self.clients.replace(websocket, player):
+            logger.info("Client updated: %s", player.player_name)
 
     def remove_client(self, websocket):
-        """Remove a client from the connected clients set"""
-        for player in self.ConnectedClients:
-            if player.websocket == websocket:
-                self.ConnectedClients.remove(player)
-                print(f"Client disconnected: {player.player_name}")
-                break    
+        """Unregister a client connection"""
+        player = self.clients.remove(websocket)
+        if player:
+            logger.info("Client disconnected: %s", player.player_name)
+
+    def set_message_listener(self, listener):
+        """Set a callback that is invoked whenever a message is queued"""
+        self.message_listener = listener
+
+    def _notify_listener(self):
+        """Wake up whoever is sending the queued messages"""
+        listener = self.message_listener
+        if listener:
+            try:
+                listener()
+            except RuntimeError:
+                # The listener's event loop has already shut down
+                pass
+
     def send_message(self, message, websocket):
         """Queue a message to be sent to a specific client"""
         # Add a tuple (message, recipient) to the queue
         self.outgoing_message_queue.put(("direct", message, websocket))
-        print(f"Message queued for sending to a specific client: {message}")
+        self._notify_listener()
+        logger.debug("Message queued for sending to a specific client: %s", message)
 
     def broadcast_message(self, message):
         """Queue a message to be sent to all connected clients"""
         # Add a tuple (message, None) to the queue to indicate broadcast
         self.outgoing_message_queue.put(("broadcast", message, None))
-        print(f"Broadcast message queued for sending: {message}")
+        self._notify_listener()
+        logger.debug("Broadcast message queued for sending: %s", message)
     def get_queued_messages(self):
         """Get any queued messages to be sent to clients"""
         messages = []
@@ -66,6 +107,10 @@ class GameServer:
             messages.append(self.outgoing_message_queue.get())
         return messages
 
+    def info_key(self):
+        """Values of to_dict, cheap to compare to see whether the server info changed"""
+        return (self.GameName, self.HostName, self.HostIP, self.Port)
+
     def to_dict(self):
         return {
             "game_name": self.GameName,
@@ -0,0 +1,134 @@
+"""
+A headless lobby hosted alongside others by the SessionManager
+"""
+import logging
+import asyncio
+import functools
+import queue
+from charts.lane_index import LaneIndex
+from charts.note_scheduler import NoteScheduler
+from models.game_server import GameServer
+from models.scoring_engine import ScoringEngine
+from networking.protocol import GameEvent, PlayerInfo, note_batches
+from networking.websocket_server import GameWebSocketServer
+
+logger = logging.getLogger(__name__)
+
+
+class LobbySession:
+    """
+    One lobby with its own GameServer (players and broadcast queue), its own
+    connection hub and its own chart clock and scoring.
+
+    Sessions have no window and no frame loop: the SessionManager ticks them a
+    few times a second on its event loop, and a tick only touches the presses
+    and notes that are due, so an idle lobby costs next to nothing.
+    """
+    def __init__(self, lobby_id, game_name, chart_cache, clock, port, metrics=None,
+                 lead_in=3.0, hit_window=0.1, tail=2.0):
+        self.lobby_id = lobby_id
+        self.game_server = GameServer(game_name)
+        self.game_server.Port = port
+        self.message_queue = queue.Queue()
+        self.hub = GameWebSocketServer(self.game_server, self.message_queue, clock, metrics,
+                                       metric_labels={"lobby": lobby_id})
+        self.chart_cache = chart_cache
+        self.clock = clock
+        self.lead_in = lead_in        # Seconds between the round start and song time zero
+        self.hit_window = hit_window  # Seconds either side of the hit time that still count as a hit
+        self.tail = tail              # Seconds after the last note before the round ends
+        self.song = None
+        self.chart = None
+        self.note_scheduler = None
+        self.scoring = None
+        self.start_time = None
+        self.outgoing_task = None
+
+    @property
+    def playing(self):
+        return self.chart is not None
+
+    def to_dict(self):
+        return {
+            **self.game_server.to_dict(),
+            "lobby": self.lobby_id,
+            "players": len(self.game_server.clients),
+            "song": self.song,
+        }
+
+    def open(self):
+        """Start delivering the lobby's messages, must be called on the event loop"""
+        self.outgoing_task = asyncio.create_task(self.hub.run_outgoing())
+
+    async def close(self):
+        """End the round, disconnect the players and stop delivering messages"""
+        self.end_round()
+        for websocket in list(self.hub.senders):
+            await websocket.close(1001, "Lobby closed")
+        if self.outgoing_task:
+            self.outgoing_task.cancel()
+            try:
+                await self.outgoing_task
+            except asyncio.CancelledError:
+                pass
+            self.outgoing_task = None
+
+    async def start_round(self, midi_path, level=None):
+        """Load a chart without blocking the other lobbies and start playing it"""
+        loader = functools.partial(self.chart_cache.load, midi_path, level=level)
+        chart = await asyncio.get_running_loop().run_in_executor(None, loader)
+        self.end_round()
+
+        self.song = midi_path
+        self.chart = chart
+        lane_index = LaneIndex(chart)
+        self.note_scheduler = NoteScheduler(chart, self.lead_in)
+        self.scoring = ScoringEngine(lane_index, len(chart), hit_window=self.hit_window)
+        self.start_time = self.clock.time() + self.lead_in
+        # Presses sent before the round belong to nothing
+        self._drain_presses()
+        self.game_server.broadcast_message(GameEvent("Start"))
+        logger.info("Lobby %s started %s chart with %d notes", self.lobby_id, chart.level, len(chart))
+
+    def end_round(self):
+        """Stop playing and release the chart"""
+        if self.chart is None:
+            return
+        self.game_server.broadcast_message(GameEvent("End"))
+        self.chart.close()
+        self.chart = None
+        self.note_scheduler = None
+        self.scoring = None
+        logger.info("Lobby %s finished %s", self.lobby_id, self.song)
+
+    def tick(self, now):
+        """Judge the presses and send the notes that are due"""
+        presses = self._drain_presses()
+        if self.chart is None:
+            return
+
+        if presses:
+            game_server = self.game_server
+            for player in self.scoring.judge(presses, self.start_time, game_server.clients):
+                game_server.send_message(PlayerInfo(player), player.websocket)
+
+        song_time = now - self.start_time
+        notes = self.note_scheduler.poll(song_time)
+        if notes:
+            for message in note_batches(notes):
+                self.game_server.broadcast_message(message)
+
+        if song_time > self.chart.duration + self.tail:
+            self.end_round()
+
+    def _drain_presses(self):
+        """Take the button presses the controllers sent since the last tick"""
+        presses = []
+        while True:
+            try:
+                inbound = self.message_queue.get_nowait()
+            except queue.Empty:
+                return presses
+            press = self.game_server.button_press(inbound)
+            if press is not None:
+                presses.append(press)
@@ -0,0 +1,77 @@
+"""
+Array-backed pool of on-screen notes for the Guitar Hero Game
+"""
+import numpy as np
+
+
+class NotePool:
+    """
+    Stores notes in parallel NumPy arrays with O(1) spawn/despawn through a free list
+    """
+    def __init__(self, capacity=256):
+        self.capacity = 0
+        self.track = np.zeros(0, dtype=np.int8)
+        self.hit_time = np.zeros(0, dtype=np.float64)
+        self.note_index = np.zeros(0, dtype=np.int32)
+        self.active = np.zeros(0, dtype=bool)
+        self._free = []
+        self._count = 0
+        self._grow(capacity)
+
+    def __len__(self):
+        return self._count
+
+    def _grow(self, extra):
+        """Extend the arrays and add the new slots to the free list"""
+        old_capacity = self.capacity
+        self.capacity += extra
+        self.track = np.concatenate((self.track, np.zeros(extra, dtype=np.int8)))
+        self.hit_time = np.concatenate((self.hit_time, np.zeros(extra, dtype=np.float64)))
+        self.note_index = np.concatenate((self.note_index, np.full(extra, -1, dtype=np.int32)))
+        self.active = np.concatenate((self.active, np.zeros(extra, dtype=bool)))
+        # Pop from the end so low slots are reused first
+        self._free.extend(range(self.capacity - 1, old_capacity - 1, -1))
+
+    def spawn(self, track, hit_time, note_index=-1):
+        """Activate a free slot for a note and return its slot index"""
+        if not self._free:
+            self._grow(self.capacity)
+        slot = self._free.pop()
+        self.track[slot] = track
+        self.hit_time[slot] = hit_time
+        self.note_index[slot] = note_index
+        self.active[slot] = True
+        self._count += 1
+        return slot
+
+    def despawn(self, slot):
+        """Return a single slot to the free list"""
+        if self.active[slot]:
+            self.active[slot] = False
+            self._free.append(slot)
+            self._count -= 1
+
+    def despawn_many(self, slots):
+        """Return an array of active slots to the free list"""
+        self.active[slots] = False
+        self._free.extend(slots.tolist())
+        self._count -= len(slots)
+
+    def clear(self):
+        """Despawn every note"""
+        self.despawn_many(self.active_slots())
+
+    def cull(self, before_time):
+        """Despawn notes whose hit time is before before_time and return how many were removed"""
+        slots = np.flatnonzero(self.active & (self.hit_time < before_time))
+        if slots.size:
+            self.despawn_many(slots)
+        return slots.size
+
+    def active_slots(self):
+        """Return the slot indices of all active notes"""
+        return np.flatnonzero(self.active)
+
+    def positions(self, slots, song_time, hit_zone_y, pixels_per_second):
+        """Return the y position of each slot derived from the song clock"""
+        return hit_zone_y - (self.hit_time[slots] - song_time) * pixels_per_second
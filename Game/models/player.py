@@ -1,9 +1,13 @@
 import random
+from networking.protocol import PROTOCOL_TEXT
+from networking.clock_sync import ClockSync
 
 class Player:
     websocket = None
     player_name = None
     score = 0
+    protocol = PROTOCOL_TEXT
+    player_id = None
 
     def __init__(self, websocket):
         # Random list of animals
@@ -20,6 +24,9 @@ class Player:
         self.websocket = websocket
         self.player_name = f"{random.choice(colors)}-{random.choice(animals)}"
         self.score = 0
+        self.protocol = PROTOCOL_TEXT  # Wire protocol negotiated with the controller
+        self.player_id = None  # Assigned by the ClientRegistry when the player connects
+        self.clock_sync = ClockSync()  # Clock offset and latency of the controller
 
     def __str__(self):
         return f"PlayerObject \nPlayer={self.player_name} \nScore={self.score}"
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Server-side judging of controller button presses for the Guitar Hero Game
+"""
+from collections import defaultdict, namedtuple
+import numpy as np
+
+# A button press from a controller, pressed_at is on the game clock
+ButtonPress = namedtuple("ButtonPress", ["player_id", "track", "pressed_at"])
+
+# Player ID of the keyboard on the game machine, controllers are numbered from 1
+LOCAL_PLAYER_ID = 0
+
+
+class ScoringEngine:
+    """
+    Judges every player's presses against the chart once per frame and keeps
+    Player.score up to date. Each player has their own judged notes, so
+    several controllers can play the same chart.
+    """
+    def __init__(self, lane_index, note_count, hit_window=0.1, perfect_window=0.05,
+                 perfect_points=100, good_points=50):
+        self.lane_index = lane_index
+        self.note_count = note_count
+        self.hit_window = hit_window          # Seconds either side of the hit time
+        self.perfect_window = perfect_window  # Seconds either side for a perfect hit
+        self.perfect_points = perfect_points
+        self.good_points = good_points
+        self.judged = {}  # Player ID -> whether each chart note has been hit by that player
+
+    def judged_notes(self, player_id):
+        """Return the judged flags of a player, creating them on first use"""
+        judged = self.judged.get(player_id)
+        if judged is None:
+            judged = self.judged[player_id] = np.zeros(self.note_count, dtype=bool)
+        return judged
+
+    def judge(self, presses, start_time, clients):
+        """Judge a frame's presses and return the players whose score changed"""
+        by_player = defaultdict(list)
+        for press in presses:
+            by_player[press.player_id].append(press)
+
+        changed = []
+        for player_id, player_presses in by_player.items():
+            player = clients.get_by_id(player_id)
+            if player is None:
+                continue
+            judged = self.judged_notes(player_id)
+
+            points = 0
+            player_presses.sort(key=lambda press: press.pressed_at)
+            for press in player_presses:
+                points += self._judge(judged, press.track, press.pressed_at - start_time)[1]
+
+            if points:
+                player.score += points
+                changed.append(player)
+        return changed
+
+    def judge_press(self, player_id, track, song_time):
+        """Judge a single press of a player, return the note it hit or -1 and the points scored"""
+        return self._judge(self.judged_notes(player_id), track, song_time)
+
+    def _judge(self, judged, track, song_time):
+        note = self.lane_index.find(track, song_time, self.hit_window, judged)
+        if note < 0:
+            return -1, 0
+        judged[note] = True
+        error = abs(song_time - self.lane_index.hit_time(note))
+        return note, self.perfect_points if error <= self.perfect_window else self.good_points
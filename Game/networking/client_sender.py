@@ -0,0 +1,111 @@
+"""
+Per-client send buffer for the Guitar Hero Game WebSocket server
+"""
+import logging
+import asyncio
+import time
+from collections import deque
+import websockets
+from networking.protocol import Message, NoteBatch, PlayerInfo
+
+logger = logging.getLogger(__name__)
+
+# Messages that may be dropped when a client falls behind. Control and clock sync
+# messages are always delivered, a lost Game-End leaves a controller stuck playing.
+EVICTABLE_MESSAGES = (NoteBatch, PlayerInfo)
+
+# Close code for clients whose buffer is full of messages that cannot be dropped
+CLOSE_SEND_BUFFER_FULL = 1013  # Try again later
+
+
+class ClientSender:
+    """
+    Bounded outgoing buffer for one client, drained by its own task so a slow
+    controller never delays messages to the others.
+
+    When the buffer is full the oldest note batch or score update is dropped.
+    A client whose buffer only holds messages that cannot be dropped is not
+    reading at all and is disconnected.
+
+    If latency is a Histogram, the time from enqueueing each message until the
+    socket accepted it is recorded there. Drops are counted in dropped and in
+    the dropped_counter Counter if one is given.
+    """
+    def __init__(self, player, max_pending=64, latency=None, dropped_counter=None):
+        self.player = player
+        self.max_pending = max_pending
+        self.latency = latency
+        self.dropped_counter = dropped_counter
+        self.pending = deque()  # (enqueued_at, message)
+        self.ready = asyncio.Event()
+        self.task = None
+        self.dropped = 0
+        self.closing = False
+        self._last_drop_log = 0.0
+
+    def start(self):
+        """Start the task that sends buffered messages to the client"""
+        self.task = asyncio.create_task(self._send_loop())
+
+    def enqueue(self, message):
+        """Buffer a message without waiting, making room by dropping an old one if the buffer is full"""
+        if self.closing:
+            return
+        if len(self.pending) >= self.max_pending and not self._evict():
+            logger.warning("Disconnecting %s, its send buffer is full of control messages",
+                           self.player.player_name)
+            self.closing = True
+            asyncio.create_task(self.player.websocket.close(CLOSE_SEND_BUFFER_FULL, "Send buffer full"))
+            return
+        self.pending.append((time.perf_counter(), message))
+        self.ready.set()
+
+    def _evict(self):
+        """Drop the oldest message that may be dropped, return False if there is none"""
+        for index, (_, message) in enumerate(self.pending):
+            if isinstance(message, EVICTABLE_MESSAGES):
+                del self.pending[index]
+                break
+        else:
+            return False
+
+        self.dropped += 1
+        if self.dropped_counter is not None:
+            self.dropped_counter.inc()
+        # A client that falls behind drops many messages, log at most once a second
+        now = time.monotonic()
+        if now - self._last_drop_log >= 1.0:
+            self._last_drop_log = now
+            logger.warning("Send buffer of %s is full, %d messages dropped so far",
+                           self.player.player_name, self.dropped)
+        return True
+
+    async def _send_loop(self):
+        """Send buffered messages to the client in order"""
+        while True:
+            if not self.pending:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            enqueued_at, message = self.pending.popleft()
+            try:
+                # Encode structured messages in the protocol this client negotiated
+                if isinstance(message, Message):
+                    message = message.encode_for(self.player)
+                await self.player.websocket.send(message)
+                if self.latency is not None:
+                    self.latency.observe(time.perf_counter() - enqueued_at)
+            except websockets.exceptions.ConnectionClosed:
+                return
+            except Exception as e:
+                logger.warning("Error sending to %s: %s", self.player.player_name, e)
+
+    async def close(self):
+        """Stop the send task"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
@@ -0,0 +1,59 @@
+"""
+Clock synchronization between the game host and a controller
+"""
+from collections import deque
+
+
+class ClockSync:
+    """
+    NTP-style estimate of a controller's clock offset and round trip time.
+
+    The host sends PING with its send time t0, the controller answers PONG with
+    its own clock reading t1, and the host notes the receive time t3. The round
+    trip is smoothed like TCP's SRTT/RTTVAR, and the offset is taken from the
+    lowest round trip in a window of recent samples since it has the least
+    queueing error.
+    """
+    def __init__(self, window=8, alpha=0.125, beta=0.25):
+        self.samples = deque(maxlen=window)  # (rtt, offset) pairs in seconds
+        self.alpha = alpha
+        self.beta = beta
+        self.srtt = None    # Smoothed round trip time
+        self.rttvar = None  # Smoothed round trip variation (jitter)
+        self.offset = None  # Controller clock minus host clock
+
+    @property
+    def synced(self):
+        return self.offset is not None
+
+    def add_sample(self, t0, t1, t3):
+        """Add a PING/PONG exchange, all times in seconds"""
+        rtt = max(t3 - t0, 0.0)
+        offset = t1 - (t0 + t3) / 2
+        self.samples.append((rtt, offset))
+
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.beta) * self.rttvar + self.beta * abs(self.srtt - rtt)
+            self.srtt = (1 - self.alpha) * self.srtt + self.alpha * rtt
+
+        self.offset = min(self.samples)[1]
+
+    def one_way_delay(self):
+        """Estimated host to controller delay in seconds"""
+        return self.srtt / 2 if self.synced else 0.0
+
+    def note_shift_ms(self, step=5):
+        """Shift to apply to NOTE times for this controller, rounded to step ms"""
+        # The controller starts its game clock when Game-Start arrives, one delay late
+        return -int(round(self.one_way_delay() * 1000 / step)) * step
+
+    def press_time(self, received_at, client_ms=None):
+        """Convert a button press to host time, preferring the controller's own timestamp"""
+        if not self.synced:
+            return received_at
+        if client_ms is not None:
+            return client_ms / 1000 - self.offset
+        return received_at - self.one_way_delay()
@@ -1,102 +1,131 @@
 """
 HTTP Server for Guitar Hero Game discovery service
 """
+import logging
+import asyncio
 import json
-import threading
-from http.server import BaseHTTPRequestHandler, HTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Metrics export paths and their content types
+METRICS_PATHS = {
+    "/metrics": "text/plain; version=0.0.4; charset=utf-8",
+    "/metrics.json": "application/json",
+}
+
+# Longest a client may take to send its request, controllers send it in one packet
+REQUEST_TIMEOUT = 5.0
+MAX_HEADER_LINES = 100
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+def http_response(status, body=b"", content_type=None):
+    """Build a complete HTTP/1.0 response, the connection is closed after it"""
+    head = [f"HTTP/1.0 {status} {STATUS_TEXT[status]}",
+            f"Content-Length: {len(body)}",
+            "Connection: close"]
+    if content_type:
+        head.append(f"Content-Type: {content_type}")
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
 
 class GameDiscoveryServer:
     """
-    Handles HTTP requests for game discovery
+    Handles HTTP requests for game discovery, and serves the game's metrics
+    on /metrics (Prometheus text) and /metrics.json
+
+    Runs on the event loop of the WebSocket server, which starts and stops it.
+    The discovery response is serialized once and reused until the server
+    info changes, since controllers poll it in retry loops while booting.
     """
-    def __init__(self, game_server, port=8080):
+    def __init__(self, game_server, port=8080, metrics=None):
         self.game_server = game_server
         self.port = port
-        self.http_server = None
-        self.http_thread = None
+        self.metrics = metrics
+        self.server = None
         self.is_running = False
-        
-    def start(self):
-        """Start the HTTP server for game discovery"""
+        self._discovery_key = None
+        self._discovery_response = None
+
+    async def start(self):
+        """Start serving on the running event loop"""
         if self.is_running:
-            print("HTTP server already running")
+            logger.warning("HTTP server already running")
             return
-            
-        try:
-            # Create custom request handler with access to the game server
-            server_instance = self
-            
-            class CustomHandler(BaseHTTPRequestHandler):
-                def do_GET(self):
-                    try:
-                        if self.path == "/guitargame":
-                            if server_instance.game_server:
-                                response = json.dumps(server_instance.game_server.to_dict())
-                                self.send_response(200)
-                                self.send_header("Content-Type", "application/json")
-                                self.end_headers()
-                                self.wfile.write(response.encode())
-                                print(f"Responded to HTTP service discovery with: {response}")
-                            else:
-                                self.send_response(503)  # Service Unavailable
-                                self.end_headers()
-                        else:
-                            self.send_response(404)
-                            self.end_headers()
-                    except Exception as e:
-                        print(f"Error in HTTP handler: {e}")
-                
-                def log_message(self, format, *args):
-                    # Suppress noisy HTTP server logs
-                    pass
-            
-            # Use a non-privileged port that doesn't require admin rights
-            server_address = ("0.0.0.0", self.port)
-            self.http_server = HTTPServer(server_address, CustomHandler)
-            self.is_running = True
-            
-            # Start server in a separate thread
-            self.http_thread = threading.Thread(target=self._server_thread, daemon=True)
-            self.http_thread.start()
-            
-            print(f"HTTP server for service discovery started on http://0.0.0.0:{self.port}")
-        except Exception as e:
-            print(f"Error starting HTTP server: {e}")
-            import traceback
-            traceback.print_exc()
-    
-    def _server_thread(self):
-        """Thread function for running the HTTP server"""
-        try:
-            self.http_server.serve_forever()
-        except Exception as e:
-            print(f"HTTP server thread error: {e}")
-    
-    def stop(self):
-        """Stop the HTTP server"""
+
+        # Use a non-privileged port that doesn't require admin rights
+        self.server = await asyncio.start_server(self._handle_request, "0.0.0.0", self.port)
+        self.is_running = True
+        logger.info("HTTP server for service discovery started on http://0.0.0.0:%s", self.port)
+
+    async def stop(self):
+        """Stop accepting requests"""
         if not self.is_running:
             return
-            
-        try:
-            print("Shutting down HTTP server...")
-            if self.http_server:
-                # Use a separate thread to shutdown HTTP server to avoid blocking
-                shutdown_thread = threading.Thread(target=self._shutdown_http_server, daemon=True)
-                shutdown_thread.start()
-                shutdown_thread.join(1.0)  # Wait for up to 1 second
-            
-            self.is_running = False
-            self.http_server = None
-            self.http_thread = None
-            print("HTTP server shut down successfully")
-        except Exception as e:
-            print(f"Error stopping HTTP server: {e}")
-    
-    def _shutdown_http_server(self):
-        """Helper method to shut down HTTP server without blocking"""
+
+        logger.info("Shutting down HTTP server...")
+        self.server.close()
+        await self.server.wait_closed()
+        self.server = None
+        self.is_running = False
+        logger.info("HTTP server shut down successfully")
+
+    def discovery_response(self):
+        """Response to /guitargame, serialized again only when the server info changed"""
+        game_server = self.game_server
+        if not game_server:
+            return http_response(503)
+        key = game_server.info_key()
+        if key != self._discovery_key:
+            body = json.dumps(game_server.to_dict()).encode()
+            self._discovery_response = http_response(200, body, "application/json")
+            self._discovery_key = key
+            logger.debug("Serving HTTP service discovery response: %s", body)
+        return self._discovery_response
+
+    async def response_for(self, path):
+        """Build the response to a GET of path"""
+        if path == "/guitargame":
+            return self.discovery_response()
+        if path in METRICS_PATHS and self.metrics is not None:
+            # Percentiles take a moment to compute, so keep them off the event loop
+            render = self.metrics.to_prometheus if path == "/metrics" else self.metrics.to_json
+            body = await asyncio.get_running_loop().run_in_executor(None, render)
+            return http_response(200, body.encode(), METRICS_PATHS[path])
+        return http_response(404)
+
+    async def _handle_request(self, reader, writer):
+        """Answer a single request and close the connection"""
         try:
-            if self.http_server:
-                self.http_server.shutdown()
-                self.http_server.server_close()
+            try:
+                request_line = await asyncio.wait_for(self._read_request(reader), REQUEST_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError):
+                request_line = None
+
+            parts = request_line.split() if request_line else []
+            if len(parts) != 3:
+                response = http_response(400)
+            elif parts[0] != "GET":
+                response = http_response(405)
+            else:
+                response = await self.response_for(parts[1])
+            writer.write(response)
+            await writer.drain()
+        except ConnectionError:
+            pass
         except Exception as e:
-            print(f"Error in HTTP server shutdown: {e}")
\ No newline at end of file
+            logger.warning("Error in HTTP handler: %s", e)
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        """Read the request line and skip the headers"""
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return request_line
+        raise ValueError("Too many header lines")
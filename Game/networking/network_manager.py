@@ -6,17 +6,23 @@ import time
 import queue
 from networking.http_server import GameDiscoveryServer
 from networking.websocket_server import GameWebSocketServer
+from networking.udp_discovery import UdpDiscoveryService
+from networking.protocol import DISCOVERY_PORT
 
 class NetworkManager:
     """
     Manages all networking services for the Guitar Hero Game
     """
-    def __init__(self):
+    def __init__(self, clock=None, metrics=None):
+        self.clock = clock
+        self.metrics = metrics  # MetricsRegistry shared with the game loop, exported over HTTP
         self.http_server = None
         self.websocket_server = None
         self.game_server = None
         self.message_queue = queue.Queue()
         self.http_port = 80
+        self.discovery_port = DISCOVERY_PORT  # UDP, needs no root unlike the HTTP port
+        self.udp_discovery = None
         self.is_running = False
     
     def start_services(self, game_server):
@@ -29,12 +35,15 @@ class NetworkManager:
         self.game_server = game_server
         self.is_running = True
         
-        # Start HTTP discovery service
-        self.http_server = GameDiscoveryServer(game_server, port=self.http_port)
-        self.http_server.start()
+        # HTTP discovery service, served from the WebSocket server's event loop
+        self.http_server = GameDiscoveryServer(game_server, port=self.http_port, metrics=self.metrics)
+        
+        # Zero-config discovery, announcements and probe answers over UDP on the same loop
+        self.udp_discovery = UdpDiscoveryService(game_server, port=self.discovery_port)
         
         # Start WebSocket server for controller communication
-        self.websocket_server = GameWebSocketServer(game_server, self.message_queue)
+        self.websocket_server = GameWebSocketServer(game_server, self.message_queue, self.clock, self.metrics,
+                                                    services=[self.http_server, self.udp_discovery])
         self.websocket_server.start()
         
         return True
@@ -44,15 +53,12 @@ class NetworkManager:
         if not self.is_running:
             return
             
-        # Stop WebSocket server
+        # Stop WebSocket server, which also stops the discovery services on its loop
         if self.websocket_server:
             self.websocket_server.stop()
             self.websocket_server = None
-        
-        # Stop HTTP server
-        if self.http_server:
-            self.http_server.stop()
-            self.http_server = None
+        self.http_server = None
+        self.udp_discovery = None
         
         # Clear message queue
         while not self.message_queue.empty():
@@ -0,0 +1,244 @@
+"""
+Message formats shared by the Guitar Hero Game server and controllers
+
+Every message can be sent either as the original text protocol or as a
+compact binary frame. Controllers opt into binary frames by sending
+"PROTO-<version>" after connecting; old firmware never does and keeps
+receiving text.
+
+Binary frames start with a little-endian header of protocol version (uint8),
+message type (uint8) and count (uint16), followed by fixed-size records.
+"""
+import struct
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+# Wire protocols a connection can use
+PROTOCOL_TEXT = 0
+PROTOCOL_BINARY = 1
+SUPPORTED_PROTOCOLS = (PROTOCOL_TEXT, PROTOCOL_BINARY)
+
+# Binary message types
+MSG_NOTES = 1
+MSG_GAME_START = 2
+MSG_GAME_END = 3
+MSG_PLAYER = 4
+
+HEADER = struct.Struct("<BBH")       # version, message type, record count
+NOTE_RECORD = struct.Struct("<BI")   # lane, hit time in ms since the game start
+PLAYER_RECORD = struct.Struct("<I")  # score, followed by the UTF-8 player name
+
+# Maximum number of notes packed into a single NOTES frame
+MAX_NOTES_PER_BATCH = 64
+
+# A message received from a controller, received_at is on the game clock
+InboundMessage = namedtuple("InboundMessage", ["player_id", "message", "received_at"])
+
+# UDP discovery: hosts multicast announcements and answer probes with the same datagram,
+# "GHD1|<websocket port>|<ip>|<host name>|<game name>"
+DISCOVERY_PORT = 47474
+DISCOVERY_GROUP = "239.255.47.74"
+DISCOVERY_PROBE = b"GHQ1"
+ANNOUNCEMENT_PREFIX = "GHD1"
+
+# A game found by UDP discovery, ip is the address the announcement came from
+DiscoveredGame = namedtuple("DiscoveredGame", ["ip", "port", "hostname", "game_name"])
+
+
+def parse_hit(message):
+    """Return (track, controller_ms) for a "HIT-<track>[-<controller_ms>]" message, or None"""
+    if not isinstance(message, str) or not message.startswith("HIT-"):
+        return None
+    try:
+        fields = message[4:].split("-")
+        client_ms = int(fields[1]) if len(fields) > 1 else None
+        return int(fields[0]), client_ms
+    except ValueError:
+        return None
+
+
+def format_ping(seq, host_ms):
+    """Format a clock sync request as "PING-{seq}-{host_ms}" """
+    return f"PING-{seq}-{host_ms}"
+
+
+def parse_pong(message):
+    """Return (seq, host_ms, controller_ms) for a "PONG-{seq}-{host_ms}-{controller_ms}" reply, or None"""
+    if not isinstance(message, str) or not message.startswith("PONG-"):
+        return None
+    try:
+        seq, host_ms, client_ms = (int(field) for field in message[5:].split("-"))
+        return seq, host_ms, client_ms
+    except ValueError:
+        return None
+
+
+def parse_protocol_request(message):
+    """Return the protocol requested by a "PROTO-<version>" message, or None"""
+    if not message.startswith("PROTO-"):
+        return None
+    try:
+        version = int(message[6:])
+    except ValueError:
+        return None
+    # Use the newest protocol both ends understand
+    supported = [p for p in SUPPORTED_PROTOCOLS if p <= version]
+    return max(supported) if supported else None
+
+
+def format_announcement(info):
+    """Format GameServer.to_dict() as a discovery datagram"""
+    fields = (info["port"], info["ip"], info["hostname"], info["game_name"])
+    # The separator cannot appear inside a field
+    return "|".join([ANNOUNCEMENT_PREFIX] + [str(field).replace("|", "/") for field in fields]).encode("utf-8")
+
+
+def parse_announcement(datagram, source_ip):
+    """Return the DiscoveredGame of a discovery datagram, or None"""
+    try:
+        prefix, port, _, hostname, game_name = datagram.decode("utf-8").split("|")
+        if prefix != ANNOUNCEMENT_PREFIX:
+            return None
+        # The advertised IP is often a loopback address, the source is reachable
+        return DiscoveredGame(source_ip, int(port), hostname, game_name)
+    except ValueError:
+        return None
+
+
+class Message(ABC):
+    """
+    Base class for messages that can be encoded as text or binary frames
+    """
+    def __init__(self):
+        self._encoded = {}
+
+    def encode(self, protocol):
+        """Return the frame for a protocol, encoding it only once per protocol"""
+        frame = self._encoded.get(protocol)
+        if frame is None:
+            frame = self.to_binary() if protocol == PROTOCOL_BINARY else self.to_text()
+            self._encoded[protocol] = frame
+        return frame
+
+    def __str__(self):
+        return self.encode(PROTOCOL_TEXT)
+
+    def encode_for(self, player):
+        """Return the frame for a specific player"""
+        return self.encode(player.protocol)
+
+    @abstractmethod
+    def to_text(self):
+        """Encode the message for the text protocol"""
+
+    @abstractmethod
+    def to_binary(self):
+        """Encode the message as a binary frame"""
+
+
+class NoteBatch(Message):
+    """
+    A batch of (track, time_in_ms) notes
+    """
+    def __init__(self, notes):
+        super().__init__()
+        self.notes = notes
+
+    def encode_for(self, player):
+        """Return the frame with note times shifted for the player's measured latency"""
+        shift = player.clock_sync.note_shift_ms()
+        if not shift:
+            return self.encode(player.protocol)
+
+        key = (player.protocol, shift)
+        frame = self._encoded.get(key)
+        if frame is None:
+            shifted = NoteBatch([(track, max(time_ms + shift, 0)) for track, time_ms in self.notes])
+            frame = self._encoded[key] = shifted.encode(player.protocol)
+        return frame
+
+    def to_text(self):
+        if len(self.notes) == 1:
+            return format_note(*self.notes[0])
+        return format_note_batch(self.notes)
+
+    def to_binary(self):
+        frame = bytearray(HEADER.pack(PROTOCOL_BINARY, MSG_NOTES, len(self.notes)))
+        for track, time_ms in self.notes:
+            frame += NOTE_RECORD.pack(track, time_ms)
+        return bytes(frame)
+
+
+class GameEvent(Message):
+    """
+    Game start or end notification
+    """
+    def __init__(self, event):
+        super().__init__()
+        self.event = event  # "Start" or "End"
+
+    def to_text(self):
+        return f"Game-{self.event}"
+
+    def to_binary(self):
+        msg_type = MSG_GAME_START if self.event == "Start" else MSG_GAME_END
+        return HEADER.pack(PROTOCOL_BINARY, msg_type, 0)
+
+
+class PlayerInfo(Message):
+    """
+    Player name and score for a single controller
+    """
+    def __init__(self, player):
+        super().__init__()
+        self.player_name = player.player_name
+        self.score = player.score
+        self._text = str(player)
+
+    def to_text(self):
+        return self._text
+
+    def to_binary(self):
+        name = self.player_name.encode("utf-8")
+        return HEADER.pack(PROTOCOL_BINARY, MSG_PLAYER, len(name)) + PLAYER_RECORD.pack(self.score) + name
+
+
+class ClockPing(Message):
+    """
+    Clock sync request, stamped with the host time when it is handed to the
+    socket rather than when it is queued, so the round trip the controller
+    answers with does not include the time spent in the send buffer
+    """
+    def __init__(self, seq, clock):
+        super().__init__()
+        self.seq = seq
+        self.clock = clock  # Returns the host time in seconds
+
+    def encode_for(self, player):
+        """Return the frame stamped with the current host time, never cached"""
+        return self.to_text()
+
+    def to_text(self):
+        return format_ping(self.seq, int(self.clock() * 1000))
+
+    def to_binary(self):
+        # Controllers answer pings in text whatever protocol they use
+        return self.to_text()
+
+
+def format_note(track, time_ms):
+    """Format a single note as "NOTE-{track}-{time_in_ms}" """
+    return f"NOTE-{track}-{time_ms}"
+
+
+def format_note_batch(notes):
+    """Format (track, time_in_ms) pairs as "NOTES-{track}-{time};{track}-{time};..." """
+    return "NOTES-" + ";".join(f"{track}-{time_ms}" for track, time_ms in notes)
+
+
+def note_batches(notes, max_notes=MAX_NOTES_PER_BATCH):
+    """Split (track, time_in_ms) pairs into as few NoteBatch messages as possible"""
+    return [
+        NoteBatch(notes[i:i + max_notes])
+        for i in range(0, len(notes), max_notes)
+    ]
@@ -0,0 +1,188 @@
+"""
+Hosting of several Guitar Hero Game lobbies in one process
+Routes controller connections to lobbies and ticks them on one event loop
+"""
+import logging
+import asyncio
+import threading
+import time
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+import websockets
+from game_metrics import MetricsRegistry
+from models.game_clock import WallClock
+from models.lobby_session import LobbySession
+
+logger = logging.getLogger(__name__)
+
+LOBBY_PATH_PREFIX = "/lobby/"
+
+
+def lobby_from_path(path):
+    """Return the lobby ID in "/lobby/<id>" or "/?lobby=<id>", or None for "/" """
+    parts = urlsplit(path)
+    if parts.path.startswith(LOBBY_PATH_PREFIX):
+        return parts.path[len(LOBBY_PATH_PREFIX):].strip("/") or None
+    lobby = parse_qs(parts.query).get("lobby")
+    return lobby[0] if lobby else None
+
+
+class SessionManager:
+    """
+    Runs any number of LobbySessions on a single asyncio loop in its own thread.
+
+    All lobbies share one WebSocket port. Controllers choose a lobby with the
+    path "/lobby/<id>" or "?lobby=<id>"; firmware that connects to "/" joins
+    the first lobby. The methods that change lobbies can be called from any
+    thread and wait for the loop to carry them out.
+    """
+    def __init__(self, chart_cache, port=8765, clock=None, metrics=None, tick_rate=20):
+        self.chart_cache = chart_cache
+        self.port = port
+        self.clock = clock or WallClock()
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.tick_rate = tick_rate  # Lobby ticks per second, notes are sent seconds ahead
+        self.sessions = {}  # Lobby ID -> LobbySession, replaced rather than mutated
+        self.loop = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.stop_event = None
+        self._next_id = 1
+        self.tick_seconds = self.metrics.histogram(
+            "lobby_tick_seconds", "Time to tick every lobby once")
+        self.lobby_count = self.metrics.gauge("lobbies", "Lobbies being hosted")
+
+    def start(self):
+        """Start the event loop thread and wait until it accepts connections"""
+        if self.thread:
+            logger.warning("Session manager already running")
+            return
+        self.ready.clear()
+        self.thread = threading.Thread(target=self._thread_main, daemon=True)
+        self.thread.start()
+        self.ready.wait(5.0)
+
+    def stop(self):
+        """Close every lobby and stop the event loop thread"""
+        if not self.thread:
+            return
+        loop = self.loop
+        if loop and self.stop_event:
+            try:
+                loop.call_soon_threadsafe(self.stop_event.set)
+            except RuntimeError:
+                # The loop already ended, e.g. because the port was taken
+                pass
+        self.thread.join(5.0)
+        self.thread = None
+        logger.info("Session manager stopped")
+
+    def create_lobby(self, game_name, lobby_id=None):
+        """Open a new lobby and return it"""
+        return self._call(self._create_lobby(game_name, lobby_id))
+
+    def close_lobby(self, lobby_id):
+        """Disconnect the players of a lobby and remove it"""
+        self._call(self._close_lobby(lobby_id))
+
+    def start_round(self, lobby_id, midi_path, level=None):
+        """Start playing a song in a lobby"""
+        self._call(self.sessions[lobby_id].start_round(midi_path, level))
+
+    def get(self, lobby_id):
+        return self.sessions.get(lobby_id)
+
+    def lobbies(self):
+        """Descriptions of every lobby, e.g. for a lobby list"""
+        return [session.to_dict() for session in list(self.sessions.values())]
+
+    def _call(self, coro, timeout=30.0):
+        """Run a coroutine on the manager's loop from another thread and return its result"""
+        if self.loop is None:
+            coro.close()
+            raise RuntimeError("Session manager is not running")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def _thread_main(self):
+        try:
+            asyncio.run(self._run())
+        except Exception:
+            logger.exception("Error in session manager thread")
+        finally:
+            self.loop = None
+            self.ready.set()
+
+    async def _run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        ticker = asyncio.create_task(self._tick_loop())
+        try:
+            async with websockets.serve(self._handle_client, "0.0.0.0", self.port,
+                                        process_request=self._check_lobby):
+                logger.info("Session manager listening on port %s", self.port)
+                self.ready.set()
+                await self.stop_event.wait()
+        finally:
+            ticker.cancel()
+            for lobby_id in list(self.sessions):
+                await self._close_lobby(lobby_id)
+
+    async def _create_lobby(self, game_name, lobby_id):
+        if lobby_id is None:
+            while str(self._next_id) in self.sessions:
+                self._next_id += 1
+            lobby_id = str(self._next_id)
+        if lobby_id in self.sessions:
+            raise ValueError(f"Lobby {lobby_id} already exists")
+        session = LobbySession(lobby_id, game_name, self.chart_cache, self.clock, self.port, self.metrics)
+        session.open()
+        self.sessions = {**self.sessions, lobby_id: session}
+        self.lobby_count.set(len(self.sessions))
+        logger.info("Lobby %s opened: %s", lobby_id, game_name)
+        return session
+
+    async def _close_lobby(self, lobby_id):
+        sessions = dict(self.sessions)
+        session = sessions.pop(lobby_id, None)
+        if session is None:
+            return
+        self.sessions = sessions
+        self.lobby_count.set(len(sessions))
+        await session.close()
+        logger.info("Lobby %s closed", lobby_id)
+
+    def _route(self, path):
+        """Return the session a connection to path belongs to, or None"""
+        lobby_id = lobby_from_path(path)
+        if lobby_id is None:
+            return next(iter(self.sessions.values()), None)
+        return self.sessions.get(lobby_id)
+
+    def _check_lobby(self, connection, request):
+        """Refuse the handshake for lobbies that do not exist"""
+        if self._route(request.path) is None:
+            return connection.respond(HTTPStatus.NOT_FOUND, "Unknown lobby\n")
+        return None
+
+    async def _handle_client(self, websocket):
+        session = self._route(websocket.request.path)
+        if session is None:
+            # The lobby closed during the handshake
+            await websocket.close(1008, "Unknown lobby")
+            return
+        await session.hub.handle_client(websocket)
+
+    async def _tick_loop(self):
+        """Tick every lobby at tick_rate, all on this loop"""
+        interval = 1.0 / self.tick_rate
+        while True:
+            started = time.perf_counter()
+            now = self.clock.time()
+            for session in self.sessions.values():
+                try:
+                    session.tick(now)
+                except Exception:
+                    logger.exception("Error in lobby %s", session.lobby_id)
+            elapsed = time.perf_counter() - started
+            self.tick_seconds.observe(elapsed)
+            await asyncio.sleep(max(interval - elapsed, 0))
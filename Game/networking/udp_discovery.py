@@ -0,0 +1,144 @@
+"""
+UDP discovery service for Guitar Hero Game
+Announces the game on the LAN and answers controllers probing for hosts
+"""
+import logging
+import asyncio
+import socket
+import struct
+import time
+from networking.protocol import (DISCOVERY_GROUP, DISCOVERY_PORT, DISCOVERY_PROBE,
+                                 format_announcement, parse_announcement)
+
+logger = logging.getLogger(__name__)
+
+
+def discovery_socket(port, group=DISCOVERY_GROUP):
+    """
+    UDP socket bound to the discovery port that also receives the multicast
+    announcements. Several hosts and clients on one machine can share the port.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    sock.bind(("", port))
+    # Announcements stay on the local network
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+    try:
+        membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton("0.0.0.0"))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    except OSError as e:
+        # Without a multicast route only probes and broadcasts work
+        logger.warning("Could not join discovery group %s: %s", group, e)
+    sock.setblocking(False)
+    return sock
+
+
+class UdpDiscoveryService(asyncio.DatagramProtocol):
+    """
+    Multicasts an announcement of the game every interval seconds and answers
+    probes with the same datagram, so controllers find hosts in one round trip.
+
+    Runs on the event loop of the WebSocket server, which starts and stops it.
+    """
+    def __init__(self, game_server, port=DISCOVERY_PORT, group=DISCOVERY_GROUP, interval=2.0):
+        self.game_server = game_server
+        self.port = port
+        self.group = group
+        self.interval = interval
+        self.transport = None
+        self.beacon_task = None
+        self._announcement_key = None
+        self._announcement = None
+
+    async def start(self):
+        """Start answering probes and announcing on the running event loop"""
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, sock=discovery_socket(self.port, self.group))
+        self.beacon_task = asyncio.create_task(self._beacon_loop())
+        logger.info("UDP discovery started on port %s, announcing to %s", self.port, self.group)
+
+    async def stop(self):
+        """Stop announcing and close the socket"""
+        if self.beacon_task:
+            self.beacon_task.cancel()
+            try:
+                await self.beacon_task
+            except asyncio.CancelledError:
+                pass
+            self.beacon_task = None
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        logger.info("UDP discovery stopped")
+
+    def announcement(self):
+        """The discovery datagram, encoded again only when the server info changed"""
+        key = self.game_server.info_key()
+        if key != self._announcement_key:
+            self._announcement = format_announcement(self.game_server.to_dict())
+            self._announcement_key = key
+        return self._announcement
+
+    async def _beacon_loop(self):
+        """Multicast the announcement periodically"""
+        while True:
+            try:
+                self.transport.sendto(self.announcement(), (self.group, self.port))
+            except OSError as e:
+                logger.debug("Could not send discovery announcement: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        # Our own and other hosts' announcements arrive here too
+        if data == DISCOVERY_PROBE:
+            logger.debug("Discovery probe from %s", addr[0])
+            self.transport.sendto(self.announcement(), addr)
+
+    def error_received(self, exc):
+        logger.debug("Discovery socket error: %s", exc)
+
+
+def discover_games(timeout=1.0, port=DISCOVERY_PORT, group=DISCOVERY_GROUP,
+                   probe_addresses=("255.255.255.255",), retry_interval=0.25):
+    """
+    Probe the LAN for games and collect the answers for timeout seconds. The
+    probe is repeated every retry_interval, UDP datagrams can get lost.
+    Returns a DiscoveredGame for each host, in the order they answered.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        sock.bind(("", 0))
+
+        games = {}
+        now = time.monotonic()
+        deadline = now + timeout
+        next_probe = now
+        while now < deadline:
+            if now >= next_probe:
+                for address in (group,) + tuple(probe_addresses):
+                    try:
+                        sock.sendto(DISCOVERY_PROBE, (address, port))
+                    except OSError as e:
+                        logger.debug("Could not probe %s: %s", address, e)
+                next_probe = now + retry_interval
+            sock.settimeout(min(deadline, next_probe) - now)
+            try:
+                data, addr = sock.recvfrom(512)
+                game = parse_announcement(data, addr[0])
+                if game:
+                    games.setdefault((game.ip, game.port), game)
+            except socket.timeout:
+                pass
+            now = time.monotonic()
+        return list(games.values())
+    finally:
+        sock.close()
@@ -2,12 +2,18 @@
 WebSocket Server for Guitar Hero Game
 Handles real-time communication with game controllers
 """
+import logging
 import asyncio
 import threading
 import websockets
 import time
 from models.game_server import GameServer
 from models.player import Player
+from game_metrics import MetricsRegistry
+from networking.client_sender import ClientSender
+from networking.protocol import ClockPing, InboundMessage, parse_pong, parse_protocol_request
+
+logger = logging.getLogger(__name__)
 
 class GameWebSocketServer:
     """
@@ -15,17 +21,28 @@ class GameWebSocketServer:
     """
     game_server: GameServer = None
 
-    def __init__(self, game_server:GameServer, message_queue):
+    def __init__(self, game_server:GameServer, message_queue, clock=None, metrics=None, services=(),
+                 metric_labels=None):
         self.game_server = game_server
+        self.services = list(services)  # Other servers with async start() and stop() run on this loop
         self.message_queue = message_queue
+        self.clock = clock  # Game clock used to timestamp inbound messages
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.metric_labels = dict(metric_labels or {})  # e.g. the lobby when several servers share metrics
+        self.inbound_messages = self.metrics.counter(
+            "inbound_messages_total", "Messages received from controllers", **self.metric_labels)
+        self.sync_interval = 5.0  # Seconds between clock sync pings
+        self.sync_burst = 4       # Pings sent quickly after connecting to sync fast
         self.websocket_thread = None
         self.stop_event = threading.Event()
         self.is_running = False
+        self.outgoing_event = None
+        self.senders = {}  # Client send buffers keyed by websocket
     
     def start(self):
         """Start the WebSocket server"""
         if self.is_running:
-            print("WebSocket server already running")
+            logger.warning("WebSocket server already running")
             return
         
         try:
@@ -37,33 +54,38 @@ class GameWebSocketServer:
             self.websocket_thread = threading.Thread(target=self._start_server_thread, daemon=True)
             self.websocket_thread.start()
             
-            print(f"Starting WebSocket server on port {self.game_server.Port}...")
-        except Exception as e:
-            print(f"Error starting WebSocket server: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.info("Starting WebSocket server on port %s...", self.game_server.Port)
+        except Exception:
+            logger.exception("Error starting WebSocket server")
     
     def _start_server_thread(self):
         """Start the WebSocket server in a separate thread"""
         try:
             # This function properly manages the event loop
             asyncio.run(self._run_websocket_server())
-        except Exception as e:
-            print(f"Error in WebSocket server thread: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error in WebSocket server thread")
     async def _run_websocket_server(self):
         """The async function that runs the WebSocket server"""
+        started = []
         try:
             # Create a task that monitors the stop_event
             stop_monitor = asyncio.create_task(self._monitor_stop_event())
             
             # Create a task to process outgoing messages
-            process_messages = asyncio.create_task(self._process_outgoing_messages())
+            process_messages = asyncio.create_task(self.run_outgoing())
+            
+            # Services sharing the loop, one failing to start must not stop the game
+            for service in self.services:
+                try:
+                    await service.start()
+                    started.append(service)
+                except Exception:
+                    logger.exception("Error starting %s", type(service).__name__)
             
             # Start WebSocket server
-            async with websockets.serve(self._handle_client, "0.0.0.0", self.game_server.Port) as server:
-                print(f"WebSocket server started successfully on port {self.game_server.Port}")
+            async with websockets.serve(self.handle_client, "0.0.0.0", self.game_server.Port) as server:
+                logger.info("WebSocket server started successfully on port %s", self.game_server.Port)
                 
                 # Wait for either the server to close or the stop event to be set
                 # This allows us to exit cleanly when stop_event is set
@@ -76,46 +98,49 @@ class GameWebSocketServer:
                 except asyncio.CancelledError:
                     pass
                 
-                print("WebSocket server stopped")
+                logger.info("WebSocket server stopped")
                 
-        except Exception as e:
-            print(f"Error running WebSocket server: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error running WebSocket server")
+        finally:
+            for service in started:
+                await service.stop()
+    
+    async def run_outgoing(self):
+        """Deliver the game server's queued messages on the running loop until cancelled"""
+        # Wake the outgoing message task from any thread as soon as a message is queued
+        loop = asyncio.get_running_loop()
+        self.outgoing_event = asyncio.Event()
+        self.outgoing_event.set()  # Deliver anything queued before the server started
+        self.game_server.set_message_listener(lambda: loop.call_soon_threadsafe(self.outgoing_event.set))
+        try:
+            await self._process_outgoing_messages()
+        finally:
+            if self.game_server:
+                self.game_server.set_message_listener(None)
     
     async def _process_outgoing_messages(self):
-        """Process outgoing messages from the queue"""
+        """Hand queued messages to the client send buffers as soon as they are queued"""
         while not self.stop_event.is_set():
-            # Get any queued messages
-            if self.game_server:
-                messages = self.game_server.get_queued_messages()
-                  # Process each message
-                for msg_type, message, recipient in messages:
-                    try:
-                        if msg_type == "broadcast":
-                            # Broadcast message to all clients
-                            if self.game_server.ConnectedClients:
-                                for player in self.game_server.ConnectedClients:
-                                    try:
-                                        await player.websocket.send(message)
-                                        print(f"Broadcast message sent to {player.player_name}: {message}")
-                                    except Exception as e:
-                                        print(f"Error sending to {player.player_name}: {e}")
-                        elif msg_type == "direct" and recipient:
-                            # Send message to specific client
-                            for player in self.game_server.ConnectedClients:
-                                if player.websocket == recipient:
-                                    try:
-                                        await player.websocket.send(message)
-                                        print(f"Direct message sent to {player.player_name}: {message}")
-                                    except Exception as e:
-                                        print(f"Error sending direct message: {e}")
-                                    break
-                    except Exception as e:
-                        print(f"Error sending message: {e}")
+            # Sleep until GameServer signals that a message was queued
+            await self.outgoing_event.wait()
+            self.outgoing_event.clear()
+            
+            if not self.game_server:
+                continue
             
-            # Short delay to avoid busy waiting
-            await asyncio.sleep(0.05)  # Check for new messages every 50ms
+            for msg_type, message, recipient in self.game_server.get_queued_messages():
+                try:
+                    if msg_type == "broadcast":
+                        # Each client's sender task delivers concurrently
+                        for sender in list(self.senders.values()):
+                            sender.enqueue(message)
+                    elif msg_type == "direct" and recipient:
+                        sender = self.senders.get(recipient)
+                        if sender:
+                            sender.enqueue(message)
+                except Exception as e:
+                    logger.warning("Error sending message: %s", e)
     
     async def _monitor_stop_event(self):
         """Monitor the stop event and return when it's set"""
@@ -123,61 +148,119 @@ class GameWebSocketServer:
             await asyncio.sleep(0.1)  # Short sleep to avoid busy waiting
         return
     
-    async def _handle_client(self, websocket):
-        """Handle client websocket connections"""
+    async def handle_client(self, websocket):
+        """Handle a client websocket connection until it closes"""
         try:
             # Register client
-            print(f"Client connected: {websocket.remote_address}")
+            logger.info("Client connected: %s", websocket.remote_address)
+            player = None
+            sync_task = None
             if self.game_server:
                 # Add the client to the connected clients list in the game server
                 player = self.game_server.add_client(websocket)
 
+                # Everything sent to the client goes through its own send buffer, which is
+                # registered in the same step so no broadcast can slip past it
+                labels = self._player_labels(player)
+                sender = ClientSender(
+                    player,
+                    latency=self.metrics.histogram(
+                        "send_latency_seconds", "Time from queueing a message to the socket accepting it", **labels),
+                    dropped_counter=self.metrics.counter(
+                        "dropped_messages_total", "Messages dropped because a client fell behind", **labels))
+                sender.start()
+                self.senders[websocket] = sender
+
                 # Send state change message to the client
-                await websocket.send("SM-PlayingState")
+                sender.enqueue("SM-PlayingState")
 
                 # Wait for a short time to allow the client to process the message
                 await asyncio.sleep(0.1)
 
                 # Send player object information
-                await websocket.send(player.__str__())
+                sender.enqueue(player.__str__())
+                
+                # Keep measuring the controller's clock offset and latency
+                sync_task = asyncio.create_task(self._clock_sync_loop(sender))
             
             try:
                 # Keep connection open and handle messages
                 async for message in websocket:
+                    self.inbound_messages.inc()
                     try:
                         # Process incoming message
-                        print(f"Received message: {message}")
+                        logger.debug("Received message: %s", message)
+                        
+                        # Clock sync replies never reach the game
+                        pong = parse_pong(message)
+                        if pong is not None:
+                            if player:
+                                _, host_ms, client_ms = pong
+                                player.clock_sync.add_sample(host_ms / 1000, client_ms / 1000, self._now())
+                            continue
                         
-                        # Put message in queue for game processing
-                        self.message_queue.put(message)
+                        # Controllers that understand binary frames ask for them after connecting
+                        protocol = parse_protocol_request(message)
+                        if protocol is not None:
+                            if player:
+                                player.protocol = protocol
+                                logger.info("%s switched to protocol %s", player.player_name, protocol)
+                            continue
+                        
+                        # Put message in queue for game processing, tagged with its sender and receive time
+                        received_at = self._now()
+                        player_id = player.player_id if player else None
+                        self.message_queue.put(InboundMessage(player_id, message, received_at))
                         
                         # Echo the message back
                         #await websocket.send(f"Server received: {message}")
                         
                     except Exception as e:
-                        print(f"Error processing message: {e}")
+                        logger.warning("Error processing message: %s", e)
             
             except websockets.exceptions.ConnectionClosed:
-                print(f"Connection closed with client: {websocket.remote_address}")
+                logger.info("Connection closed with client: %s", websocket.remote_address)
                 self.game_server.remove_client(websocket)
             
             finally:
                 # Unregister client when connection is closed
-                if self.game_server and websocket in self.game_server.ConnectedClients:
-                    self.game_server.send_message("SM-MenuState", websocket)
+                if sync_task:
+                    sync_task.cancel()
+                sender = self.senders.pop(websocket, None)
+                if sender:
+                    await sender.close()
+                    labels = self._player_labels(sender.player)
+                    self.metrics.remove("send_latency_seconds", **labels)
+                    self.metrics.remove("dropped_messages_total", **labels)
+                if self.game_server and self.game_server.get_client(websocket):
                     self.game_server.remove_client(websocket)
-        except Exception as e:
-            print(f"Error in handle_client: {e}")
+        except Exception:
+            logger.exception("Error in handle_client")
+    
+    def _player_labels(self, player):
+        """Metric labels of a player, the ID keeps players with the same name apart"""
+        return {**self.metric_labels, "player": player.player_name, "player_id": player.player_id}
+    
+    def _now(self):
+        """Current time on the game clock in seconds"""
+        return self.clock.time() if self.clock else time.time()
+    
+    async def _clock_sync_loop(self, sender):
+        """Send clock sync pings, a quick burst after connecting and then periodically"""
+        seq = 0
+        while True:
+            seq += 1
+            # Stamped by the sender task as it goes out, queueing is not latency
+            sender.enqueue(ClockPing(seq, self._now))
+            await asyncio.sleep(0.2 if seq < self.sync_burst else self.sync_interval)
     
     async def broadcast_message(self, message):
         """Send a message to all connected clients"""
         try:
-            if self.game_server and self.game_server.ConnectedClients:
-                await asyncio.gather(
-                    *[client.send(message) for client in self.game_server.ConnectedClients]
-                )
+            for sender in list(self.senders.values()):
+                sender.enqueue(message)
         except Exception as e:
-            print(f"Error broadcasting message: {e}")
+            logger.warning("Error broadcasting message: %s", e)
     
     def stop(self):
         """Stop the WebSocket server"""
@@ -185,17 +268,17 @@ class GameWebSocketServer:
             return
             
         try:
-            print("Signaling WebSocket server to stop...")
+            logger.info("Signaling WebSocket server to stop...")
             # Signal the WebSocket server to stop by setting the stop event
             self.stop_event.set()
             
             # Wait briefly for thread to clean up
             if self.websocket_thread and self.websocket_thread.is_alive():
-                print("Waiting for WebSocket server to terminate...")
+                logger.debug("Waiting for WebSocket server to terminate...")
                 self.websocket_thread.join(2.0)  # Give it 2 seconds to terminate
             
             self.is_running = False
             self.websocket_thread = None
-            print("WebSocket server stopped")
+            logger.info("WebSocket server stopped")
         except Exception as e:
-            print(f"Error stopping WebSocket server: {e}")
\ No newline at end of file
+            logger.error("Error stopping WebSocket server: %s", e)
\ No newline at end of file
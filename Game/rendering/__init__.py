@@ -0,0 +1,3 @@
+"""
+Rendering helpers shared by the game screens
+"""
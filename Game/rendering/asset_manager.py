@@ -0,0 +1,119 @@
+"""
+Fonts and other assets shared by every screen
+"""
+import logging
+import threading
+from collections import OrderedDict
+import pygame
+
+logger = logging.getLogger(__name__)
+
+# Fonts used by the screens, looked up in the background when the game starts
+UI_FONTS = [
+    ("Arial", 64, True),
+    ("Arial", 48, True),
+    ("Arial", 36, False),
+    ("Arial", 32, False),
+    ("Arial", 24, False),
+]
+
+
+class AssetManager:
+    """
+    Process-wide cache of loaded assets.
+
+    Screens acquire assets by key and release them when they are left. Assets
+    nobody holds stay cached so the next screen gets them instantly, up to
+    max_unused of them, after which the least recently released are evicted.
+    """
+    def __init__(self, max_unused=16):
+        self.max_unused = max_unused
+        self.lock = threading.RLock()
+        self.entries = {}           # key -> [asset, reference count]
+        self.unused = OrderedDict() # Keys with no references, oldest first
+        self.keys = {}              # id(asset) -> key, so assets can be released directly
+        self.font_files = {}        # (name, size, bold, italic) -> (path, fake bold, fake italic)
+        self.font_files_lock = threading.Lock()  # Held during font lookups, never while loading assets
+        self.loads = 0
+        self.preload_thread = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def acquire(self, key, load):
+        """Return the asset for key, calling load() only if it is not cached"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                return self._hold(key, entry)
+
+        # Load outside the lock so a slow load never blocks other screens
+        asset = load()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.loads += 1
+                entry = self.entries[key] = [asset, 0]
+                self.keys[id(asset)] = key
+            return self._hold(key, entry)
+
+    def _hold(self, key, entry):
+        entry[1] += 1
+        self.unused.pop(key, None)
+        return entry[0]
+
+    def release(self, asset):
+        """Drop one reference to an asset returned by acquire"""
+        with self.lock:
+            key = self.keys.get(id(asset))
+            entry = self.entries.get(key)
+            if entry is None or entry[1] == 0:
+                return
+            entry[1] -= 1
+            if entry[1] == 0:
+                self.unused[key] = True
+                while len(self.unused) > self.max_unused:
+                    self._evict(self.unused.popitem(last=False)[0])
+
+    def _evict(self, key):
+        asset, _ = self.entries.pop(key)
+        self.keys.pop(id(asset), None)
+
+    def font(self, name, size, bold=False, italic=False):
+        """Acquire a system font, must be called on the thread that renders text"""
+        def load():
+            # SDL_ttf is not thread-safe, so fonts are only opened here
+            path, fake_bold, fake_italic = self.font_file(name, size, bold, italic)
+            font = pygame.font.Font(path, size)
+            font.set_bold(fake_bold)
+            font.set_italic(fake_italic)
+            return font
+        return self.acquire(("font", name, size, bold, italic), load)
+
+    def font_file(self, name, size, bold=False, italic=False):
+        """Return (path, fake bold, fake italic) of a system font, as SysFont would pick it"""
+        key = (name, size, bold, italic)
+        # A lookup on the render thread waits for the preload thread's instead of scanning again
+        with self.font_files_lock:
+            spec = self.font_files.get(key)
+            if spec is None:
+                # The first lookup scans the installed fonts, SysFont's constructor hook
+                # returns its choice without opening the font
+                spec = pygame.font.SysFont(name, size, bold=bold, italic=italic,
+                                           constructor=lambda path, size, fake_bold, fake_italic:
+                                           (path, fake_bold, fake_italic))
+                self.font_files[key] = spec
+        return spec
+
+    def preload_fonts(self, fonts):
+        """Look up (name, size, bold) fonts on a background thread, so the font scan is done early"""
+        def preload():
+            for name, size, bold in fonts:
+                try:
+                    self.font_file(name, size, bold)
+                except Exception as e:
+                    logger.warning("Error looking up font %s %s: %s", name, size, e)
+
+        self.preload_thread = threading.Thread(target=preload, daemon=True)
+        self.preload_thread.start()
+        return self.preload_thread
@@ -0,0 +1,99 @@
+"""
+Dirty rectangle rendering for the game screens
+"""
+import pygame
+
+
+class ScreenRenderer:
+    """
+    Draws a screen as a static background layer, cached elements and moving sprites,
+    and reports only the areas that changed.
+
+    The background is drawn once. Elements are surfaces identified by a name and a
+    state key and are only rebuilt and redrawn when the key changes. Sprites are
+    plain colored rectangles that are erased and redrawn every frame. end() returns
+    the dirty rectangles for pygame.display.update.
+    """
+    def __init__(self, size, build_background=None, background_color=(0, 0, 0)):
+        self.size = size
+        self.background = pygame.Surface(size)
+        self.background.fill(background_color)
+        if build_background:
+            build_background(self.background)
+        self.elements = {}   # name -> (key, surface, rect)
+        self.sprites = []    # Sprite rects drawn last frame
+        self.screen = None
+        self.dirty = []
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Redraw everything on the next frame"""
+        self.full_redraw = True
+
+    def begin(self, screen):
+        """Start a frame"""
+        self.screen = screen
+        self.dirty = []
+        if self.full_redraw:
+            screen.blit(self.background, (0, 0))
+            for _, surface, rect in self.elements.values():
+                screen.blit(surface, rect)
+            self.sprites = []
+            self.dirty.append(screen.get_rect())
+
+    def element(self, name, key, build):
+        """
+        Draw the element name, calling build() for a new (surface, rect) only when
+        key differs from the previous frame
+        """
+        previous = self.elements.get(name)
+        if previous and previous[0] == key:
+            return previous[2]
+
+        surface, rect = build()
+        rect = pygame.Rect(rect)
+        
+        # Clear the old and new areas without this element, since blending it twice
+        # would thicken its anti-aliased edges
+        self.elements.pop(name, None)
+        if previous:
+            self._restore(previous[2])
+            self.dirty.append(previous[2])
+        self._restore(rect)
+        self.elements[name] = (key, surface, rect)
+        self.screen.blit(surface, rect)
+        self.dirty.append(rect)
+        return rect
+
+    def text(self, name, text_cache, font, text, color, **position):
+        """Draw a cached text element positioned like Surface.get_rect(**position)"""
+        def build():
+            surface = text_cache.render(font, text, color)
+            return surface, surface.get_rect(**position)
+        return self.element(name, (text, tuple(color), tuple(position.items())), build)
+
+    def draw_sprites(self, sprites):
+        """Erase last frame's sprites and draw (color, rect) pairs on top of everything else"""
+        for rect in self.sprites:
+            self._restore(rect)
+        self.dirty.extend(self.sprites)
+
+        drawn = []
+        for color, rect in sprites:
+            drawn.append(self.screen.fill(color, rect))
+        self.dirty.extend(drawn)
+        self.sprites = drawn
+
+    def end(self):
+        """Finish the frame and return the rectangles that need updating"""
+        self.full_redraw = False
+        self.screen = None
+        return self.dirty
+
+    def _restore(self, rect):
+        """Redraw the background and any elements under rect"""
+        self.screen.blit(self.background, rect, rect)
+        for _, surface, element_rect in self.elements.values():
+            clip = rect.clip(element_rect)
+            if clip.width and clip.height:
+                self.screen.blit(surface, clip, clip.move(-element_rect.x, -element_rect.y))
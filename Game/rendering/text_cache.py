@@ -0,0 +1,41 @@
+"""
+Cache of rendered text surfaces
+"""
+from collections import OrderedDict
+
+
+class TextCache:
+    """
+    Rendered text surfaces keyed by string, font and color.
+
+    font.render is one of the most expensive calls in a frame, and most strings
+    on screen never change, so each one is rendered once and reused. The least
+    recently used surfaces are dropped once max_entries is reached.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.surfaces)
+
+    def render(self, font, text, color, antialias=True):
+        """Return the surface for text, rendering it only on a cache miss"""
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
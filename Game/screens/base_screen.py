@@ -1,4 +1,8 @@
+import logging
 import pygame
+import threading
+
+logger = logging.getLogger(__name__)
 
 class BaseScreen:
     """
@@ -7,7 +11,63 @@ class BaseScreen:
     def __init__(self, game_instance):
         self.game_instance = game_instance
         self.next_screen = None
+        self.renderer = None  # ScreenRenderer for screens that draw dirty rectangles
+        self.assets = []      # Shared assets held by this screen
+        self.holding_assets = False
+        self.preloaded = False
+        self.preload_thread = None
+        self.acquire_assets()
+    
+    def load_assets(self):
+        """Acquire the screen's shared assets, e.g. self.font = self.get_font(...)"""
+        pass
+    
+    def acquire_assets(self):
+        """Take the screen's shared assets, unless it already holds them"""
+        if not self.holding_assets:
+            self.load_assets()
+            self.holding_assets = True
         
+    def preload(self):
+        """Do expensive setup before the screen is entered, may run on a background thread"""
+        pass
+    
+    def on_enter(self):
+        """Called when the screen becomes the current screen"""
+        self.acquire_assets()
+        self.next_screen = None
+        self.invalidate()
+    
+    def on_exit(self):
+        """Called when another screen replaces this one"""
+        pass
+    
+    def start_preload(self):
+        """Run preload() on a background thread unless it already ran"""
+        if self.preloaded or (self.preload_thread and self.preload_thread.is_alive()):
+            return
+        self.preload_thread = threading.Thread(target=self._run_preload, daemon=True)
+        self.preload_thread.start()
+    
+    def is_preloading(self):
+        """Whether a background preload is still running"""
+        return self.preload_thread is not None and self.preload_thread.is_alive()
+    
+    def finish_preload(self):
+        """Wait for a background preload, or preload now if none was started"""
+        if self.preload_thread:
+            self.preload_thread.join()
+            self.preload_thread = None
+        if not self.preloaded:
+            self._run_preload()
+    
+    def _run_preload(self):
+        try:
+            self.preload()
+            self.preloaded = True
+        except Exception:
+            logger.exception("Error preloading %s", type(self).__name__)
+    
     def handle_events(self, events):
         """Process pygame events"""
         pass
@@ -17,8 +77,26 @@ class BaseScreen:
         pass
         
     def draw(self, screen):
-        """Draw screen elements"""
+        """Draw screen elements, returning the changed rects or None if the whole screen changed"""
         pass
+    
+    def invalidate(self):
+        """Make the next draw repaint the whole screen"""
+        if self.renderer:
+            self.renderer.invalidate()
+        
+    def get_font(self, name, size, bold=False):
+        """Get a shared font from the asset manager, held until the screen is left, for load_assets"""
+        font = self.game_instance.assets.font(name, size, bold)
+        self.assets.append(font)
+        return font
+    
+    def release_assets(self):
+        """Hand the screen's shared assets back to the asset manager, on_enter takes them again"""
+        for asset in self.assets:
+            self.game_instance.assets.release(asset)
+        self.assets = []
+        self.holding_assets = False
         
     def get_next_screen(self):
         """Return the next screen to switch to, or None to stay on current screen"""
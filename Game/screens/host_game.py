@@ -1,6 +1,7 @@
 import pygame
 from screens.base_screen import BaseScreen
 from screens.lobby_screen import LobbyScreen
+from rendering.screen_renderer import ScreenRenderer
 
 class HostGameScreen(BaseScreen):
     """
@@ -8,9 +9,6 @@ class HostGameScreen(BaseScreen):
     """
     def __init__(self, game_instance):
         super().__init__(game_instance)
-        self.header_font = pygame.font.SysFont("Arial", 48, bold=True)
-        self.text_font = pygame.font.SysFont("Arial", 32)
-        self.input_font = pygame.font.SysFont("Arial", 36)
         
         # Game name input
         self.game_name = "My Guitar Hero Game"
@@ -29,6 +27,15 @@ class HostGameScreen(BaseScreen):
         self.start_rect = pygame.Rect(250, 350, 300, 50)
         self.back_rect = pygame.Rect(250, 420, 300, 50)
         
+        # Only the input box is redrawn, and only while it is being edited
+        self.renderer = ScreenRenderer(self.game_instance.screen.get_size(), self.draw_background)
+        
+    def load_assets(self):
+        """Fonts shared with the other screens, released while the screen is not shown"""
+        self.header_font = self.get_font("Arial", 48, bold=True)
+        self.text_font = self.get_font("Arial", 32)
+        self.input_font = self.get_font("Arial", 36)
+    
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.MOUSEBUTTONDOWN:
@@ -63,39 +70,49 @@ class HostGameScreen(BaseScreen):
         # Create game server with custom name
         self.game_instance.create_game_server(self.game_name)
         # Transition to lobby screen instead of directly to playing screen
-        self.next_screen = LobbyScreen(self.game_instance)
+        self.next_screen = self.game_instance.screens.get(LobbyScreen)
         
     def go_back(self):
         # Import here to avoid circular imports
         from screens.main_menu import MainMenuScreen
-        self.next_screen = MainMenuScreen(self.game_instance)
+        self.next_screen = self.game_instance.screens.get(MainMenuScreen)
     
-    def draw(self, screen):
-        # Fill background
-        screen.fill((0, 0, 0))
-        
+    def draw_background(self, surface):
+        """Draw the parts of the screen that never change"""
         # Draw header
         header_surface = self.header_font.render("Host a New Game", True, self.header_color)
         header_rect = header_surface.get_rect(center=(self.game_instance.screen_width // 2, 100))
-        screen.blit(header_surface, header_rect)
+        surface.blit(header_surface, header_rect)
         
         # Draw input label
         label_surface = self.text_font.render("Game Name:", True, self.text_color)
-        screen.blit(label_surface, (self.input_rect.x, self.input_rect.y - 40))
-        
-        # Draw input box
-        pygame.draw.rect(screen, self.input_color, self.input_rect, 2)
-        input_surface = self.input_font.render(self.game_name, True, self.text_color)
-        screen.blit(input_surface, (self.input_rect.x + 5, self.input_rect.y + 10))
+        surface.blit(label_surface, (self.input_rect.x, self.input_rect.y - 40))
         
         # Draw start button
-        pygame.draw.rect(screen, self.active_color, self.start_rect, 2)
+        pygame.draw.rect(surface, self.active_color, self.start_rect, 2)
         start_surface = self.text_font.render("Start Game", True, self.text_color)
         start_text_rect = start_surface.get_rect(center=self.start_rect.center)
-        screen.blit(start_surface, start_text_rect)
+        surface.blit(start_surface, start_text_rect)
         
         # Draw back button
-        pygame.draw.rect(screen, self.passive_color, self.back_rect, 2)
+        pygame.draw.rect(surface, self.passive_color, self.back_rect, 2)
         back_surface = self.text_font.render("Back to Menu", True, self.text_color)
         back_text_rect = back_surface.get_rect(center=self.back_rect.center)
-        screen.blit(back_surface, back_text_rect)
\ No newline at end of file
+        surface.blit(back_surface, back_text_rect)
+    
+    def draw(self, screen):
+        self.renderer.begin(screen)
+        self.renderer.element("input", (self.game_name, self.input_color), self.build_input)
+        return self.renderer.end()
+    
+    def build_input(self):
+        """Render the input box with the current game name"""
+        input_surface = self.input_font.render(self.game_name, True, self.text_color)
+        text_rect = input_surface.get_rect(topleft=(self.input_rect.x + 5, self.input_rect.y + 10))
+        rect = self.input_rect.union(text_rect)
+        surface = pygame.Surface(rect.size, pygame.SRCALPHA)
+        
+        # Draw input box
+        pygame.draw.rect(surface, self.input_color, self.input_rect.move(-rect.x, -rect.y), 2)
+        surface.blit(input_surface, text_rect.move(-rect.x, -rect.y))
+        return surface, rect
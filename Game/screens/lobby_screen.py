@@ -1,6 +1,10 @@
+import logging
 import pygame
 from screens.base_screen import BaseScreen
 from screens.playing_game import PlayingGameScreen
+from rendering.screen_renderer import ScreenRenderer
+
+logger = logging.getLogger(__name__)
 
 class LobbyScreen(BaseScreen):
     """
@@ -8,9 +12,6 @@ class LobbyScreen(BaseScreen):
     """
     def __init__(self, game_instance):
         super().__init__(game_instance)
-        self.header_font = pygame.font.SysFont("Arial", 48, bold=True)
-        self.text_font = pygame.font.SysFont("Arial", 32)
-        self.info_font = pygame.font.SysFont("Arial", 24)
         
         # Colors
         self.header_color = (255, 255, 0)  # Yellow
@@ -27,6 +28,28 @@ class LobbyScreen(BaseScreen):
         self.refresh_timer = 0
         self.refresh_interval = 1000  # ms
         
+        # Start was pressed before the song finished loading
+        self.start_requested = False
+        
+        # Song picker, searches the song index as you type. The filter narrows the
+        # songs by how dense they are, the chart level below sets what is played
+        self.difficulties = [None, "Easy", "Medium", "Hard"]
+        self.difficulty_index = 0
+        self.search_text = ""
+        self.songs = [None]  # Search results, None stands for a random song
+        self.selected_song = 0
+        
+        # Chart difficulty level to play the song at
+        chart_cache = self.game_instance.chart_cache
+        self.levels = chart_cache.level_names()
+        self.level_index = self.levels.index(chart_cache.default_level)
+        
+    def load_assets(self):
+        """Fonts shared with the other screens, released while the screen is not shown"""
+        self.header_font = self.get_font("Arial", 48, bold=True)
+        self.text_font = self.get_font("Arial", 32)
+        self.info_font = self.get_font("Arial", 24)
+    
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.KEYDOWN:
@@ -34,6 +57,23 @@ class LobbyScreen(BaseScreen):
                     self.start_game()
                 elif event.key == pygame.K_ESCAPE:
                     self.go_back()
+                elif event.key == pygame.K_UP:
+                    self.selected_song = (self.selected_song - 1) % len(self.songs)
+                elif event.key == pygame.K_DOWN:
+                    self.selected_song = (self.selected_song + 1) % len(self.songs)
+                elif event.key == pygame.K_LEFT:
+                    self.level_index = max(self.level_index - 1, 0)
+                elif event.key == pygame.K_RIGHT:
+                    self.level_index = min(self.level_index + 1, len(self.levels) - 1)
+                elif event.key == pygame.K_TAB:
+                    self.difficulty_index = (self.difficulty_index + 1) % len(self.difficulties)
+                    self.search_songs()
+                elif event.key == pygame.K_BACKSPACE:
+                    self.search_text = self.search_text[:-1]
+                    self.search_songs()
+                elif event.unicode.isalnum() and len(self.search_text) < 20:
+                    self.search_text += event.unicode
+                    self.search_songs()
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:  # Left mouse button
                     # Check if start button was clicked
@@ -43,76 +83,154 @@ class LobbyScreen(BaseScreen):
                     elif self.back_rect.collidepoint(event.pos):
                         self.go_back()
     
+    def on_enter(self):
+        """Show the current server and start loading the next song"""
+        super().on_enter()
+        self.start_requested = False
+        
+        # Server details never change while in the lobby, only the player count does
+        self.renderer = ScreenRenderer(self.game_instance.screen.get_size(), self.draw_background)
+        
+        # The song loads while players join, so starting the game is instant
+        self.search_songs()
+        self.load_selected_song()
+    
+    def search_songs(self):
+        """Query the song index for the current search"""
+        current = self.songs[self.selected_song]
+        results = self.game_instance.song_library.search(
+            text=self.search_text,
+            difficulty=self.difficulties[self.difficulty_index],
+            limit=100
+        )
+        self.songs = [None] + results
+        
+        # Keep the selection on the same song if it is still in the results
+        self.selected_song = 0
+        for i, song in enumerate(self.songs):
+            if song and current and song.path == current.path:
+                self.selected_song = i
+    
+    def load_selected_song(self):
+        """Have the playing screen preload the selected song and level, once any running preload is done"""
+        playing_screen = self.game_instance.screens.get(PlayingGameScreen)
+        song = self.songs[self.selected_song]
+        requested = song.path if song else None
+        if playing_screen.is_preloading():
+            return
+        if playing_screen.requested_song != requested:
+            playing_screen.requested_song = requested
+            playing_screen.unload()
+        playing_screen.select_level(self.levels[self.level_index])
+        playing_screen.start_preload()
+    
     def start_game(self):
         """Start the game with currently connected players"""
-        self.next_screen = PlayingGameScreen(self.game_instance)
+        playing_screen = self.game_instance.screens.get(PlayingGameScreen)
+        song = self.songs[self.selected_song]
+        if (playing_screen.is_preloading() or playing_screen.requested_song != (song.path if song else None)
+                or playing_screen.level != self.levels[self.level_index]):
+            # Switch once the song is loaded instead of blocking the frame on it
+            self.start_requested = True
+            return
+        self.next_screen = playing_screen
     
     def go_back(self):
         """Go back to the host game screen"""
         # Stop the server before going back to the host screen
-        print("Going back to host screen, stopping server...")
+        logger.info("Going back to host screen, stopping server...")
         self.game_instance.stop_server()
         
         # Import here to avoid circular imports
         from screens.host_game import HostGameScreen
-        self.next_screen = HostGameScreen(self.game_instance)
+        self.next_screen = self.game_instance.screens.get(HostGameScreen)
     
     def update(self):
         """Update lobby information"""
-        current_time = pygame.time.get_ticks()
+        current_time = self.game_instance.clock.ticks()
+        
+        self.load_selected_song()
+        if self.start_requested:
+            self.start_game()
         
         # Refresh the game state periodically
         if current_time - self.refresh_timer > self.refresh_interval:
             self.refresh_timer = current_time
+            # Pick up songs indexed since the last search
+            self.search_songs()
             # Process any messages from clients
             self.game_instance.process_messages()
     
-    def draw(self, screen):
-        """Draw the lobby screen"""
-        # Fill background
-        screen.fill((0, 0, 0))
-        
+    def draw_background(self, surface):
+        """Draw the parts of the lobby that never change"""
         # Draw header
         header_text = f"Lobby: {self.game_instance.game_server.GameName}"
         header_surface = self.header_font.render(header_text, True, self.header_color)
         header_rect = header_surface.get_rect(center=(self.game_instance.screen_width // 2, 80))
-        screen.blit(header_surface, header_rect)
+        surface.blit(header_surface, header_rect)
         
         # Draw server info
         ip_text = f"Server IP: {self.game_instance.game_server.HostIP}"
         ip_surface = self.text_font.render(ip_text, True, self.text_color)
-        screen.blit(ip_surface, (50, 150))
+        surface.blit(ip_surface, (50, 150))
         
         port_text = f"Port: {self.game_instance.game_server.Port}"
         port_surface = self.text_font.render(port_text, True, self.text_color)
-        screen.blit(port_surface, (50, 190))
+        surface.blit(port_surface, (50, 190))
+        
+        # Draw back button
+        pygame.draw.rect(surface, self.passive_color, self.back_rect, 2, border_radius=5)
+        back_surface = self.text_font.render("Back", True, self.text_color)
+        back_text_rect = back_surface.get_rect(center=self.back_rect.center)
+        surface.blit(back_surface, back_text_rect)
+    
+    def draw(self, screen):
+        """Draw the lobby screen"""
+        renderer = self.renderer
+        text_cache = self.game_instance.text_cache
+        renderer.begin(screen)
         
         # Draw player count with highlight
         player_count = len(self.game_instance.game_server.ConnectedClients)
         player_text = f"Connected Players: {player_count}"
-        player_surface = self.text_font.render(player_text, True, self.highlight_color)
-        screen.blit(player_surface, (50, 250))
+        renderer.text("players", text_cache, self.text_font, player_text, self.highlight_color, topleft=(50, 250))
         
         # Draw instructions
-        if player_count == 0:
+        if self.start_requested:
+            instruction_text = "Loading song..."
+        elif player_count == 0:
             instruction_text = "Waiting for players to join..."
         else:
             instruction_text = "Players connected! Ready to start game."
+        renderer.text("instructions", text_cache, self.info_font, instruction_text, self.text_color,
+                      center=(self.game_instance.screen_width // 2, 300))
         
-        instruction_surface = self.info_font.render(instruction_text, True, self.text_color)
-        instruction_rect = instruction_surface.get_rect(center=(self.game_instance.screen_width // 2, 300))
-        screen.blit(instruction_surface, instruction_rect)
+        # Draw song picker
+        song = self.songs[self.selected_song]
+        if song:
+            minutes, seconds = divmod(int(song.duration), 60)
+            song_text = f"Song: {song.name} ({minutes}:{seconds:02d}, {song.note_count} notes, {song.difficulty})"
+        else:
+            song_text = "Song: Random"
+        renderer.text("song", text_cache, self.info_font, song_text, self.highlight_color, topleft=(50, 490))
+        difficulty = self.difficulties[self.difficulty_index]
+        song_filter = f"{difficulty} songs" if difficulty else "All songs"
+        search_text = f"Search: {self.search_text}_   Filter: {song_filter} (Tab)   ({len(self.songs) - 1} found, Up/Down)"
+        renderer.text("search", text_cache, self.info_font, search_text, self.text_color, topleft=(50, 530))
+        level_text = f"Play at: {self.levels[self.level_index]} chart (Left/Right)"
+        renderer.text("level", text_cache, self.info_font, level_text, self.text_color, topleft=(50, 565))
         
         # Draw start button
-        button_color = self.active_color if player_count > 0 else self.passive_color
-        pygame.draw.rect(screen, button_color, self.start_rect, 2, border_radius=5)
-        start_text = "Start Game" if player_count > 0 else "Waiting for Players..."
-        start_surface = self.text_font.render(start_text, True, button_color)
-        start_text_rect = start_surface.get_rect(center=self.start_rect.center)
-        screen.blit(start_surface, start_text_rect)
+        renderer.element("start", player_count > 0, lambda: self.build_start_button(player_count > 0))
         
-        # Draw back button
-        pygame.draw.rect(screen, self.passive_color, self.back_rect, 2, border_radius=5)
-        back_surface = self.text_font.render("Back", True, self.text_color)
-        back_text_rect = back_surface.get_rect(center=self.back_rect.center)
-        screen.blit(back_surface, back_text_rect)
\ No newline at end of file
+        return renderer.end()
+    
+    def build_start_button(self, ready):
+        """Render the start button, active once someone has joined"""
+        button_color = self.active_color if ready else self.passive_color
+        surface = pygame.Surface(self.start_rect.size, pygame.SRCALPHA)
+        pygame.draw.rect(surface, button_color, surface.get_rect(), 2, border_radius=5)
+        start_text = "Start Game" if ready else "Waiting for Players..."
+        start_surface = self.game_instance.text_cache.render(self.text_font, start_text, button_color)
+        surface.blit(start_surface, start_surface.get_rect(center=surface.get_rect().center))
+        return surface, self.start_rect
@@ -1,6 +1,7 @@
 import pygame
 from screens.base_screen import BaseScreen
 from screens.host_game import HostGameScreen
+from rendering.screen_renderer import ScreenRenderer
 
 class MainMenuScreen(BaseScreen):
     """
@@ -8,8 +9,6 @@ class MainMenuScreen(BaseScreen):
     """
     def __init__(self, game_instance):
         super().__init__(game_instance)
-        self.title_font = pygame.font.SysFont("Arial", 64, bold=True)
-        self.menu_font = pygame.font.SysFont("Arial", 36)
         
         # Menu options
         self.options = ["Host Game", "Quit"]
@@ -22,7 +21,19 @@ class MainMenuScreen(BaseScreen):
         
         # Option rectangles for mouse interaction
         self.option_rects = []
+        for i, option in enumerate(self.options):
+            option_rect = pygame.Rect((0, 0), self.menu_font.size(option))
+            option_rect.center = (self.game_instance.screen_width // 2, 250 + i * 60)
+            self.option_rects.append(option_rect)
         
+        # The title is drawn once, options only when the selection changes
+        self.renderer = ScreenRenderer(self.game_instance.screen.get_size(), self.draw_background)
+        
+    def load_assets(self):
+        """Fonts shared with the other screens, released while the screen is not shown"""
+        self.title_font = self.get_font("Arial", 64, bold=True)
+        self.menu_font = self.get_font("Arial", 36)
+    
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.KEYDOWN:
@@ -48,40 +59,37 @@ class MainMenuScreen(BaseScreen):
     
     def select_option(self):
         if self.options[self.selected_option] == "Host Game":
-            self.next_screen = HostGameScreen(self.game_instance)
+            self.next_screen = self.game_instance.screens.get(HostGameScreen)
         elif self.options[self.selected_option] == "Quit":
             self.game_instance.running = False
     
-    def draw(self, screen):
-        # Fill background
-        screen.fill((0, 0, 0))
-        
-        # Draw title
+    def draw_background(self, surface):
+        """Draw the parts of the menu that never change"""
         title_surface = self.title_font.render("Guitar Hero Game", True, self.title_color)
         title_rect = title_surface.get_rect(center=(self.game_instance.screen_width // 2, 100))
-        screen.blit(title_surface, title_rect)
-        
-        # Reset option rectangles
-        self.option_rects = []
+        surface.blit(title_surface, title_rect)
+    
+    def draw(self, screen):
+        self.renderer.begin(screen)
         
         # Draw menu options
         for i, option in enumerate(self.options):
             color = self.selected_color if i == self.selected_option else self.option_color
-            option_surface = self.menu_font.render(option, True, color)
-            option_rect = option_surface.get_rect(
-                center=(self.game_instance.screen_width // 2, 250 + i * 60)
-            )
-            # Store rectangle for mouse interaction
-            self.option_rects.append(option_rect)
-            # Draw option text
-            screen.blit(option_surface, option_rect)
-            
-            # Draw a button outline
-            padding = 10
-            button_rect = pygame.Rect(
-                option_rect.left - padding,
-                option_rect.top - padding,
-                option_rect.width + (padding * 2),
-                option_rect.height + (padding * 2)
-            )
-            pygame.draw.rect(screen, color, button_rect, 2, border_radius=5)
\ No newline at end of file
+            self.renderer.element(f"option-{i}", color, lambda: self.build_option(i, color))
+        
+        return self.renderer.end()
+    
+    def build_option(self, index, color):
+        """Render an option and its button outline"""
+        option_rect = self.option_rects[index]
+        
+        # Draw a button outline
+        padding = 10
+        button_rect = option_rect.inflate(padding * 2, padding * 2)
+        surface = pygame.Surface(button_rect.size, pygame.SRCALPHA)
+        
+        # Draw option text
+        option_surface = self.game_instance.text_cache.render(self.menu_font, self.options[index], color)
+        surface.blit(option_surface, (padding, padding))
+        pygame.draw.rect(surface, color, surface.get_rect(), 2, border_radius=5)
+        return surface, button_rect
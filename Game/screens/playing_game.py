@@ -1,7 +1,15 @@
+import logging
 import pygame
-import mido
-import time
+import numpy as np
 from screens.base_screen import BaseScreen
+from models.note_pool import NotePool
+from charts.lane_index import LaneIndex
+from charts.note_scheduler import NoteScheduler
+from models.scoring_engine import LOCAL_PLAYER_ID, ScoringEngine
+from networking.protocol import GameEvent, PlayerInfo, note_batches
+from rendering.screen_renderer import ScreenRenderer
+
+logger = logging.getLogger(__name__)
 
 class PlayingGameScreen(BaseScreen):
     """
@@ -9,24 +17,33 @@ class PlayingGameScreen(BaseScreen):
     """
     def __init__(self, game_instance):
         super().__init__(game_instance)
-        self.font = pygame.font.SysFont("Arial", 36)
-        self.header_font = pygame.font.SysFont("Arial", 48, bold=True)
         
         # Guitar Hero gameplay elements
         self.track_width = 100
         self.track_spacing = 20
-        self.num_tracks = 4
+        self.set_lanes(4)  # Until a chart says how many lanes it uses
         self.note_speed = 5
-        self.notes = []  # List of notes currently on screen
+        self.notes = NotePool()  # Notes currently on screen
+        
+        # Note positions are derived from the song clock rather than stepped per frame
+        self.pixels_per_second = self.note_speed * 60
+        self.hit_zone_y = self.game_instance.screen_height - 100
+        self.lead_time = self.hit_zone_y / self.pixels_per_second  # Seconds from top of screen to hit zone
+        self.hit_window = 0.1  # Seconds either side of the hit time that still count as a hit
+        self.miss_time = (self.game_instance.screen_height - self.hit_zone_y) / self.pixels_per_second
         
-        # MIDI file playing
-        self.midi_file = self.game_instance.get_random_midi_file()
-        self.midi_track = None
-        self.midi_events = []
+        # MIDI file playing, chosen and loaded by preload()
+        self.requested_song = None  # Song picked in the lobby, or None for a random one
+        self.level = None           # Chart difficulty level, or None for the default
+        self.midi_file = None
+        self.chart = None
+        self.lane_index = None
+        self.note_slots = None   # Note pool slot of each chart note, or -1
+        self.note_scheduler = None
+        self.scoring = None
         self.current_event_index = 0
-        self.last_note_time = 0
-        self.start_time = time.time()
-        self.load_midi()
+        self.lead_in = 3.0  # Seconds between the game start and the song clock reaching zero
+        self.start_time = self.game_instance.clock.time()
         
         # Colors
         self.track_colors = [
@@ -45,15 +62,48 @@ class PlayingGameScreen(BaseScreen):
         
         # Track the currently playing song name
         self.song_name = "No song loaded"
+        
+        # Back button
+        self.back_button_rect = pygame.Rect(20, 540, 150, 40)
+
+    def set_lanes(self, num_tracks):
+        """Lay out num_tracks lanes centered on the screen"""
+        self.num_tracks = num_tracks
+        total_width = (self.track_width * self.num_tracks) + (self.track_spacing * (self.num_tracks - 1))
+        self.tracks_x = (self.game_instance.screen_width - total_width) // 2
+        self.lane_xs = self.tracks_x + np.arange(self.num_tracks) * (self.track_width + self.track_spacing)
+        self.renderer = None  # The tracks in the background moved
+
+    def load_assets(self):
+        """Fonts shared with the other screens, released while the screen is not shown"""
+        self.font = self.get_font("Arial", 36)
+        self.header_font = self.get_font("Arial", 48, bold=True)
+    
+    def preload(self):
+        """Load the requested or a random song, usually while the lobby is showing"""
+        # Keep the song when only the level changed
+        if self.midi_file is None:
+            self.midi_file = self.requested_song or self.game_instance.get_random_midi_file()
+        self.song_name = "No song loaded"
         if self.midi_file:
             # Extract just the filename without path and extension
             import os
             self.song_name = os.path.basename(self.midi_file)
             self.song_name = os.path.splitext(self.song_name)[0]
+        self.load_midi()
+    
+    def on_enter(self):
+        """Start the preloaded song"""
+        super().on_enter()
+        self.renderer = None  # The game name in the background may have changed
+        self.notes.clear()
+        self.current_event_index = 0
+        self.score = 0
+        self.combo = 0
+        
+        # Add initial delay to give player time to prepare
+        self.start_time = self.game_instance.clock.time() + self.lead_in
         
-        # Back button
-        self.back_button_rect = pygame.Rect(20, 540, 150, 40)
-
         # Broadcast game start message to all clients
         if (self.game_instance and 
             hasattr(self.game_instance, 'game_server') and 
@@ -61,99 +111,34 @@ class PlayingGameScreen(BaseScreen):
             hasattr(self.game_instance.game_server, 'outgoing_message_queue')):
             
             # Format: "Game-Start"
-            message = f"Game-Start"
+            message = GameEvent("Start")
             
             # Use the broadcast_message method from GameServer
             self.game_instance.game_server.broadcast_message(message)
 
     def load_midi(self):
-        """Load and prepare the MIDI file for playing"""
+        """Load the compiled chart for the MIDI file, building it if needed"""
         if not self.midi_file:
-            print("No MIDI file available to load")
+            logger.warning("No MIDI file available to load")
             return
         try:
-            # Load the MIDI file
-            midi = mido.MidiFile(self.midi_file)
-            
-            # Find the first track with note events
-            self.midi_events = []
-            
-            # Extract note_on events with velocity > 0
-            raw_events = []
-            for msg in midi:
-                if not msg.is_meta and msg.type == 'note_on' and msg.velocity > 0:
-                    raw_events.append(msg)
+            # Charts are cached on disk and memory mapped, so this only parses
+            # the MIDI file the first time a song is played. A song that is not
+            # cached yet keeps compiling in the background while it plays.
+            self.chart = self.game_instance.chart_cache.load(self.midi_file, level=self.level, streaming=True)
+            self.set_lanes(self.chart.num_tracks)
+            self.lane_index = LaneIndex(self.chart, self.chart.available)
+            self.note_slots = np.full(len(self.chart), -1, dtype=np.int32)
+            self.note_scheduler = NoteScheduler(self.chart, self.lead_in)
+            self.scoring = ScoringEngine(self.lane_index, len(self.chart), hit_window=self.hit_window)
             
-            # Convert delta times to absolute times
-            # MIDI files store delta times (time since the last event)
-            absolute_time = 0
-            for msg in raw_events:
-                absolute_time += msg.time
-                # Create a copy of the message with absolute timestamp
-                copied_msg = msg.copy(time=absolute_time)
-                self.midi_events.append(copied_msg)
+            logger.info("Loaded %s chart with %d note events", self.chart.level, len(self.chart))
+            if self.chart.available == len(self.chart):
+                logger.info("Song duration: %.1f seconds (after scaling)", self.chart.duration)
             
-            # Sort by absolute time (should already be sorted, but just to be safe)
-            self.midi_events.sort(key=lambda x: x.time)
-            
-            # Scale the timings to make gameplay smoother
-            # First, determine the tempo scaling factor
-            if len(self.midi_events) > 1:
-                # Calculate a reasonable scaling factor based on song length
-                total_duration = self.midi_events[-1].time
-                # We want the whole song to take about 2-3 minutes to play
-                target_duration = 120  # seconds
-                self.tempo_scale = target_duration / total_duration
-                
-                # Add spacing between notes that are too close together
-                min_time_between_notes = 0.5  # minimum seconds between consecutive notes
-                
-                # Apply scaling and enforce minimum spacing
-                last_time = 0
-                for i, msg in enumerate(self.midi_events):
-                    # Scale the time
-                    scaled_time = msg.time * self.tempo_scale
-                    
-                    # Enforce minimum spacing
-                    if i > 0 and scaled_time - last_time < min_time_between_notes:
-                        scaled_time = last_time + min_time_between_notes
-                    
-                    # Update the message time and track the last time
-                    self.midi_events[i] = msg.copy(time=scaled_time)
-                    last_time = scaled_time
-            else:
-                # Default scaling if we don't have enough events
-                self.tempo_scale = 1.0
-            
-            # Convert note pitch to track number (map the range of notes to 4 tracks)
-            note_min = min([msg.note for msg in self.midi_events]) if self.midi_events else 60
-            note_max = max([msg.note for msg in self.midi_events]) if self.midi_events else 72
-            note_range = max(note_max - note_min, 1)
-            
-            # Create track mapping for each note
-            self.track_mapping = {}
-            for i, msg in enumerate(self.midi_events):
-                # Map the note to one of the 4 tracks
-                track = min(int((msg.note - note_min) * self.num_tracks / note_range), self.num_tracks - 1)
-                self.track_mapping[i] = track
-            
-            # Add initial delay to give player time to prepare
-            self.start_time = time.time() + 3.0  # 3 second delay before notes start
-            
-            print(f"Loaded MIDI file with {len(self.midi_events)} note events")
-            print(f"Song duration: {self.midi_events[-1].time:.1f} seconds (after scaling)")
-            
-        except Exception as e:
-            print(f"Error loading MIDI file: {e}")
-            import traceback
-            traceback.print_exc()
-            self.midi_events = []
-            
-        except Exception as e:
-            print(f"Error loading MIDI file: {e}")
-            import traceback
-            traceback.print_exc()
-            self.midi_events = []
+        except Exception:
+            logger.exception("Error loading MIDI file")
+            self.chart = None
 
     def handle_events(self, events):
         for event in events:
@@ -172,6 +157,12 @@ class PlayingGameScreen(BaseScreen):
     
     def go_back(self):
         """Go back to the lobby screen"""
+        # Import here to avoid circular imports
+        from screens.lobby_screen import LobbyScreen
+        self.next_screen = self.game_instance.screens.get(LobbyScreen)
+    
+    def on_exit(self):
+        """End the song, the next visit preloads a new one"""
         # Broadcast game end message to all clients
         if (self.game_instance and 
             hasattr(self.game_instance, 'game_server') and 
@@ -179,16 +170,37 @@ class PlayingGameScreen(BaseScreen):
             hasattr(self.game_instance.game_server, 'outgoing_message_queue')):
             
             # Format: "Game-End"
-            message = f"Game-End"
+            message = GameEvent("End")
             
             # Use the broadcast_message method from GameServer
             self.game_instance.game_server.broadcast_message(message)
-        # Import here to avoid circular imports
-        from screens.lobby_screen import LobbyScreen
-        self.next_screen = LobbyScreen(self.game_instance)
+        self.unload()
+    
+    def unload(self):
+        """Release the song so the next preload loads a new one"""
+        self.release_chart()
+        self.midi_file = None
+    
+    def select_level(self, level):
+        """Play the song at another difficulty level, the next preload loads its chart"""
+        if level == self.level:
+            return
+        self.level = level
+        # All levels are cached together, so reloading maps the same file again
+        self.release_chart()
+    
+    def release_chart(self):
+        """Release the memory mapped chart"""
+        if self.chart is not None:
+            self.chart.close()
+            self.chart = None
+            self.lane_index = None
+            self.note_scheduler = None
+            self.scoring = None
+        self.preloaded = False
         
     def handle_gameplay_input(self, key):
-        """Handle gameplay inputs - will be integrated with controller data"""
+        """Judge a keyboard press, controller presses arrive through judge_presses()"""
         key_map = {
             pygame.K_a: 0,  # First track
             pygame.K_s: 1,  # Second track
@@ -196,141 +208,150 @@ class PlayingGameScreen(BaseScreen):
             pygame.K_f: 3   # Fourth track
         }
         
-        if key in key_map:
-            track = key_map[key]
+        # Levels with fewer lanes leave the last keys unused
+        track = key_map.get(key)
+        if track is not None and track < self.num_tracks:
             self.check_note_hit(track)
     
+    def song_time(self):
+        """Return the current position of the song clock in seconds"""
+        return self.game_instance.clock.time() - self.start_time
+    
     def check_note_hit(self, track):
-        """Check if a note was hit successfully"""
-        hit_zone_y = self.game_instance.screen_height - 100
-        hit_zone_height = 30
+        """Judge a keyboard press like a controller press, as the local player"""
+        note = -1
+        if self.scoring:
+            note, points = self.scoring.judge_press(LOCAL_PLAYER_ID, track, self.song_time())
         
-        # Check if any note is in the hit zone for this track
-        for note in self.notes[:]:
-            if note['track'] == track and \
-               hit_zone_y - hit_zone_height/2 <= note['y'] <= hit_zone_y + hit_zone_height/2:
-                # Note hit!
-                self.score += 100 * (self.combo + 1)
-                self.combo += 1
-                self.notes.remove(note)
-                return
+        if note >= 0:
+            # Note hit!
+            self.score += points * (self.combo + 1)
+            self.combo += 1
+            slot = self.note_slots[note]
+            if slot >= 0:
+                self.notes.despawn(slot)
+                self.note_slots[note] = -1
+            return
                 
         # Note missed or wrong track
         self.combo = 0
+
+    def judge_presses(self, presses):
+        """Judge a frame's controller presses and send the players their new scores"""
+        game_server = self.game_instance.game_server
+        if not self.scoring or not game_server:
+            return
+        
+        for player in self.scoring.judge(presses, self.start_time, game_server.clients):
+            game_server.send_message(PlayerInfo(player), player.websocket)
+    
     def update(self):
-        # Move existing notes down
-        for note in self.notes[:]:
-            note['y'] += self.note_speed
-            
-            # Remove notes that have gone off screen
-            if note['y'] > self.game_instance.screen_height:
-                self.notes.remove(note)
-                self.combo = 0  # Missed note
+        current_time = self.song_time()
+        
+        # Remove notes that have gone off screen
+        if self.notes.cull(current_time - self.miss_time):
+            self.combo = 0  # Missed note
                 
-        # Randomly generate new notes based on connected client inputs
-        # For now, just check if we need to process incoming messages
+        # Judge the presses the controllers sent since the last frame
         self.game_instance.process_messages()
         
-        # Generate notes from MIDI events
-        current_time = time.time() - self.start_time
-        while self.current_event_index < len(self.midi_events) and self.midi_events[self.current_event_index].time <= current_time:
-            # Use the track mapping instead of directly accessing the track attribute
-            track = self.track_mapping.get(self.current_event_index, 0)
-            self.add_note(track)
-            self.current_event_index += 1    
-    def add_note(self, track):
-        """Add a new note to the specified track"""
-        if 0 <= track < self.num_tracks:
-            # Calculate time until note needs to be hit
-            # Distance from top to hit zone divided by note speed gives us the time
-            hit_zone_y = self.game_instance.screen_height - 100
-            time_to_hit = hit_zone_y / self.note_speed  # Time in frames
-            # Convert to milliseconds (assuming 60 fps)
-            time_to_hit_ms = int(time_to_hit * 1000 / 60)
+        # Spawn chart notes once they are close enough to appear at the top of the screen
+        if self.chart:
+            # Judge the notes compiled since the last frame
+            self.lane_index.extend(self.chart.available)
+            spawn_before = current_time + self.lead_time
+            while self.current_event_index < len(self.chart) and self.chart.times[self.current_event_index] <= spawn_before:
+                self.spawn_chart_note(self.current_event_index)
+                self.current_event_index += 1
+            
+            # Send the controllers the next few seconds of the chart in batches
+            notes = self.note_scheduler.poll(current_time)
+            if notes:
+                self.send_note_batch(notes)
 
-            # Calculate the time when the note hits the hit zone since the start of the song in ms
-            note_time = self.midi_events[self.current_event_index].time * 1000 * self.tempo_scale
+    def spawn_chart_note(self, index):
+        """Spawn the chart note at index"""
+        track = self.chart.lanes[index]
+        hit_time = self.chart.times[index]
+        self.note_slots[index] = self.notes.spawn(track, hit_time, index)
 
-            
-            # Add note to the game
-            self.notes.append({
-                'track': track,
-                'y': 0
-            })
-            
-            try:
-                # Only attempt to send messages if we have a valid server with the queue attribute
-                if (self.game_instance and 
-                    hasattr(self.game_instance, 'game_server') and 
-                    self.game_instance.game_server and 
-                    hasattr(self.game_instance.game_server, 'outgoing_message_queue')):
-                    
-                    # Format: "NOTE-{track}-{time_in_ms}"
-                    message = f"NOTE-{track}-{note_time}"
-                    
-                    # Use the broadcast_message method from GameServer
-                    self.game_instance.game_server.broadcast_message(message)
-            except Exception as e:
-                # Just log the error but don't crash the game
-                print(f"Error sending note message: {e}")
-                # Game can continue even if messages fail to send
+    def send_note_batch(self, notes):
+        """Broadcast (track, time_in_ms) pairs as batched NOTES frames"""
+        for message in note_batches(notes):
+            self.broadcast_to_controllers(message)
+
+    def broadcast_to_controllers(self, message):
+        """Queue a message for every connected controller"""
+        try:
+            # Only attempt to send messages if we have a valid server with the queue attribute
+            if (self.game_instance and 
+                hasattr(self.game_instance, 'game_server') and 
+                self.game_instance.game_server and 
+                hasattr(self.game_instance.game_server, 'outgoing_message_queue')):
+                
+                # Use the broadcast_message method from GameServer
+                self.game_instance.game_server.broadcast_message(message)
+        except Exception as e:
+            # Just log the error but don't crash the game
+            logger.warning("Error sending note message: %s", e)
+            # Game can continue even if messages fail to send
     
-    def draw(self, screen):
-        # Fill background
-        screen.fill((0, 0, 0))
-        
+    def draw_background(self, surface):
+        """Draw the header, tracks, hit zones and back button, which never change"""
         # Draw game name
         name_surface = self.header_font.render(f"Game: {self.game_instance.game_server.GameName}", True, self.header_color)
-        screen.blit(name_surface, (20, 20))
-        
-        # Draw connected clients
-        clients_surface = self.font.render(f"Connected Players: {len(self.game_instance.game_server.ConnectedClients)}", True, self.text_color)
-        screen.blit(clients_surface, (20, 160))
-
-        # Draw player names
-        player_names = [player.player_name for player in self.game_instance.game_server.ConnectedClients]
-        player_names_surface = self.font.render(", ".join(player_names), True, self.text_color)
-        screen.blit(player_names_surface, (20, 200))
-        
-        # Draw song name
-        song_surface = self.font.render(f"Song: {self.song_name}", True, self.text_color)
-        screen.blit(song_surface, (20, 240))
-        
-        # Calculate track positions
-        total_width = (self.track_width * self.num_tracks) + (self.track_spacing * (self.num_tracks - 1))
-        start_x = (self.game_instance.screen_width - total_width) // 2
+        surface.blit(name_surface, (20, 20))
         
         # Draw tracks
-        for i in range(self.num_tracks):
-            track_x = start_x + (i * (self.track_width + self.track_spacing))
-            
+        for i, track_x in enumerate(self.lane_xs.tolist()):
             # Draw track
             pygame.draw.rect(
-                screen, 
+                surface, 
                 self.track_colors[i],
                 (track_x, 0, self.track_width, self.game_instance.screen_height),
                 2
             )
             
             # Draw hit zone
-            hit_zone_y = self.game_instance.screen_height - 100
             pygame.draw.rect(
-                screen,
+                surface,
                 self.track_colors[i],
-                (track_x, hit_zone_y - 15, self.track_width, 30)
-            )
-        
-        # Draw notes
-        for note in self.notes:
-            track_x = start_x + (note['track'] * (self.track_width + self.track_spacing))
-            pygame.draw.rect(
-                screen,
-                self.track_colors[note['track']],
-                (track_x, note['y'] - 15, self.track_width, 30)
+                (track_x, self.hit_zone_y - 15, self.track_width, 30)
             )
         
         # Draw back button
-        pygame.draw.rect(screen, self.button_color, self.back_button_rect, 2, border_radius=5)
+        pygame.draw.rect(surface, self.button_color, self.back_button_rect, 2, border_radius=5)
         back_text = self.font.render("Back", True, self.text_color)
         back_text_rect = back_text.get_rect(center=self.back_button_rect.center)
-        screen.blit(back_text, back_text_rect)
\ No newline at end of file
+        surface.blit(back_text, back_text_rect)
+    
+    def draw(self, screen):
+        # The static layer is built on the first draw so headless games never need it
+        if self.renderer is None:
+            self.renderer = ScreenRenderer(screen.get_size(), self.draw_background)
+        renderer = self.renderer
+        text_cache = self.game_instance.text_cache
+        renderer.begin(screen)
+        
+        # Draw connected clients
+        clients = self.game_instance.game_server.ConnectedClients
+        renderer.text("clients", text_cache, self.font, f"Connected Players: {len(clients)}", self.text_color, topleft=(20, 160))
+        
+        # Draw player names
+        player_names = ", ".join(player.player_name for player in clients)
+        renderer.text("players", text_cache, self.font, player_names, self.text_color, topleft=(20, 200))
+        
+        # Draw song name
+        renderer.text("song", text_cache, self.font, f"Song: {self.song_name}", self.text_color, topleft=(20, 240))
+        
+        # Draw notes, computing every note position in one pass
+        slots = self.notes.active_slots()
+        tracks = self.notes.track[slots]
+        note_xs = self.lane_xs[tracks]
+        note_ys = self.notes.positions(slots, self.song_time(), self.hit_zone_y, self.pixels_per_second) - 15
+        renderer.draw_sprites(
+            (self.track_colors[track], (track_x, note_y, self.track_width, 30))
+            for track, track_x, note_y in zip(tracks.tolist(), note_xs.tolist(), note_ys.tolist())
+        )
+        
+        return renderer.end()
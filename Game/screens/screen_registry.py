@@ -0,0 +1,36 @@
+"""
+Registry that keeps one instance of each screen
+"""
+
+
+class ScreenRegistry:
+    """
+    Screens are created once and reused for every later visit, so a transition
+    only runs the on_exit/on_enter hooks instead of rebuilding the screen
+    """
+    def __init__(self, game_instance):
+        self.game_instance = game_instance
+        self.screens = {}  # Screen class -> instance
+
+    def get(self, screen_class):
+        """Return the instance of screen_class, creating it on first use"""
+        screen = self.screens.get(screen_class)
+        if screen is None:
+            screen = self.screens[screen_class] = screen_class(self.game_instance)
+        return screen
+
+    def preload(self, screen_class):
+        """Start the expensive setup of a screen in the background"""
+        screen = self.get(screen_class)
+        screen.start_preload()
+        return screen
+
+    def discard(self, screen_class):
+        """Forget a screen and release its assets"""
+        screen = self.screens.pop(screen_class, None)
+        if screen:
+            screen.release_assets()
+
+    def clear(self):
+        for screen_class in list(self.screens):
+            self.discard(screen_class)